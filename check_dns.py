@@ -2,27 +2,91 @@
 """
 DNS Configuration Checker for SSL Certificate Installation
 Version améliorée avec vérification du domaine principal et www
+
+Resolves A and AAAA records for any number of domains and their www
+aliases concurrently, against a cached public IP of this server.
 """
+import asyncio
+import json
+import os
 import socket
-import requests
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-def get_server_ip():
-    """Get current server's public IP address"""
+import requests
+
+IP_CACHE_FILE = "/var/lib/vhost-manager/public_ip.json"
+IP_CACHE_TTL = 3600
+DEFAULT_CONCURRENCY = 200
+RESOLVE_TIMEOUT = 10
+
+def fetch_public_ip(url):
+    """Fetch a public IP address from an echo service, None if unreachable"""
     try:
-        response = requests.get('https://api.ipify.org', timeout=10)
+        response = requests.get(url, timeout=5)
+        response.raise_for_status()
         return response.text.strip()
-    except Exception as e:
-        print(f"❌ Failed to get server IP: {e}")
+    except Exception:
         return None
 
-def get_domain_ip(domain):
-    """Get IP address that domain resolves to"""
-    try:
-        return socket.gethostbyname(domain)
-    except Exception as e:
-        print(f"❌ Failed to resolve {domain}: {e}")
-        return None
+def get_server_ips(override=None, ttl=IP_CACHE_TTL, refresh=False):
+    """
+    Get this server's public IPv4 and IPv6 addresses
+
+    The addresses are cached in IP_CACHE_FILE for ``ttl`` seconds so that
+    repeated checks do not call the echo service every time.
+
+    Args:
+        override (str): Comma separated addresses to use instead (offline use)
+        ttl (int): Cache lifetime in seconds
+        refresh (bool): Ignore the cached addresses
+
+    Returns:
+        tuple: (IPv4 address, IPv6 address), either may be None
+    """
+    if override:
+        ipv4 = ipv6 = None
+        for address in override.split(','):
+            address = address.strip()
+            if ':' in address:
+                ipv6 = address
+            elif address:
+                ipv4 = address
+        return ipv4, ipv6
+
+    if not refresh:
+        try:
+            with open(IP_CACHE_FILE) as f:
+                cached = json.load(f)
+            if time.time() - cached['fetched_at'] < ttl and cached.get('ipv4'):
+                return cached['ipv4'], cached.get('ipv6')
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        ipv4_future = pool.submit(fetch_public_ip, 'https://api.ipify.org')
+        ipv6_future = pool.submit(fetch_public_ip, 'https://api6.ipify.org')
+        ipv4, ipv6 = ipv4_future.result(), ipv6_future.result()
+    if ipv6 and ':' not in ipv6:
+        # api6 answers over IPv4 when the server has no IPv6 connectivity
+        ipv6 = None
+
+    if ipv4:
+        try:
+            os.makedirs(os.path.dirname(IP_CACHE_FILE), exist_ok=True)
+            with open(IP_CACHE_FILE, 'w') as f:
+                json.dump({'ipv4': ipv4, 'ipv6': ipv6, 'fetched_at': time.time()}, f)
+        except OSError:
+            pass  # Not running as root, the cache is only an optimisation
+    return ipv4, ipv6
+
+def get_server_ip(override=None):
+    """Get current server's public IP address"""
+    ipv4, _ = get_server_ips(override)
+    if not ipv4:
+        print("❌ Failed to get server IP (use --server-ip to set it manually)")
+    return ipv4
 
 def get_both_domains(input_domain):
     """Extract both main domain and www version from input"""
@@ -32,71 +96,159 @@ def get_both_domains(input_domain):
     else:
         main_domain = input_domain
         www_domain = f"www.{input_domain}"
-    
+
     return main_domain, www_domain
 
-def check_single_domain(domain, server_ip, step_name):
-    """Check if a single domain points to the server"""
-    print(f"\n📋 {step_name}: Checking {domain}...")
-    
-    domain_ip = get_domain_ip(domain)
-    
-    if not domain_ip:
-        print(f"❌ {domain} could not be resolved")
-        print(f"💡 Create a DNS A record for {domain} pointing to {server_ip}")
-        return False
-    
-    print(f"🌐 {domain} IP: {domain_ip}")
-    
-    if server_ip != domain_ip:
-        print(f"❌ {domain} does not point to this server")
-        print(f"💡 Update your DNS A record for {domain} to point to {server_ip}")
-        return False
-    
-    print(f"✅ {domain} correctly points to this server!")
-    return True
+async def resolve_name(name, semaphore):
+    """Resolve the A and AAAA records of a name, returns (ipv4 list, ipv6 list, error)"""
+    loop = asyncio.get_running_loop()
+    async with semaphore:
+        try:
+            infos = await asyncio.wait_for(
+                loop.getaddrinfo(name, None, type=socket.SOCK_STREAM), RESOLVE_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            return [], [], "DNS lookup timed out"
+        except socket.gaierror as e:
+            return [], [], e.strerror or str(e)
+
+    ipv4 = sorted({info[4][0] for info in infos if info[0] == socket.AF_INET})
+    ipv6 = sorted({info[4][0] for info in infos if info[0] == socket.AF_INET6})
+    return ipv4, ipv6, None
 
-def check_domain_dns_complete(input_domain):
+def evaluate_name(name, ipv4, ipv6, error, server_ipv4, server_ipv6):
+    """Compare the records of a name with the server addresses, returns a result dict"""
+    problems = []
+    if error:
+        problems.append(f"could not be resolved ({error})")
+    elif not ipv4 and not ipv6:
+        problems.append("has no A or AAAA record")
+    if ipv4 and server_ipv4 and server_ipv4 not in ipv4:
+        problems.append(f"A record {', '.join(ipv4)} does not point to {server_ipv4}")
+    if ipv6:
+        if not server_ipv6:
+            problems.append(f"AAAA record {', '.join(ipv6)} exists but this server has no public IPv6")
+        elif server_ipv6 not in ipv6:
+            problems.append(f"AAAA record {', '.join(ipv6)} does not point to {server_ipv6}")
+    if not ipv4 and ipv6 and server_ipv4 and not problems:
+        problems.append(f"no A record for {server_ipv4}")
+
+    return {'name': name, 'ipv4': ipv4, 'ipv6': ipv6, 'ok': not problems, 'problems': problems}
+
+async def check_names_async(names, server_ipv4, server_ipv6, concurrency=DEFAULT_CONCURRENCY):
+    """Resolve and evaluate every name concurrently"""
+    loop = asyncio.get_running_loop()
+    # getaddrinfo runs in the default executor, size it for the requested concurrency
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    loop.set_default_executor(executor)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    resolved = await asyncio.gather(*(resolve_name(name, semaphore) for name in names))
+    executor.shutdown(wait=False)
+    return [
+        evaluate_name(name, ipv4, ipv6, error, server_ipv4, server_ipv6)
+        for name, (ipv4, ipv6, error) in zip(names, resolved)
+    ]
+
+def check_domains(domains, server_ip=None, include_www=True, concurrency=DEFAULT_CONCURRENCY, refresh_ip=False):
+    """
+    Check the DNS records of many domains in one pass
+
+    Args:
+        domains (list): Domain names
+        server_ip (str): Comma separated server addresses, looked up (and cached) if omitted
+        include_www (bool): Also check the www alias of every domain
+        concurrency (int): Maximum number of lookups in flight
+        refresh_ip (bool): Ignore the cached public IP
+
+    Returns:
+        tuple: (server IPv4, server IPv6, list of per-name results)
+    """
+    server_ipv4, server_ipv6 = get_server_ips(server_ip, refresh=refresh_ip)
+
+    names = []
+    for domain in domains:
+        main_domain, www_domain = get_both_domains(domain)
+        names.append(main_domain)
+        if include_www:
+            names.append(www_domain)
+    names = list(dict.fromkeys(names))
+
+    results = asyncio.run(check_names_async(names, server_ipv4, server_ipv6, max(1, concurrency)))
+    return server_ipv4, server_ipv6, results
+
+def print_report(server_ipv4, server_ipv6, results, verbose=False):
+    """Print the mismatches (every name when verbose), returns the number of failing names"""
+    print(f"🌐 Server IP: {server_ipv4 or 'unknown'}" + (f" / {server_ipv6}" if server_ipv6 else ""))
+    if not server_ipv4:
+        print("⚠️  Public IP unknown, only resolution is checked (use --server-ip)")
+
+    failures = [r for r in results if not r['ok']]
+    for result in results if verbose else failures:
+        if result['ok']:
+            print(f"✅ {result['name']} → {', '.join(result['ipv4'] + result['ipv6'])}")
+        else:
+            print(f"❌ {result['name']} {'; '.join(result['problems'])}")
+
+    print(f"\n📊 {len(results) - len(failures)}/{len(results)} names point to this server")
+    return len(failures)
+
+def check_domain_dns_complete(input_domain, server_ip=None, refresh_ip=False):
     """Check if both main domain and www subdomain DNS point to current server"""
     main_domain, www_domain = get_both_domains(input_domain)
-    
+
     print(f"🔍 Checking DNS configuration for both {main_domain} and {www_domain}...")
-    
-    server_ip = get_server_ip()
-    if not server_ip:
+    server_ipv4, server_ipv6, results = check_domains([input_domain], server_ip, refresh_ip=refresh_ip)
+    if not server_ipv4:
+        print("❌ Failed to get server IP (use --server-ip to set it manually)")
         return False
-    
-    print(f"🌐 Server IP: {server_ip}")
-    
-    # Checking for main domain
-    main_success = check_single_domain(main_domain, server_ip, "Step 1")
-    
-    # Checking for www version
-    www_success = check_single_domain(www_domain, server_ip, "Step 2")
-    
-    return main_success and www_success
+
+    failures = print_report(server_ipv4, server_ipv6, results, verbose=True)
+    for result in results:
+        if not result['ok']:
+            print(f"💡 Create or update the DNS A record for {result['name']} to point to {server_ipv4}")
+    return failures == 0
 
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python3 check_dns.py <domain>")
+    args = sys.argv[1:]
+    server_ip = None
+    if '--server-ip' in args:
+        index = args.index('--server-ip')
+        if index + 1 >= len(args):
+            print("❌ --server-ip requires an address")
+            sys.exit(1)
+        server_ip = args[index + 1]
+        del args[index:index + 2]
+    refresh_ip = '--refresh-ip' in args
+    domains = [a.strip() for a in args if not a.startswith('--')]
+
+    if not domains:
+        print("Usage: python3 check_dns.py <domain> [<domain>...] [--server-ip IP[,IPv6]] [--refresh-ip]")
         print("Example: python3 check_dns.py mysite.com")
         print("Example: python3 check_dns.py www.mysite.com")
-        print("Example: python3 check_dns.py first.example.com")
+        print("Example: python3 check_dns.py first.example.com second.example.com")
+        print("Example: python3 check_dns.py mysite.com --server-ip 203.0.113.10")
         sys.exit(1)
-    
-    input_domain = sys.argv[1].strip()
-    main_domain, www_domain = get_both_domains(input_domain)
-    
-    success = check_domain_dns_complete(input_domain)
-    
-    if success:
-        print(f"\n🎉 Both {main_domain} and {www_domain} are ready for SSL certificate installation!")
-        print("✅ DNS configuration is complete!")
-    else:
-        print(f"\n⚠️  DNS configuration is not complete for SSL certificate installation")
-        print("📝 Please update your DNS settings as indicated above and try again.")
-    
-    sys.exit(0 if success else 1)
+
+    if len(domains) == 1:
+        input_domain = domains[0]
+        main_domain, www_domain = get_both_domains(input_domain)
+        success = check_domain_dns_complete(input_domain, server_ip, refresh_ip)
+
+        if success:
+            print(f"\n🎉 Both {main_domain} and {www_domain} are ready for SSL certificate installation!")
+            print("✅ DNS configuration is complete!")
+        else:
+            print(f"\n⚠️  DNS configuration is not complete for SSL certificate installation")
+            print("📝 Please update your DNS settings as indicated above and try again.")
+        sys.exit(0 if success else 1)
+
+    started = time.monotonic()
+    print(f"🔍 Checking DNS for {len(domains)} domains and their www aliases...")
+    server_ipv4, server_ipv6, results = check_domains(domains, server_ip, refresh_ip=refresh_ip)
+    failures = print_report(server_ipv4, server_ipv6, results)
+    print(f"⏱️  Checked {len(results)} names in {time.monotonic() - started:.1f}s")
+    sys.exit(0 if failures == 0 and server_ipv4 else 1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,34 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vhost_manager import ApacheVHostManager  # noqa: E402
+
+
+@pytest.fixture
+def manager(tmp_path):
+    """A manager whose Apache, log and store paths live under tmp_path; commands are recorded, not run"""
+    m = ApacheVHostManager.__new__(ApacheVHostManager)
+    for name in ('sites_available', 'sites_enabled', 'mods_enabled', 'confs_enabled', 'snippets_dir',
+                 'mass_dir', 'log_dir', 'apache_log_dir', 'letsencrypt_dir', 'acme_webroot', 'cache_dir'):
+        path = tmp_path / name
+        path.mkdir()
+        setattr(m, name, str(path))
+    m.mass_map_source = f"{m.mass_dir}/hosts.txt"
+    m.mass_map_file = f"{m.mass_dir}/current/hosts.map"
+    m.mass_config_file = f"{m.sites_available}/00-vhost-manager-mass.conf"
+    m.config_file = str(tmp_path / "vhost_manager.json")
+    m.db_file = str(tmp_path / "db" / "sites.db")
+    m.daemon_socket = str(tmp_path / "vhost-manager.sock")
+    m.mpm_config_file = str(tmp_path / "mpm_event.conf")
+    m._lint_cache = {}
+    m._certbot_lock = threading.Lock()
+    m.commands = []
+    m.run_command = lambda command, show_output=False, capture_output=True: m.commands.append(command) or True
+    m.check_sudo = lambda: None
+    m.load_config()
+    return m
@@ -0,0 +1,115 @@
+import json
+import os
+
+import pytest
+
+
+def make_lineage(manager, name):
+    live = f"{manager.letsencrypt_dir}/live/{name}"
+    os.makedirs(live)
+    for filename in ('fullchain.pem', 'privkey.pem', 'cert.pem'):
+        open(f"{live}/{filename}", 'w').close()
+    return live
+
+
+def test_san_batches_group_by_registrable_domain(manager):
+    domains = ['api.example.com', 'example.com', 'shop.example.co.uk', 'example.co.uk', 'other.org']
+    assert sorted(manager.plan_certificate_batches(domains)) == [
+        ('api.example.com', ['api.example.com', 'example.com']),
+        ('example.co.uk', ['example.co.uk', 'shop.example.co.uk']),
+        ('other.org', ['other.org']),
+    ]
+    assert manager.plan_certificate_batches(['b.com', 'a.com'], san=False) == [('a.com', ['a.com']), ('b.com', ['b.com'])]
+
+
+def test_san_batches_respect_the_names_per_certificate_limit(manager):
+    domains = [f"s{i:03}.example.com" for i in range(manager.MAX_CERT_NAMES)]
+    batches = manager.plan_certificate_batches(domains)
+    assert [len(members) for _, members in batches] == [manager.MAX_CERT_NAMES // 2] * 2
+
+
+def test_reapplying_a_san_site_keeps_its_lineage(manager, tmp_path):
+    live = make_lineage(manager, 'example.com')
+    health = {'http://localhost:3001': {'ok': True, 'failures': 0, 'samples': [1.5]}}
+    manager.sites['api.example.com'] = {
+        'port': 3001, 'ssl': True, 'cert_name': 'example.com',
+        'cert_expiry': '2026-12-01T00:00:00+00:00', 'health': health
+    }
+    manifest = tmp_path / "sites.json"
+    manifest.write_text(json.dumps([{'domain': 'api.example.com', 'port': 3002}]))
+
+    manager.apply_manifest(str(manifest))
+
+    with open(f"{manager.sites_available}/api.example.com.conf") as f:
+        config = f.read()
+    assert f"SSLCertificateFile {live}/fullchain.pem" in config
+    record = manager.sites['api.example.com']
+    assert record['port'] == 3002
+    assert record['cert_name'] == 'example.com'
+    assert record['health'] == health
+    assert manager.sites.expiring_before('2027-01-01') == [('api.example.com', '2026-12-01T00:00:00+00:00')]
+
+
+def test_failed_san_order_is_split_around_the_bad_domain(manager):
+    orders = []
+
+    def certbot(command, show_output=False, capture_output=True):
+        orders.append(command)
+        return ' -d bad.example.com ' not in f"{command} "
+
+    manager.run_command = certbot
+    domains = ['a.example.com', 'b.example.com', 'bad.example.com', 'c.example.com']
+    results = manager.issue_certificate_batch('a.example.com', domains, 'admin@example.com', None)
+
+    assert results['bad.example.com']['status'] == 'failed'
+    issued = {d: r['cert_name'] for d, r in results.items() if r['status'] == 'issued'}
+    assert issued == {'a.example.com': 'a.example.com', 'b.example.com': 'a.example.com',
+                      'c.example.com': 'c.example.com'}
+    # Whole group, two halves, then the failing half split again
+    assert len(orders) == 5
+
+
+def test_webroot_orders_store_an_apache_reload_deploy_hook(manager):
+    orders = []
+    manager.run_command = lambda command, show_output=False, capture_output=True: orders.append(command) or True
+    manager.issue_certificate_batch('example.com', ['example.com'], 'admin@example.com', None)
+    assert f"--deploy-hook '{manager.CERTBOT_DEPLOY_HOOK}'" in orders[0]
+
+
+UTC_TIME_CERT = b"""-----BEGIN CERTIFICATE-----
+MIIBhDCCASugAwIBAgIUdWZJcMGw9W36sWyKzXICy+zV7qcwCgYIKoZIzj0EAwIw
+GDEWMBQGA1UEAwwNYS5leGFtcGxlLmNvbTAeFw0yNjEwMTcwNTI1NDFaFw00ODA5
+MTEwNTI1NDFaMBgxFjAUBgNVBAMMDWEuZXhhbXBsZS5jb20wWTATBgcqhkjOPQIB
+BggqhkjOPQMBBwNCAAQvO28xAU1wLAzTeNgO4tDU0NbHl5r9GyYlSwh5/ROLIlZ6
+CVePmI/26eZrYvH0leqIHzqHTKf4gGGGf4WYNCnuo1MwUTAdBgNVHQ4EFgQULpmL
+9UIEM+pX+lnsIovw5OXVGA8wHwYDVR0jBBgwFoAULpmL9UIEM+pX+lnsIovw5OXV
+GA8wDwYDVR0TAQH/BAUwAwEB/zAKBggqhkjOPQQDAgNHADBEAiAos9Z24j7112/i
+Dnp4d64ikFXRK1vKsHmbggzN+3hS/AIgE2C9UXIpk/GZf/PB7OvJyMQBY2c8/bFe
+7PeDyMe+JOU=
+-----END CERTIFICATE-----
+"""
+
+GENERALIZED_TIME_CERT = b"""-----BEGIN CERTIFICATE-----
+MIIBhjCCAS2gAwIBAgIUGZt8nLTzbNq92YYDk+7bNN/PUaIwCgYIKoZIzj0EAwIw
+GDEWMBQGA1UEAwwNYi5leGFtcGxlLmNvbTAgFw0yNjEwMTcwNTI1NDFaGA8yMDYy
+MDUyMTA1MjU0MVowGDEWMBQGA1UEAwwNYi5leGFtcGxlLmNvbTBZMBMGByqGSM49
+AgEGCCqGSM49AwEHA0IABIQUsdEnnN0m13eMk4jpF1Wq1QCRhOnmSHbXmAmZflsy
+azR3aICO6I2tver5OtOy1o1KZmpu60U6SaiEO5CWfAijUzBRMB0GA1UdDgQWBBSR
+jCbQsKnKtlzRC3kmyShScw/skjAfBgNVHSMEGDAWgBSRjCbQsKnKtlzRC3kmyShS
+cw/skjAPBgNVHRMBAf8EBTADAQH/MAoGCCqGSM49BAMCA0cAMEQCICZs3Ac3e02b
+iT69dZnr2hEEuiK1Z+R47KS31PDt5OwvAiBlBeAEAE1EYKwjxghhlcOG0Ta47BLk
+2yCLi5Lok05m0w==
+-----END CERTIFICATE-----
+"""
+
+
+def test_certificate_expiry_is_read_without_a_subprocess(manager, tmp_path, monkeypatch):
+    monkeypatch.setattr('subprocess.run', lambda *args, **kwargs: pytest.fail("subprocess spawned"))
+    assert manager.certificate_not_after(UTC_TIME_CERT).isoformat() == '2048-09-11T05:25:41+00:00'
+    assert manager.certificate_not_after(GENERALIZED_TIME_CERT).isoformat() == '2062-05-21T05:25:41+00:00'
+
+    cert_path = tmp_path / "cert.pem"
+    cert_path.write_bytes(UTC_TIME_CERT)
+    assert manager.read_certificate(str(cert_path))['cert_expiry'] == '2048-09-11T05:25:41+00:00'
+    cert_path.write_bytes(b"not a certificate")
+    assert manager.read_certificate(str(cert_path)) is None
@@ -0,0 +1,21 @@
+import os
+
+
+def test_rejected_create_leaves_existing_site_untouched(manager, monkeypatch):
+    monkeypatch.setattr('builtins.input', lambda prompt='': 'y')
+    monkeypatch.setattr(manager, 'check_port_available', lambda port: False)
+    manager.create_site('example.com', 3000, ssl=False)
+    config_path = f"{manager.sites_available}/example.com.conf"
+    with open(config_path, 'rb') as f:
+        original = f.read()
+
+    # A hand-written site now claims the same name, so the update must fail lint
+    with open(f"{manager.sites_enabled}/legacy.conf", 'w') as f:
+        f.write("<VirtualHost *:80>\n    ServerName example.com\n</VirtualHost>\n")
+    manager.commands.clear()
+    manager.create_site('example.com', 3001, ssl=False)
+
+    with open(config_path, 'rb') as f:
+        assert f.read() == original
+    assert manager.sites['example.com']['port'] == 3000
+    assert manager.commands == []
@@ -0,0 +1,56 @@
+import os
+
+
+def vhost(name, port=80):
+    return f"<VirtualHost *:{port}>\n    ServerName {name}\n</VirtualHost>\n"
+
+
+def enable(manager, name, content):
+    for directory in (manager.sites_available, manager.sites_enabled):
+        with open(f"{directory}/{name}.conf", 'w') as f:
+            f.write(content)
+
+
+def test_duplicate_name_with_batch_is_an_error(manager):
+    enable(manager, 'legacy', vhost('shared.com'))
+    issues = manager.lint({'a.com': vhost('shared.com')})
+    assert [issue['level'] for issue in issues] == ['error']
+    assert 'shared.com on port 80' in issues[0]['message']
+    assert not manager.lint_batch({'a.com': vhost('shared.com')})
+
+
+def test_unrelated_duplicate_does_not_block_batch(manager):
+    enable(manager, 'old-one', vhost('other.com'))
+    enable(manager, 'old-two', vhost('other.com'))
+    assert any(issue['level'] == 'error' for issue in manager.lint())
+    assert manager.lint_batch({'a.com': vhost('a.com')})
+
+
+def test_certbot_copy_is_replaced_by_the_batch(manager):
+    enable(manager, 'example.com-le-ssl', vhost('example.com', 443))
+    assert manager.lint_batch({'example.com': vhost('example.com', 443)})
+
+    assert manager.apply_config_batch({'example.com': vhost('example.com', 443)})
+    assert ['a2dissite', '-q', 'example.com-le-ssl'] in manager.commands
+    assert not os.path.exists(f"{manager.sites_available}/example.com-le-ssl.conf")
+    assert os.path.exists(f"{manager.sites_available}/example.com.conf")
+
+
+def test_certbot_copy_is_restored_on_rollback(manager):
+    enable(manager, 'example.com-le-ssl', vhost('example.com', 443))
+    manager.run_command = lambda command, show_output=False, capture_output=True: (
+        manager.commands.append(command) or command != "apache2ctl configtest")
+
+    assert not manager.apply_config_batch({'example.com': vhost('example.com', 443)})
+    assert os.path.exists(f"{manager.sites_available}/example.com-le-ssl.conf")
+
+
+def test_modules_are_enabled_only_after_lint(manager):
+    enable(manager, 'legacy', vhost('shared.com'))
+    assert not manager.apply_config_batch({'a.com': vhost('shared.com')}, modules=['cache'], confs=[])
+    assert manager.commands == []
+
+    assert manager.apply_config_batch({'b.com': vhost('b.com')}, modules=['cache'], confs=[])
+    enable_call = next(i for i, command in enumerate(manager.commands) if command[0] == 'a2enmod')
+    assert 'cache' in manager.commands[enable_call]
+    assert enable_call < manager.commands.index("apache2ctl configtest")
@@ -0,0 +1,17 @@
+LINE = '{vhost} 1.2.3.4 - - [17/Oct/2026:10:00:0{second} +0000] "GET / HTTP/1.1" 200 100 "-" "curl/8"\n'
+
+
+def test_shared_log_counts_www_alias_for_its_domain(manager):
+    manager.sites['example.com'] = {'mode': 'mass', 'port': 3000, 'ssl': False}
+    manager.sites['www.other.com'] = {'mode': 'mass', 'port': 3001, 'ssl': False}
+    with open(f"{manager.apache_log_dir}/vhost-manager-mass-access.log", 'w') as f:
+        f.write(LINE.format(vhost='example.com', second=1))
+        f.write(LINE.format(vhost='www.example.com:80', second=2))
+        f.write(LINE.format(vhost='www.other.com', second=3))
+        f.write(LINE.format(vhost='unknown.com', second=4))
+
+    stats = manager.collect_log_stats()
+
+    assert stats['example.com']['requests'] == 2
+    assert stats['example.com']['bytes'] == 200
+    assert stats['www.other.com']['requests'] == 1
@@ -0,0 +1,41 @@
+import os
+
+
+def fake_httxt2dbm(manager):
+    def run(command, show_output=False, capture_output=True):
+        manager.commands.append(command)
+        if command[0] == 'httxt2dbm':
+            output = command[command.index('-o') + 1]
+            for suffix in ('.dir', '.pag'):
+                open(output + suffix, 'w').close()
+        return True
+    return run
+
+
+def test_build_mass_map_swaps_generations_and_skips_unchanged(manager):
+    manager.run_command = fake_httxt2dbm(manager)
+    manager.sites['a.com'] = {'mode': 'mass', 'port': 3000, 'ssl': False}
+    manager.sites['b.com'] = {'port': 3001, 'ssl': False}
+
+    assert manager.build_mass_map()
+    with open(manager.mass_map_source) as f:
+        assert f.read() == "a.com http://localhost:3000\nwww.a.com http://localhost:3000\n"
+    current = os.path.dirname(manager.mass_map_file)
+    first = os.path.realpath(current)
+    assert os.path.islink(current)
+    assert os.path.exists(f"{manager.mass_map_file}.dir") and os.path.exists(f"{manager.mass_map_file}.pag")
+
+    builds = len(manager.commands)
+    assert manager.build_mass_map()
+    assert len(manager.commands) == builds
+
+    manager.sites['c.com'] = {'mode': 'mass', 'port': 3002, 'ssl': False}
+    assert manager.build_mass_map()
+    second = os.path.realpath(current)
+    assert second != first
+    assert sorted(os.listdir(f"{manager.mass_dir}/maps")) == sorted(os.path.basename(p) for p in (first, second))
+
+    manager.sites['d.com'] = {'mode': 'mass', 'port': 3003, 'ssl': False}
+    assert manager.build_mass_map()
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
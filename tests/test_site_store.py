@@ -0,0 +1,79 @@
+import json
+import threading
+
+import pytest
+
+from vhost_manager import SiteStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SiteStore(str(tmp_path / "db" / "sites.db"))
+
+
+def test_nested_transaction_rolls_back_as_a_whole(store):
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store["a.com"] = {"port": 3000}
+            with store.transaction():
+                store["b.com"] = {"port": 3001}
+            raise RuntimeError("abort")
+    assert len(store) == 0
+
+
+def test_threads_roll_back_only_their_own_writes(store):
+    started = threading.Event()
+    written = threading.Event()
+    errors = []
+
+    def committer():
+        try:
+            started.wait(10)
+            with store.transaction():
+                with store.transaction():
+                    store["kept.com"] = {"port": 3000}
+            written.set()
+        except Exception as e:
+            errors.append(e)
+
+    def failing():
+        try:
+            with store.transaction():
+                with store.transaction():
+                    store["discarded.com"] = {"port": 3001}
+                started.set()
+                # The other thread must not be able to write into this transaction
+                written.wait(0.5)
+                raise RuntimeError("abort")
+        except RuntimeError:
+            pass
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=committer), threading.Thread(target=failing)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert list(store) == ["kept.com"]
+
+
+def test_legacy_json_is_imported_once(tmp_path):
+    legacy = tmp_path / "vhost_manager.json"
+    legacy.write_text(json.dumps({
+        "a.com": {"port": 3000, "ssl": True, "cert_expiry": "2026-12-01T00:00:00+00:00"},
+        "b.com": {"port": 3001, "ssl": False},
+    }))
+    store = SiteStore(str(tmp_path / "db" / "sites.db"))
+
+    assert store.import_json(str(legacy)) == 2
+    assert store["a.com"]["port"] == 3000
+    assert store.find_by_port(3001) == ["b.com"]
+    assert store.expiring_before("2027-01-01") == [("a.com", "2026-12-01T00:00:00+00:00")]
+
+    # Later edits of the legacy file are ignored once imported
+    legacy.write_text(json.dumps({"c.com": {"port": 3002}}))
+    assert store.import_json(str(legacy)) == 0
+    assert "c.com" not in store
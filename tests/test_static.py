@@ -0,0 +1,8 @@
+def test_precompressed_encoding_only_follows_the_sibling_rewrite(manager):
+    mount = manager.render_static_mount('/assets', '/srv/assets', precompressed=True)
+
+    assert '"$1.gz" [E=VHM_ENCODING:gzip,L]' in mount
+    assert '<FilesMatch' not in mount
+    for line in mount.splitlines():
+        if 'Content-Encoding' in line and line.strip().startswith('Header'):
+            assert "reqenv('REDIRECT_VHM_ENCODING')" in line
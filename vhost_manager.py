@@ -2,14 +2,47 @@
 
 import sys
 import os
+import math
+import bisect
+import mmap
+import base64
 import json
 import logging
 import subprocess
 import re
+import shlex
 import socket
+import hashlib
+import difflib
+import sqlite3
+import threading
+import shutil
+import signal
+import glob
+import time
+import asyncio
 import requests
 from pathlib import Path
-from datetime import datetime
+from urllib.parse import urlsplit
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+try:
+    import yaml
+except ImportError:  # PyYAML is only needed for YAML manifests
+    yaml = None
+
+try:
+    from cryptography import x509
+except ImportError:  # the certificate expiry is then read from the DER encoding directly
+    x509 = None
+
+try:
+    import check_dns
+except ImportError:  # check_dns.py is downloaded next to this script
+    check_dns = None
 
 # Setup logging
 def setup_logging():
@@ -29,6 +62,236 @@ def setup_logging():
 
 logger = setup_logging()
 
+class SiteStore(MutableMapping):
+    """
+    Site records backed by an indexed SQLite database
+    
+    Behaves like the ``{domain: record}`` dictionary the manager always
+    used, but each read is an indexed query and each write is its own
+    transaction (or part of an explicit ``transaction()`` block), so
+    concurrent CLI runs no longer overwrite each other's changes.
+    Records must be reassigned to persist nested changes.
+    
+    Every thread gets its own connection, so the transactions of the
+    ``serve`` daemon's worker threads stay isolated from each other.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sites (
+            domain TEXT PRIMARY KEY,
+            port INTEGER,
+            cert_expiry TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_sites_port ON sites(port);
+        CREATE INDEX IF NOT EXISTS idx_sites_cert_expiry ON sites(cert_expiry);
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS log_offsets (
+            path TEXT PRIMARY KEY,
+            inode INTEGER,
+            offset INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS log_stats (
+            domain TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+        os.chmod(path, 0o644)
+    
+    @property
+    def conn(self):
+        """Connection of the calling thread, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.depth = 0
+        return conn
+    
+    @contextmanager
+    def transaction(self):
+        """Group several writes of the calling thread into one atomic, write-locked transaction"""
+        conn = self.conn
+        local = self._local
+        if local.depth == 0:
+            conn.execute("BEGIN IMMEDIATE")
+        local.depth += 1
+        try:
+            yield self
+        except BaseException:
+            local.depth -= 1
+            if local.depth == 0:
+                conn.execute("ROLLBACK")
+            raise
+        local.depth -= 1
+        if local.depth == 0:
+            conn.execute("COMMIT")
+    
+    def __getitem__(self, domain):
+        row = self.conn.execute("SELECT data FROM sites WHERE domain = ?", (domain,)).fetchone()
+        if row is None:
+            raise KeyError(domain)
+        return json.loads(row[0])
+    
+    def __setitem__(self, domain, record):
+        self.conn.execute(
+            """INSERT INTO sites (domain, port, cert_expiry, data) VALUES (?, ?, ?, ?)
+               ON CONFLICT(domain) DO UPDATE SET
+                   port = excluded.port,
+                   cert_expiry = excluded.cert_expiry,
+                   data = excluded.data""",
+            (domain, record.get('port'), record.get('cert_expiry'), json.dumps(record))
+        )
+    
+    def __delitem__(self, domain):
+        if self.conn.execute("DELETE FROM sites WHERE domain = ?", (domain,)).rowcount == 0:
+            raise KeyError(domain)
+        self.conn.execute("DELETE FROM log_stats WHERE domain = ?", (domain,))
+    
+    def __contains__(self, domain):
+        return self.conn.execute("SELECT 1 FROM sites WHERE domain = ?", (domain,)).fetchone() is not None
+    
+    def __iter__(self):
+        return iter([row[0] for row in self.conn.execute("SELECT domain FROM sites ORDER BY domain")])
+    
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM sites").fetchone()[0]
+    
+    def items(self):
+        """Return all (domain, record) pairs with a single query"""
+        return [
+            (domain, json.loads(data))
+            for domain, data in self.conn.execute("SELECT domain, data FROM sites ORDER BY domain")
+        ]
+    
+    def values(self):
+        """Return all records with a single query"""
+        return [record for _, record in self.items()]
+    
+    def find_by_port(self, port):
+        """
+        Return the domains proxying to a local port
+        
+        Args:
+            port (int): Port number
+            
+        Returns:
+            list: Domain names
+        """
+        return [row[0] for row in self.conn.execute("SELECT domain FROM sites WHERE port = ?", (port,))]
+    
+    def find_by_socket(self, path):
+        """
+        Return the domains proxying to a Unix domain socket
+        
+        Args:
+            path (str): Socket path
+            
+        Returns:
+            list: Domain names
+        """
+        prefix = f"unix:{path}|"
+        return [row[0] for row in self.conn.execute(
+            """SELECT DISTINCT domain FROM sites, json_each(sites.data, '$.backends')
+               WHERE substr(json_extract(json_each.value, '$.url'), 1, ?) = ?
+               ORDER BY domain""",
+            (len(prefix), prefix)
+        )]
+    
+    def expiring_before(self, timestamp):
+        """
+        Return sites whose certificate expires before a point in time
+        
+        Args:
+            timestamp (str): ISO 8601 timestamp
+            
+        Returns:
+            list: (domain, cert_expiry) tuples, soonest first
+        """
+        return self.conn.execute(
+            "SELECT domain, cert_expiry FROM sites WHERE cert_expiry IS NOT NULL AND cert_expiry < ? "
+            "ORDER BY cert_expiry",
+            (timestamp,)
+        ).fetchall()
+    
+    def get_meta(self, key, default=None):
+        """Return a store-level setting"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+    
+    def set_meta(self, key, value):
+        """Persist a store-level setting"""
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+    
+    def get_log_offset(self, path):
+        """Return the (inode, byte offset) already read from a log file"""
+        row = self.conn.execute("SELECT inode, offset FROM log_offsets WHERE path = ?", (path,)).fetchone()
+        return (row[0], row[1]) if row else (None, 0)
+    
+    def set_log_offset(self, path, inode, offset):
+        """Remember how far a log file has been read"""
+        self.conn.execute(
+            """INSERT INTO log_offsets (path, inode, offset) VALUES (?, ?, ?)
+               ON CONFLICT(path) DO UPDATE SET inode = excluded.inode, offset = excluded.offset""",
+            (path, inode, offset)
+        )
+    
+    def get_log_stats(self, domain):
+        """Return the accumulated access log statistics of a domain, None if never read"""
+        row = self.conn.execute("SELECT data FROM log_stats WHERE domain = ?", (domain,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def set_log_stats(self, domain, stats):
+        """Persist the accumulated access log statistics of a domain"""
+        self.conn.execute(
+            "INSERT INTO log_stats (domain, data) VALUES (?, ?) ON CONFLICT(domain) DO UPDATE SET data = excluded.data",
+            (domain, json.dumps(stats))
+        )
+    
+    def clear_log_state(self):
+        """Forget every log offset and statistic so logs are read from the start"""
+        self.conn.execute("DELETE FROM log_offsets")
+        self.conn.execute("DELETE FROM log_stats")
+    
+    def import_json(self, json_path):
+        """
+        Import records from the legacy JSON configuration file once
+        
+        Args:
+            json_path (str): Path to the legacy configuration file
+            
+        Returns:
+            int: Number of imported sites, 0 if nothing was imported
+        """
+        if self.get_meta('json_imported') or not os.path.exists(json_path):
+            return 0
+        
+        with open(json_path, 'r') as f:
+            sites = json.load(f)
+        
+        with self.transaction():
+            for domain, record in sites.items():
+                if domain not in self:
+                    self[domain] = record
+            self.set_meta('json_imported', datetime.now().isoformat())
+        
+        return len(sites)
+
 class ApacheVHostManager:
     """
     Apache Virtual Host Manager
@@ -39,10 +302,107 @@ class ApacheVHostManager:
     
     VERSION = "1.0.0"
     
+    # Let's Encrypt limit on names per certificate
+    MAX_CERT_NAMES = 100
+    RENEWAL_WINDOW_DAYS = 30
+    # Stored in each webroot lineage so certbot's own timer reloads Apache after a renewal
+    CERTBOT_DEPLOY_HOOK = "systemctl reload apache2"
+    HEALTH_SAMPLES = 200
+    LOG_PROFILES = ('combined', 'latency', 'consolidated')
+    TLS_PROFILES = ('default', 'performance', 'performance-tickets')
+    # Backend protocols: HTTP/1.1, HTTP/2 cleartext (gRPC...) and HTTP/1.1 with WebSocket upgrades
+    UPSTREAM_PROTOCOLS = ('http1', 'h2c', 'ws')
+    CACHE_BACKENDS = ('disk', 'socache')
+    COMPRESSION_ALGORITHMS = ('br', 'gzip')
+    COMPRESSIBLE_TYPES = (
+        'text/html', 'text/plain', 'text/css', 'text/xml', 'text/javascript',
+        'application/javascript', 'application/json', 'application/xml',
+        'image/svg+xml', 'application/wasm'
+    )
+    # Content types restored for precompressed siblings (file.js.br -> text/javascript)
+    PRECOMPRESSED_TYPES = {
+        'js': 'text/javascript', 'css': 'text/css', 'svg': 'image/svg+xml', 'json': 'application/json',
+        'html': 'text/html', 'xml': 'application/xml', 'txt': 'text/plain', 'wasm': 'application/wasm'
+    }
+    LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+    STATS_PATH_LIMIT = 10000
+    # tune: proxying is I/O bound, so many threads per CPU stay cheap
+    MPM_THREADS_PER_CHILD = 64
+    MPM_THREADS_PER_CPU = 128
+    MPM_PROCESS_MB = 30
+    MPM_MEMORY_SHARE = 0.25
+    MPM_PEAK_FACTOR = 4
+    
+    # metrics: loopback port of the mod_status listener
+    STATUS_PORT = 8090
+    SCOREBOARD_STATES = {
+        '_': 'waiting', 'S': 'starting', 'R': 'reading', 'W': 'sending', 'K': 'keepalive',
+        'D': 'dns', 'C': 'closing', 'L': 'logging', 'G': 'graceful', 'I': 'idle_cleanup', '.': 'open'
+    }
+    
+    # serve: quiet period before a reload, and the longest a change may wait
+    DAEMON_DEBOUNCE = 2.0
+    DAEMON_MAX_DELAY = 10.0
+    
+    # combined, optionally preceded by the virtual host (%v/%V) and followed
+    # by the request duration and time to first byte of the latency format
+    ACCESS_LOG_PATTERN = re.compile(
+        rb'^(?:(?P<vhost>[^\s\[]+) )?(?P<client>\S+) \S+ \S+ \[(?P<time>[^\]]+)\] '
+        rb'"(?P<method>[A-Z]+) (?P<path>[^\s"?]*)[^"]*" (?P<status>\d{3}) (?P<bytes>\d+|-)'
+        rb'(?: "[^"]*" "[^"]*" (?P<duration>\d+) (?P<ttfb>\d+|-)(?: "[^"]*" "[^"]*" "(?P<cache>[^"]*)")?)?'
+    )
+    
+    # <Section args> and </Section> lines of an Apache configuration
+    SECTION_PATTERN = re.compile(r'^<(/?)([A-Za-z][\w.]*)\s*([^>]*)>$')
+    
+    # mod_proxy_balancer scheduling algorithms
+    LB_METHODS = ('byrequests', 'bytraffic', 'bybusyness', 'heartbeat')
+    
+    # ProxyPass worker parameters, in rendering order
+    POOL_PARAMETERS = (
+        'min', 'max', 'smax', 'ttl', 'keepalive', 'enablereuse',
+        'connectiontimeout', 'timeout', 'acquire', 'retry'
+    )
+    
+    # Named backend connection pool profiles
+    POOL_PRESETS = {
+        'default': {},
+        'high-throughput': {
+            'max': 200, 'smax': 100, 'ttl': 120, 'keepalive': 'On',
+            'enablereuse': 'On', 'connectiontimeout': 2, 'timeout': 60
+        },
+        'low-latency': {
+            'max': 50, 'smax': 25, 'ttl': 60, 'keepalive': 'On',
+            'enablereuse': 'On', 'connectiontimeout': 1, 'timeout': 15, 'retry': 0
+        },
+        'conservative': {
+            'max': 10, 'ttl': 30, 'keepalive': 'On',
+            'connectiontimeout': 5, 'timeout': 120
+        },
+    }
+    
     def __init__(self):
         self.sites_available = "/etc/apache2/sites-available"
+        self.sites_enabled = "/etc/apache2/sites-enabled"
+        self.mods_enabled = "/etc/apache2/mods-enabled"
+        self.confs_enabled = "/etc/apache2/conf-enabled"
+        self.snippets_dir = "/etc/apache2/conf-available"
+        self.mass_dir = "/etc/apache2/vhost-manager"
+        self.mass_map_source = f"{self.mass_dir}/hosts.txt"
+        # current -> maps/<generation>, swapped atomically on every rebuild
+        self.mass_map_file = f"{self.mass_dir}/current/hosts.map"
+        self.mass_config_file = f"{self.sites_available}/00-vhost-manager-mass.conf"
         self.config_file = "/etc/vhost_manager.json"
+        self.db_file = "/var/lib/vhost-manager/sites.db"
         self.log_dir = "/var/log/vhost-manager"
+        self.apache_log_dir = "/var/log/apache2"
+        self.letsencrypt_dir = "/etc/letsencrypt"
+        self.acme_webroot = "/var/lib/vhost-manager/acme"
+        self.cache_dir = "/var/cache/apache2/mod_cache_disk"
+        self.daemon_socket = "/run/vhost-manager.sock"
+        self.mpm_config_file = "/etc/apache2/mods-available/mpm_event.conf"
+        self._lint_cache = {}
+        self._certbot_lock = threading.Lock()
         
         # Ensure log directory exists
         os.makedirs(self.log_dir, exist_ok=True)
@@ -50,33 +410,17 @@ class ApacheVHostManager:
         self.load_config()
     
     def load_config(self):
-        """Load existing site configurations from JSON file"""
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    self.sites = json.load(f)
-                logger.info(f"Loaded configuration with {len(self.sites)} sites")
-            else:
-                self.sites = {}
-                logger.info("No existing configuration found, starting fresh")
-        except Exception as e:
-            logger.error(f"Failed to load configuration: {e}")
-            self.sites = {}
-    
-    def save_config(self):
-        """Save current site configurations to JSON file"""
+        """Open the site store, importing the legacy JSON configuration on first run"""
         try:
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(self.config_file), exist_ok=True)
-            
-            with open(self.config_file, 'w') as f:
-                json.dump(self.sites, f, indent=2)
-            
-            # Set appropriate permissions
-            os.chmod(self.config_file, 0o644)
-            logger.info("Configuration saved successfully")
+            self.sites = SiteStore(self.db_file)
+            imported = self.sites.import_json(self.config_file)
+            if imported:
+                logger.info(f"Imported {imported} sites from {self.config_file}")
+            logger.info(f"Loaded site store with {len(self.sites)} sites")
         except Exception as e:
-            logger.error(f"Failed to save configuration: {e}")
+            logger.error(f"Failed to open site store {self.db_file}: {e}")
+            print(f"❌ Failed to open site store: {e}")
+            sys.exit(1)
     
     def check_sudo(self):
         """Verify script is running with sudo privileges"""
@@ -89,21 +433,26 @@ class ApacheVHostManager:
         """
         Execute a system command
         
+        The command runs without a shell; a string is split with shell
+        quoting rules. The wall time of every command is logged.
+        
         Args:
-            command (str): Command to execute
+            command (str or list): Command to execute
             show_output (bool): Whether to display command output
             capture_output (bool): Whether to capture command output
             
         Returns:
             bool: True if command succeeded, False otherwise
         """
+        args = shlex.split(command) if isinstance(command, str) else [str(arg) for arg in command]
+        display = shlex.join(args)
+        started = time.monotonic()
         try:
-            logger.debug(f"Executing command: {command}")
+            logger.debug(f"Executing command: {display}")
             
             if capture_output:
                 result = subprocess.run(
-                    command, 
-                    shell=True, 
+                    args,
                     capture_output=True, 
                     text=True,
                     timeout=300  # 5 minute timeout
@@ -116,511 +465,4496 @@ class ApacheVHostManager:
                         print(result.stderr)
                 
                 if result.returncode != 0:
-                    logger.warning(f"Command failed with code {result.returncode}: {command}")
+                    logger.warning(f"Command failed with code {result.returncode}: {display}")
                     if result.stderr:
                         logger.warning(f"Error output: {result.stderr}")
-                
-                return result.returncode == 0
             else:
                 # For commands that need interactive input
-                result = subprocess.run(command, shell=True)
-                return result.returncode == 0
+                result = subprocess.run(args)
+            
+            return result.returncode == 0
                 
         except subprocess.TimeoutExpired:
-            logger.error(f"Command timed out: {command}")
+            logger.error(f"Command timed out: {display}")
             return False
         except Exception as e:
-            logger.error(f"Error executing command '{command}': {e}")
+            logger.error(f"Error executing command '{display}': {e}")
             return False
+        finally:
+            logger.info(f"Ran {display} in {time.monotonic() - started:.2f}s")
     
-    def create_vhost_config(self, domain, port, use_ssl=True):
+    def module_enabled(self, module):
+        """Return True if an Apache module is already enabled (checked on disk, no a2query fork)"""
+        return os.path.exists(f"{self.mods_enabled}/{module}.load")
+    
+    def conf_enabled(self, conf):
+        """Return True if a server-wide configuration is already enabled"""
+        return os.path.exists(f"{self.confs_enabled}/{conf}.conf")
+    
+    def site_enabled(self, name):
+        """Return True if a site configuration (``domain`` or ``domain-temp``) is enabled"""
+        return os.path.exists(f"{self.sites_enabled}/{name}.conf")
+    
+    def certbot_vhosts(self, domain):
         """
-        Create Apache Virtual Host configuration file
+        Return the names of the HTTPS copies the certbot Apache plugin may leave for a domain
+        
+        ``certbot --apache`` copies the site it validated into
+        ``<site>-le-ssl.conf`` and enables it. Once the domain's own
+        configuration is applied or removed, these copies are superseded.
         
         Args:
-            domain (str): Domain name for the Virtual Host
-            port (int): Local port to proxy to
-            use_ssl (bool): Whether to configure SSL/HTTPS
-            
+            domain (str): Domain name of the site
+        
         Returns:
-            str: Path to created configuration file, None if failed
+            list: Configuration names without ``.conf``
         """
-        logger.info(f"Creating Virtual Host configuration for {domain}:{port}")
-        
-        # Configuration for HTTP (with or without SSL redirect)
-        if use_ssl:
-            http_config = f"""<VirtualHost *:80>
-    ServerName {domain}
-    ServerAlias www.{domain}
-    
-    # Force HTTPS redirect
-    RewriteEngine On
-    RewriteCond %{{HTTPS}} off
-    RewriteRule ^(.*)$ https://%{{HTTP_HOST}}%{{REQUEST_URI}} [R=301,L]
-    
-    # Logging
-    ErrorLog ${{APACHE_LOG_DIR}}/{domain}-error.log
-    CustomLog ${{APACHE_LOG_DIR}}/{domain}-access.log combined
-    
-    # Security headers even for redirects
-    Header always set Strict-Transport-Security "max-age=63072000; includeSubDomains; preload"
-</VirtualHost>"""
-        else:
-            http_config = f"""<VirtualHost *:80>
-    ServerName {domain}
-    ServerAlias www.{domain}
+        return [f"{domain}-le-ssl", f"{domain}-temp-le-ssl"]
     
-    # Logging
-    ErrorLog ${{APACHE_LOG_DIR}}/{domain}-error.log
-    CustomLog ${{APACHE_LOG_DIR}}/{domain}-access.log combined
+    def enable_sites(self, names):
+        """
+        Enable site configurations with a single a2ensite call
+        
+        Args:
+            names (list): Configuration names without ``.conf``
+            
+        Returns:
+            bool: True if every site is enabled (no process is spawned if they already are)
+        """
+        missing = [name for name in dict.fromkeys(names) if not self.site_enabled(name)]
+        return not missing or self.run_command(["a2ensite", "-q", *missing])
     
-    # Proxy configuration
-    ProxyPreserveHost On
-    ProxyPass / http://localhost:{port}/
-    ProxyPassReverse / http://localhost:{port}/
+    def disable_sites(self, names):
+        """
+        Disable site configurations with a single a2dissite call
+        
+        Args:
+            names (list): Configuration names without ``.conf``
+            
+        Returns:
+            bool: True if no listed site is left enabled
+        """
+        enabled = [name for name in dict.fromkeys(names) if self.site_enabled(name)]
+        return not enabled or self.run_command(["a2dissite", "-q", *enabled])
     
-    # Proxy headers
-    ProxyAddHeaders On
-    RequestHeader set X-Forwarded-Proto "http"
-    RequestHeader set X-Forwarded-For %{{REMOTE_ADDR}}s
-    RequestHeader set X-Real-IP %{{REMOTE_ADDR}}s
+    def certbot_available(self):
+        """Return True if certbot is on the PATH"""
+        return shutil.which("certbot") is not None
     
-    # Security headers
-    Header always set X-Frame-Options DENY
-    Header always set X-Content-Type-Options nosniff
-    Header always set X-XSS-Protection "1; mode=block"
-    Header always set Referrer-Policy "strict-origin-when-cross-origin"
-</VirtualHost>"""
-
-        # HTTPS configuration
-        https_config = f"""
-# HTTPS Configuration
+    def render_shared_snippets(self):
+        """
+        Render configuration snippets shared by every generated Virtual Host
+        
+        Each Virtual Host includes these files instead of carrying its own
+        copy, so a global policy change only rewrites one file.
+        
+        Returns:
+            dict: Mapping of snippet file path to content
+        """
+        tls_base = """SSLProtocol all -SSLv3 -TLSv1 -TLSv1.1
+SSLCipherSuite ECDHE-ECDSA-AES128-GCM-SHA256:ECDHE-RSA-AES128-GCM-SHA256:ECDHE-ECDSA-AES256-GCM-SHA384:ECDHE-RSA-AES256-GCM-SHA384
+SSLHonorCipherOrder off
+"""
+        tls_performance = tls_base + """Protocols h2 http/1.1
+SSLUseStapling on
+"""
+        snippets = {
+            'proxy': """# Managed by vhost_manager.py - proxy headers
+ProxyPreserveHost On
+ProxyAddHeaders On
+RequestHeader set X-Forwarded-Proto expr=%{REQUEST_SCHEME}
+RequestHeader set X-Forwarded-For %{REMOTE_ADDR}s
+RequestHeader set X-Real-IP %{REMOTE_ADDR}s
+""",
+            'headers': """# Managed by vhost_manager.py - security headers
+Header always set X-Frame-Options DENY
+Header always set X-Content-Type-Options nosniff
+Header always set X-XSS-Protection "1; mode=block"
+Header always set Referrer-Policy "strict-origin-when-cross-origin"
+""",
+            'hsts': """# Managed by vhost_manager.py - HTTP Strict Transport Security
+Header always set Strict-Transport-Security "max-age=63072000; includeSubDomains; preload"
+""",
+            'csp': """# Managed by vhost_manager.py - Content Security Policy
+Header always set Content-Security-Policy "default-src 'self'; script-src 'self' 'unsafe-inline' 'unsafe-eval'; style-src 'self' 'unsafe-inline';"
+""",
+            'acme': f"""# Managed by vhost_manager.py - ACME HTTP-01 challenges (certbot --webroot)
+ProxyPass /.well-known/acme-challenge/ !
+Alias /.well-known/acme-challenge/ {self.acme_webroot}/.well-known/acme-challenge/
+<Directory "{self.acme_webroot}/.well-known/acme-challenge/">
+    Options None
+    AllowOverride None
+    ForceType text/plain
+    Require all granted
+</Directory>
+""",
+            'ssl': f"""# Managed by vhost_manager.py - modern SSL configuration
+{tls_base}SSLSessionTickets off
+""",
+            'ssl-performance': f"""# Managed by vhost_manager.py - SSL performance profile
+# (HTTP/2, OCSP stapling, resumption through the shared session cache)
+{tls_performance}SSLSessionTickets off
+""",
+            'ssl-performance-tickets': f"""# Managed by vhost_manager.py - SSL performance profile with session tickets
+# (ticket keys only rotate when Apache restarts)
+{tls_performance}SSLSessionTickets on
+""",
+            'tls': """# Managed by vhost_manager.py - TLS caches (server-wide, enabled with a2enconf)
 <IfModule mod_ssl.c>
-<VirtualHost *:443>
-    ServerName {domain}
-    ServerAlias www.{domain}
-    
-    # Logging
-    ErrorLog ${{APACHE_LOG_DIR}}/{domain}-ssl-error.log
-    CustomLog ${{APACHE_LOG_DIR}}/{domain}-ssl-access.log combined
-    
-    # Proxy configuration
-    ProxyPreserveHost On
-    ProxyPass / http://localhost:{port}/
-    ProxyPassReverse / http://localhost:{port}/
-    
-    # Proxy headers for HTTPS
-    ProxyAddHeaders On
-    RequestHeader set X-Forwarded-Proto "https"
-    RequestHeader set X-Forwarded-For %{{REMOTE_ADDR}}s
-    RequestHeader set X-Real-IP %{{REMOTE_ADDR}}s
-    
-    # SSL Configuration (will be managed by Certbot)
-    SSLEngine on
-    # Default certificates (will be replaced by Certbot)
-    SSLCertificateFile /etc/ssl/certs/ssl-cert-snakeoil.pem
-    SSLCertificateKeyFile /etc/ssl/private/ssl-cert-snakeoil.key
+    SSLSessionCache shmcb:${APACHE_RUN_DIR}/vhost_manager_scache(512000)
+    SSLSessionCacheTimeout 300
+    SSLStaplingCache shmcb:${APACHE_RUN_DIR}/vhost_manager_stapling(128000)
+    SSLStaplingResponderTimeout 5
+    SSLStaplingReturnResponderErrors off
+</IfModule>
+""",
+            'logging': """# Managed by vhost_manager.py - log formats (server-wide, enabled with a2enconf)
+<IfModule logio_module>
+    LogIOTrackTTFB ON
+</IfModule>
+
+# combined + request duration (%D, microseconds), time to first byte from the
+# backend (%^FB), the balancer member that served the request and mod_cache's verdict
+LogFormat "%v %h %l %u %t \\"%r\\" %>s %O \\"%{Referer}i\\" \\"%{User-Agent}i\\" %D %^FB \\"%{Host}i\\" \\"%{BALANCER_WORKER_NAME}e\\" \\"%{cache-status}e\\"" vhost_manager_latency
+
+# Sites with the consolidated profile declare no log of their own and share
+# this buffered file: one descriptor per child instead of four per site
+BufferedLogs On
+CustomLog ${APACHE_LOG_DIR}/vhost-manager-access.log vhost_manager_latency
+""",
+            'status': f"""# Managed by vhost_manager.py - mod_status for metrics (server-wide, enabled with a2enconf)
+# A loopback-only listener keeps the endpoint out of every proxied site
+<IfModule mod_status.c>
+    ExtendedStatus On
+    Listen 127.0.0.1:{self.STATUS_PORT}
+    <VirtualHost 127.0.0.1:{self.STATUS_PORT}>
+        ServerName localhost
+        <Location /server-status>
+            SetHandler server-status
+            Require local
+        </Location>
+    </VirtualHost>
+</IfModule>
+""",
+        }
+        return {self.snippet_path(name): content for name, content in snippets.items()}
     
-    # Modern SSL configuration
-    SSLProtocol all -SSLv3 -TLSv1 -TLSv1.1
-    SSLCipherSuite ECDHE-ECDSA-AES128-GCM-SHA256:ECDHE-RSA-AES128-GCM-SHA256:ECDHE-ECDSA-AES256-GCM-SHA384:ECDHE-RSA-AES256-GCM-SHA384
-    SSLHonorCipherOrder off
-    SSLSessionTickets off
+    def snippet_path(self, name):
+        """Return the path of a shared configuration snippet"""
+        return f"{self.snippets_dir}/vhost-manager-{name}.conf"
     
-    # Security headers for HTTPS
-    Header always set Strict-Transport-Security "max-age=63072000; includeSubDomains; preload"
-    Header always set X-Frame-Options DENY
-    Header always set X-Content-Type-Options nosniff
-    Header always set X-XSS-Protection "1; mode=block"
-    Header always set Referrer-Policy "strict-origin-when-cross-origin"
-    Header always set Content-Security-Policy "default-src 'self'; script-src 'self' 'unsafe-inline' 'unsafe-eval'; style-src 'self' 'unsafe-inline';"
-</VirtualHost>
-</IfModule>"""
-        
-        # Combine configurations
-        config_content = http_config + https_config
-        config_path = f"{self.sites_available}/{domain}.conf"
+    def ensure_shared_snippets(self):
+        """
+        Write shared configuration snippets whose content changed
         
+        Returns:
+            list: Paths of snippets that were (re)written, None if failed
+        """
+        changed = []
         try:
-            # Ensure sites-available directory exists
-            os.makedirs(self.sites_available, exist_ok=True)
-            
-            with open(config_path, 'w') as f:
-                f.write(config_content)
-            
-            # Set appropriate permissions
-            os.chmod(config_path, 0o644)
-            
-            logger.info(f"Virtual Host configuration created: {config_path}")
-            return config_path
-            
+            os.makedirs(self.snippets_dir, exist_ok=True)
+            os.makedirs(f"{self.acme_webroot}/.well-known/acme-challenge", exist_ok=True)
+            for path, content in self.pending_snippets().items():
+                with open(path, 'w') as f:
+                    f.write(content)
+                os.chmod(path, 0o644)
+                changed.append(path)
+                logger.info(f"Wrote shared snippet: {path}")
         except Exception as e:
-            logger.error(f"Failed to create configuration file: {e}")
-            print(f"❌ Error creating configuration file: {e}")
+            logger.error(f"Failed to write shared snippets: {e}")
+            print(f"❌ Error writing shared configuration snippets: {e}")
             return None
+        return changed
     
-    def enable_modules(self):
-        """Enable required Apache modules"""
-        modules = ['proxy', 'proxy_http', 'rewrite', 'ssl', 'headers']
-        print("🔧 Enabling required Apache modules...")
+    def pending_snippets(self):
+        """
+        Return shared snippets whose rendered content differs from disk
         
-        for module in modules:
-            if self.run_command(f"a2enmod {module}"):
-                logger.info(f"Enabled Apache module: {module}")
-            else:
-                logger.warning(f"Failed to enable module {module} (may already be enabled)")
+        Returns:
+            dict: Mapping of snippet file path to desired content
+        """
+        return {
+            path: content
+            for path, content in self.render_shared_snippets().items()
+            if self.read_file(path) != content
+        }
     
-    def validate_domain(self, domain):
+    def read_file(self, path):
         """
-        Validate domain name format
+        Read a text file
         
         Args:
-            domain (str): Domain name to validate
+            path (str): File path
             
         Returns:
-            bool: True if domain is valid, False otherwise
+            str: File content, None if the file does not exist
         """
-        # Basic domain validation regex
-        domain_pattern = r'^[a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?(\.[a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)*$'
-        
-        if not re.match(domain_pattern, domain):
-            return False
-        
-        # Additional checks
-        if len(domain) > 253:
-            return False
-        
-        if domain.startswith('-') or domain.endswith('-'):
-            return False
-        
-        return True
+        try:
+            with open(path, 'r') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
     
-    def validate_port(self, port):
+    def render_header_overrides(self, site):
         """
-        Validate port number
+        Render per-site header overrides placed after the shared snippets
         
         Args:
-            port (str or int): Port number to validate
+            site (dict): Site record, ``headers`` maps header names to
+                values (None removes the header)
             
         Returns:
-            int: Valid port number, None if invalid
+            str: Rendered directives, empty if the site has no overrides
         """
-        try:
-            port_num = int(port)
-            if 1 <= port_num <= 65535:
-                return port_num
+        headers = (site or {}).get('headers') or {}
+        if not headers:
+            return ""
+        
+        lines = ["", "    ", "    # Per-site header overrides"]
+        for name, value in headers.items():
+            if value is None or value is False:
+                lines.append(f"    Header always unset {name}")
             else:
-                print(f"❌ Port {port_num} is out of valid range (1-65535)")
-                return None
-        except ValueError:
-            print(f"❌ Invalid port format: {port}")
-            return None
+                escaped = str(value).replace('"', '\\"')
+                lines.append(f'    Header always set {name} "{escaped}"')
+        return "\n".join(lines)
     
-    def check_port_available(self, port):
+    def normalize_site_options(self, entry):
         """
-        Check if a port is available on localhost
+        Validate and resolve per-site settings from a manifest entry or CLI flags
         
         Args:
-            port (int): Port number to check
+            entry (dict): Raw site definition (manifest entry or parsed flags)
             
         Returns:
-            bool: True if port is available, False if in use
+            tuple: (options, errors) where options holds the settings to store
+                in the site record and errors lists validation messages
         """
-        try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                result = s.connect_ex(('localhost', port))
-                return result != 0  # Port is available if connection fails
-        except Exception:
-            return True  # Assume available if check fails
+        options = {}
+        errors = []
+        
+        headers = entry.get('headers') or {}
+        if not isinstance(headers, dict):
+            errors.append("headers must be a mapping of name to value")
+        elif headers:
+            options['headers'] = headers
+        
+        backends = entry.get('backends') or []
+        standby = entry.get('standby') or []
+        if isinstance(backends, (str, int)):
+            backends = str(backends).split(',')
+        if isinstance(standby, (str, int)):
+            standby = str(standby).split(',')
+        members = []
+        for spec, is_standby in [(b, False) for b in backends] + [(b, True) for b in standby]:
+            url = self.parse_backend(spec)
+            if url is None:
+                errors.append(f"Invalid backend '{spec}' (expected port, host:port or unix:/path.sock)")
+            elif any(member['url'] == url for member in members):
+                errors.append(f"Duplicate backend '{spec}'")
+            else:
+                members.append({'url': url, 'standby': is_standby})
+        if members:
+            if all(member['standby'] for member in members):
+                errors.append("At least one active (non-standby) backend is required")
+            options['backends'] = members
+            lbmethod = entry.get('lbmethod', 'byrequests')
+            if lbmethod not in self.LB_METHODS:
+                errors.append(f"Unknown lbmethod '{lbmethod}' (available: {', '.join(self.LB_METHODS)})")
+            elif self.uses_balancer(options):
+                options['lbmethod'] = lbmethod
+        
+        protocol = entry.get('protocol', 'http1')
+        if protocol not in self.UPSTREAM_PROTOCOLS:
+            errors.append(f"Unknown protocol '{protocol}' (available: {', '.join(self.UPSTREAM_PROTOCOLS)})")
+        elif protocol != 'http1':
+            options['protocol'] = protocol
+        
+        tls_profile = entry.get('tls_profile', 'default')
+        if tls_profile not in self.TLS_PROFILES:
+            errors.append(f"Unknown tls_profile '{tls_profile}' (available: {', '.join(self.TLS_PROFILES)})")
+        elif tls_profile != 'default':
+            options['tls_profile'] = tls_profile
+        
+        log_profile = entry.get('log_profile', 'combined')
+        if log_profile not in self.LOG_PROFILES:
+            errors.append(f"Unknown log_profile '{log_profile}' (available: {', '.join(self.LOG_PROFILES)})")
+        elif log_profile != 'combined':
+            options['log_profile'] = log_profile
+        
+        if entry.get('cache'):
+            cache, cache_errors = self.resolve_cache(entry['cache'])
+            errors.extend(cache_errors)
+            if cache:
+                options['cache'] = cache
+        
+        if entry.get('compression'):
+            compression, compression_errors = self.resolve_compression(entry['compression'])
+            errors.extend(compression_errors)
+            if compression:
+                options['compression'] = compression
+        
+        if entry.get('static'):
+            static, static_errors = self.resolve_static(entry['static'])
+            errors.extend(static_errors)
+            if static:
+                options['static'] = static
+                precompressed = options.get('compression', {}).get('precompressed', {})
+                for url_path, directory in static['mounts'].items():
+                    if precompressed.get(url_path, directory) != directory:
+                        errors.append(f"{url_path} is mounted from two directories "
+                                      f"({directory}, {precompressed[url_path]})")
+        
+        if entry.get('pool'):
+            pool, pool_errors = self.resolve_pool(entry['pool'])
+            errors.extend(pool_errors)
+            if pool:
+                options['pool'] = pool
+        
+        return options, errors
     
-    def check_domain_dns(self, domain):
+    def resolve_cache(self, cache):
         """
-        Check if domain DNS points to current server
+        Validate a per-site cache policy
         
         Args:
-            domain (str): Domain name to check
+            cache (dict or str or bool): ``disk``/``socache``/True for the
+                defaults, or a mapping with backend, ttl, max_ttl, paths and
+                honor_cache_control
             
         Returns:
-            bool: True if DNS points to current server, False otherwise
+            tuple: (policy, errors)
         """
-        try:
-            current_ip = requests.get('https://api.ipify.org').text
-            domain_ip = socket.gethostbyname(domain)
-            return domain_ip == current_ip
-        except Exception as e:
-            logger.error(f"Failed to check domain DNS: {e}")
-            return False
+        if cache is True:
+            cache = {}
+        elif isinstance(cache, str):
+            cache = {'backend': cache}
+        if not isinstance(cache, dict):
+            return None, ["cache must be disk, socache or a mapping"]
+        
+        errors = []
+        policy = {
+            'backend': cache.get('backend', 'disk'),
+            'ttl': cache.get('ttl', 300),
+            'max_ttl': cache.get('max_ttl', 86400),
+            'paths': cache.get('paths', ['/']),
+            'honor_cache_control': cache.get('honor_cache_control', True)
+        }
+        if policy['backend'] not in self.CACHE_BACKENDS:
+            errors.append(f"Unknown cache backend '{policy['backend']}' (available: {', '.join(self.CACHE_BACKENDS)})")
+        for key in ('ttl', 'max_ttl'):
+            try:
+                policy[key] = int(policy[key])
+                if policy[key] < 1:
+                    raise ValueError
+            except (TypeError, ValueError):
+                errors.append(f"cache {key} must be a positive number of seconds")
+        if isinstance(policy['paths'], str):
+            policy['paths'] = [p.strip() for p in policy['paths'].split(',') if p.strip()]
+        for path in policy['paths']:
+            if not isinstance(path, str) or not re.match(r'^/[A-Za-z0-9._~/\-]*$', path):
+                errors.append(f"Invalid cache path '{path}' (expected a prefix such as /api)")
+        if isinstance(policy['honor_cache_control'], str):
+            policy['honor_cache_control'] = policy['honor_cache_control'].lower() in ('true', 'yes', 'on', '1')
+        if not errors and policy['max_ttl'] < policy['ttl']:
+            policy['max_ttl'] = policy['ttl']
+        return policy, errors
     
-    def install_ssl_certificate(self, domain):
+    def parse_mounts(self, mounts):
         """
-        Install SSL certificate using Let's Encrypt
+        Parse URL path to directory mounts
         
         Args:
-            domain (str): Domain name for SSL certificate
+            mounts (dict or list or str): ``{'/assets': '/srv/app/public'}``,
+                or ``/assets=/srv/app/public`` strings (comma separated)
+            
+        Returns:
+            tuple: ({url path: directory}, errors)
+        """
+        if isinstance(mounts, str):
+            mounts = [m for m in mounts.split(',') if m.strip()]
+        if isinstance(mounts, list):
+            pairs = {}
+            for mount in mounts:
+                url_path, _, directory = str(mount).partition('=')
+                pairs[url_path.strip()] = directory.strip()
+            mounts = pairs
+        if not isinstance(mounts, dict):
+            return {}, ["mounts must map URL paths to directories"]
+        
+        parsed = {}
+        errors = []
+        for url_path, directory in mounts.items():
+            url_path = '/' + str(url_path).strip('/')
+            directory = str(directory or '').rstrip('/')
+            if url_path == '/' or not re.match(r'^/[A-Za-z0-9._~/\-]+$', url_path):
+                errors.append(f"Invalid mount path '{url_path}' (expected a prefix such as /assets)")
+            elif not directory.startswith('/') or not re.match(r'^[A-Za-z0-9._~/\-]+$', directory):
+                errors.append(f"Invalid directory '{directory}' for {url_path} (expected an absolute path)")
+            else:
+                parsed[url_path] = directory
+        return parsed, errors
+    
+    def resolve_compression(self, compression):
+        """
+        Validate per-site compression settings
+        
+        Args:
+            compression (dict or str or bool): True for the defaults, a comma
+                separated algorithm list, or a mapping with algorithms, types,
+                min_size, level and precompressed
+            
+        Returns:
+            tuple: (settings, errors)
+        """
+        if compression is True:
+            compression = {}
+        elif isinstance(compression, str):
+            compression = {'algorithms': compression}
+        if not isinstance(compression, dict):
+            return None, ["compression must be true, an algorithm list or a mapping"]
+        
+        errors = []
+        algorithms = compression.get('algorithms', list(self.COMPRESSION_ALGORITHMS))
+        if isinstance(algorithms, str):
+            algorithms = [a.strip() for a in algorithms.split(',') if a.strip()]
+        for algorithm in algorithms:
+            if algorithm not in self.COMPRESSION_ALGORITHMS:
+                errors.append(f"Unknown compression algorithm '{algorithm}' "
+                              f"(available: {', '.join(self.COMPRESSION_ALGORITHMS)})")
+        
+        types = compression.get('types', list(self.COMPRESSIBLE_TYPES))
+        if isinstance(types, str):
+            types = [t.strip() for t in types.split(',') if t.strip()]
+        for mime_type in types:
+            if not re.match(r'^[a-z0-9.+\-]+/[a-z0-9.+\-]+$', str(mime_type)):
+                errors.append(f"Invalid MIME type '{mime_type}'")
+        
+        settings = {'algorithms': algorithms, 'types': types}
+        for key, default, low, high in (('min_size', 1024, 0, None), ('level', 5, 1, 9)):
+            try:
+                value = int(compression.get(key, default))
+                if value < low or (high is not None and value > high):
+                    raise ValueError
+                settings[key] = value
+            except (TypeError, ValueError):
+                bounds = f"between {low} and {high}" if high else f"at least {low}"
+                errors.append(f"compression {key} must be a number {bounds}")
+        
+        precompressed, mount_errors = self.parse_mounts(compression.get('precompressed') or {})
+        errors.extend(mount_errors)
+        if precompressed:
+            settings['precompressed'] = precompressed
+        return settings, errors
+    
+    def resolve_static(self, static):
+        """
+        Validate per-site static mounts
+        
+        Args:
+            static (dict or list or str): Mounts (see parse_mounts), or a
+                mapping with mounts, max_age (seconds) and sendfile
+            
+        Returns:
+            tuple: (settings, errors)
+        """
+        if not (isinstance(static, dict) and 'mounts' in static):
+            static = {'mounts': static}
+        
+        mounts, errors = self.parse_mounts(static.get('mounts') or {})
+        settings = {'mounts': mounts, 'sendfile': static.get('sendfile', False)}
+        if isinstance(settings['sendfile'], str):
+            settings['sendfile'] = settings['sendfile'].lower() in ('true', 'yes', 'on', '1')
+        try:
+            settings['max_age'] = int(static.get('max_age', 2592000))
+            if settings['max_age'] < 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            errors.append("static max_age must be a number of seconds")
+        if not mounts and not errors:
+            errors.append("static needs at least one /path=/directory mount")
+        return settings, errors
+    
+    def check_static_mounts(self, site):
+        """
+        Warn about static mounts Apache will not be able to serve
+        
+        Args:
+            site (dict): Site record or normalized options
+        """
+        static = (site or {}).get('static')
+        if not static:
+            return
+        for url_path, directory in static['mounts'].items():
+            if not os.path.isdir(directory):
+                print(f"⚠️  Static directory {directory} for {url_path} does not exist yet")
+        if static['sendfile'] and not os.path.exists("/etc/apache2/mods-available/xsendfile.load"):
+            print("⚠️  X-Sendfile needs mod_xsendfile: sudo apt install libapache2-mod-xsendfile")
+    
+    def describe_static(self, static):
+        """Return a one-line summary of static mounts"""
+        mounts = ", ".join(f"{path} → {directory}" for path, directory in static['mounts'].items())
+        summary = f"{mounts} (max-age {static['max_age']}s"
+        return summary + (", X-Sendfile)" if static['sendfile'] else ")")
+    
+    def describe_compression(self, compression):
+        """Return a one-line summary of compression settings"""
+        summary = (f"{', '.join(compression['algorithms'])}, level {compression['level']}, "
+                   f"min {compression['min_size']} bytes, {len(compression['types'])} types")
+        if compression.get('precompressed'):
+            summary += f", precompressed {', '.join(compression['precompressed'])}"
+        return summary
+    
+    def render_compression_directives(self, site):
+        """
+        Render on-the-fly compression through a mod_filter chain
+        
+        Brotli is preferred when the client accepts it, gzip otherwise.
+        
+        Args:
+            site (dict): Site record, ``compression`` holds the settings
+            
+        Returns:
+            str: Rendered directives, empty if compression is off
+        """
+        compression = (site or {}).get('compression')
+        if not compression or not compression['algorithms']:
+            return ""
+        
+        types = "|".join(re.escape(t) for t in compression['types'])
+        condition = (f"%{{CONTENT_TYPE}} =~ m#^({types})# && "
+                     f"(-z %{{resp:Content-Length}} || %{{resp:Content-Length}} -ge {compression['min_size']})")
+        providers = {'br': ('BROTLI_COMPRESS', 'br'), 'gzip': ('DEFLATE', 'gzip')}
+        
+        lines = ["", "    ", "    # Compression (mod_filter chain, first matching encoding wins)",
+                 "    FilterDeclare vhost_manager_compress CONTENT_SET"]
+        for algorithm in compression['algorithms']:
+            provider, token = providers[algorithm]
+            lines.append(f'    FilterProvider vhost_manager_compress {provider} '
+                         f'"%{{req:Accept-Encoding}} =~ /{token}/ && {condition}"')
+        lines += [
+            "    FilterProtocol vhost_manager_compress change=yes;byteranges=no",
+            "    FilterChain vhost_manager_compress"
+        ]
+        if 'gzip' in compression['algorithms']:
+            lines.append(f"    DeflateCompressionLevel {compression['level']}")
+        if 'br' in compression['algorithms']:
+            lines.append(f"    BrotliCompressionQuality {compression['level']}")
+        return "\n".join(lines)
+    
+    def render_static_mount(self, url_path, directory, precompressed=False, max_age=None):
+        """
+        Render a directory served by Apache instead of the backend
+        
+        Args:
+            url_path (str): URL prefix such as ``/assets``
+            directory (str): Directory on disk
+            precompressed (bool): Serve .br/.gz siblings to clients accepting them
+            max_age (int): Browser cache lifetime in seconds, None to leave it to Apache
+            
+        Returns:
+            str: Indented directives, to be placed before the ProxyPass for /
+        """
+        lines = [
+            f"    # Static files: {url_path} (served by Apache)",
+            f"    ProxyPass {url_path}/ !",
+            f"    Alias {url_path}/ {directory}/",
+            f'    <Directory "{directory}/">',
+            "        Options -Indexes +FollowSymLinks",
+            "        AllowOverride None",
+            "        Require all granted"
+        ]
+        if max_age is not None:
+            lines += [
+                "        # Long-lived browser caching (Expires and Cache-Control: max-age)",
+                "        ExpiresActive On",
+                f'        ExpiresDefault "access plus {max_age} seconds"',
+                '        Header merge Cache-Control "public"'
+            ]
+        if precompressed:
+            extensions = "|".join(self.PRECOMPRESSED_TYPES)
+            lines += [
+                "        # Precompressed siblings (file.js.br, file.js.gz) when the client accepts them",
+                "        RewriteEngine On",
+                f"        RewriteBase {url_path}/",
+                '        RewriteCond "%{HTTP:Accept-Encoding}" "br"',
+                '        RewriteCond "%{REQUEST_FILENAME}.br" -s',
+                f'        RewriteRule "^(.+\\.({extensions}))$" "$1.br" [E=VHM_ENCODING:br,L]',
+                '        RewriteCond "%{HTTP:Accept-Encoding}" "gzip"',
+                '        RewriteCond "%{REQUEST_FILENAME}.gz" -s',
+                f'        RewriteRule "^(.+\\.({extensions}))$" "$1.gz" [E=VHM_ENCODING:gzip,L]',
+                "        # Only rewritten siblings (REDIRECT_VHM_ENCODING after the internal redirect)",
+                "        # get a Content-Encoding: .gz/.br files requested directly are plain downloads"
+            ]
+            for extension, mime_type in self.PRECOMPRESSED_TYPES.items():
+                lines += [
+                    '        RewriteCond "%{ENV:REDIRECT_VHM_ENCODING}" "^(br|gzip)$"',
+                    f'        RewriteRule "\\.{extension}\\.(br|gz)$" "-" [T={mime_type},E=no-brotli:1,E=no-gzip:1]'
+                ]
+            lines += [
+                f'        Header set Content-Encoding {encoding} "expr=reqenv(\'REDIRECT_VHM_ENCODING\') == \'{encoding}\'"'
+                for encoding in ('br', 'gzip')
+            ]
+            lines.append('        Header append Vary Accept-Encoding "expr=-n reqenv(\'REDIRECT_VHM_ENCODING\')"')
+        lines.append("    </Directory>")
+        return "\n".join(lines)
+    
+    def render_static_directives(self, site):
+        """
+        Render the directories a site serves directly
+        
+        Args:
+            site (dict): Site record
+            
+        Returns:
+            str: Rendered mounts followed by a blank line, empty if none
+        """
+        precompressed = ((site or {}).get('compression') or {}).get('precompressed', {})
+        static = (site or {}).get('static') or {'mounts': {}}
+        directories = {**precompressed, **static['mounts']}
+        
+        mounts = [
+            self.render_static_mount(
+                url_path,
+                directory,
+                precompressed=url_path in precompressed,
+                max_age=static['max_age'] if url_path in static['mounts'] else None
+            )
+            for url_path, directory in sorted(directories.items())
+        ]
+        if static.get('sendfile'):
+            mounts.append("\n".join(
+                ["    # X-Sendfile: the backend may hand large bodies to Apache (mod_xsendfile)",
+                 "    <IfModule mod_xsendfile.c>",
+                 "        XSendFile On"]
+                + [f"        XSendFilePath {directory}" for directory in sorted(set(static['mounts'].values()))]
+                + ["    </IfModule>"]
+            ))
+        if not mounts:
+            return ""
+        return "\n    \n".join(mounts) + "\n    \n"
+    
+    def cache_root(self, domain):
+        """Return the mod_cache_disk root of a site"""
+        return f"{self.cache_dir}/{domain}"
+    
+    def render_cache_directives(self, domain, site):
+        """
+        Render the response cache directives of a site
+        
+        Args:
+            domain (str): Domain name of the site
+            site (dict): Site record, ``cache`` holds the policy
+            
+        Returns:
+            str: Rendered directives, empty if the site has no cache
+        """
+        cache = (site or {}).get('cache')
+        if not cache:
+            return ""
+        
+        backend = cache['backend']
+        lines = ["", "    ", f"    # Response cache (mod_cache_{backend})"]
+        # Run after access control and rewrites instead of short-circuiting them
+        lines.append("    CacheQuickHandler off")
+        if backend == 'disk':
+            lines.append(f"    CacheRoot {self.cache_root(domain)}")
+        else:
+            lines.append("    CacheSocache shmcb")
+        for path in cache['paths']:
+            lines.append(f"    CacheEnable {backend} {path}")
+        lines += [
+            f"    CacheDefaultExpire {cache['ttl']}",
+            f"    CacheMaxExpire {cache['max_ttl']}",
+            "    CacheIgnoreHeaders Set-Cookie",
+            "    CacheLock on",
+            "    CacheLockMaxAge 5",
+            "    CacheHeader on"
+        ]
+        if not cache['honor_cache_control']:
+            lines += [
+                "    # Backend Cache-Control is ignored: private/no-store responses are cached too",
+                "    CacheIgnoreCacheControl On",
+                "    CacheIgnoreNoLastMod On",
+                "    CacheStorePrivate On",
+                "    CacheStoreNoStore On"
+            ]
+        return "\n".join(lines)
+    
+    def describe_cache(self, cache):
+        """Return a one-line summary of a cache policy"""
+        honor = "honors" if cache['honor_cache_control'] else "ignores"
+        return (f"{cache['backend']}, ttl {cache['ttl']}s (max {cache['max_ttl']}s), "
+                f"{', '.join(cache['paths'])}, {honor} Cache-Control")
+    
+    def ensure_cache_root(self, domain, site):
+        """
+        Create the disk cache root of a site, writable by Apache
+        
+        Args:
+            domain (str): Domain name of the site
+            site (dict): Site record or normalized options
+        """
+        cache = (site or {}).get('cache')
+        if not cache or cache['backend'] != 'disk':
+            return
+        root = self.cache_root(domain)
+        try:
+            os.makedirs(root, exist_ok=True)
+            shutil.chown(root, 'www-data', 'www-data')
+        except (OSError, LookupError) as e:
+            logger.warning(f"Could not prepare cache root {root}: {e}")
+    
+    def resolve_pool(self, pool):
+        """
+        Resolve backend connection pool settings against the named presets
+        
+        Args:
+            pool (str or dict): Preset name, or mapping with an optional
+                ``profile`` plus explicit worker parameters
+            
+        Returns:
+            tuple: (pool settings, errors)
+        """
+        if isinstance(pool, str):
+            pool = {'profile': pool}
+        if not isinstance(pool, dict):
+            return None, ["pool must be a preset name or a mapping"]
+        
+        errors = []
+        profile = pool.get('profile', 'default')
+        if profile not in self.POOL_PRESETS:
+            return None, [f"Unknown pool profile '{profile}' (available: {', '.join(self.POOL_PRESETS)})"]
+        
+        resolved = {'profile': profile, **self.POOL_PRESETS[profile]}
+        for key, value in pool.items():
+            if key == 'profile' or value is None:
+                continue
+            if key not in self.POOL_PARAMETERS:
+                errors.append(f"Unknown pool parameter '{key}'")
+            elif key in ('keepalive', 'enablereuse'):
+                if str(value).lower() in ('on', 'true', 'yes', '1'):
+                    resolved[key] = 'On'
+                elif str(value).lower() in ('off', 'false', 'no', '0'):
+                    resolved[key] = 'Off'
+                else:
+                    errors.append(f"Pool parameter '{key}' must be on or off")
+            else:
+                try:
+                    number = int(value)
+                    if number < 0:
+                        raise ValueError
+                    resolved[key] = number
+                except (TypeError, ValueError):
+                    errors.append(f"Pool parameter '{key}' must be a non-negative integer")
+        
+        # Apache caps the soft maximum at the hard maximum; keep the record honest
+        if 'max' in resolved and resolved.get('smax', 0) > resolved['max']:
+            resolved['smax'] = resolved['max']
+        
+        return resolved, errors
+    
+    def describe_pool(self, pool):
+        """Return a one-line summary of a site's connection pool settings"""
+        params = " ".join(f"{key}={pool[key]}" for key in self.POOL_PARAMETERS if key in pool)
+        return f"{pool.get('profile', 'default')}" + (f" ({params})" if params else "")
+    
+    def render_pool_parameters(self, site):
+        """
+        Render ProxyPass worker parameters for a site's connection pool
+        
+        Args:
+            site (dict): Site record
+            
+        Returns:
+            str: Worker parameters prefixed with a space, empty for defaults
+        """
+        pool = (site or {}).get('pool') or {}
+        params = [f"{key}={pool[key]}" for key in self.POOL_PARAMETERS if key in pool]
+        return "".join(f" {param}" for param in params)
+    
+    def parse_backend(self, spec):
+        """
+        Parse a backend specification into a proxy URL
+        
+        Args:
+            spec (str or int): ``port``, ``host:port``, ``http://host:port`` or
+                ``unix:/path/to/app.sock`` (optionally ``|http://host``)
+            
+        Returns:
+            str: Backend URL such as ``http://localhost:3000`` or
+            ``unix:/run/app.sock|http://localhost``, None if invalid
+        """
+        spec = str(spec).strip()
+        if spec.startswith('unix:'):
+            path, _, target = spec[len('unix:'):].partition('|')
+            target = (target or 'http://localhost').rstrip('/')
+            if not re.match(r'^/[A-Za-z0-9._@/\-]+$', path) or '..' in path.split('/'):
+                return None
+            if not re.match(r'^http://[a-zA-Z0-9.\-]+$', target):
+                return None
+            return f"unix:{path}|{target}"
+        if spec.startswith('http://'):
+            spec = spec[len('http://'):].rstrip('/')
+        host, _, port = spec.rpartition(':')
+        host = host or 'localhost'
+        if not re.match(r'^[a-zA-Z0-9.\-]+$|^\[[0-9a-fA-F:]+\]$', host):
+            return None
+        try:
+            port_num = int(port)
+        except ValueError:
+            return None
+        if not 1 <= port_num <= 65535:
+            return None
+        return f"http://{host}:{port_num}"
+    
+    def backend_port(self, spec):
+        """
+        Return the port of a backend specification
+        
+        Args:
+            spec (str or int): Backend specification (see parse_backend)
+            
+        Returns:
+            int: Port number, None if the specification is invalid
+        """
+        url = self.parse_backend(spec)
+        return int(url.rsplit(':', 1)[1]) if url and not self.socket_path(url) else None
+    
+    def socket_path(self, spec):
+        """
+        Return the Unix domain socket of a backend specification
+        
+        Args:
+            spec (str or int): Backend specification (see parse_backend)
+            
+        Returns:
+            str: Socket path, None for TCP backends
+        """
+        spec = str(spec).strip()
+        if not spec.startswith('unix:'):
+            return None
+        return spec[len('unix:'):].partition('|')[0]
+    
+    def reverse_url(self, url):
+        """Return the URL ProxyPassReverse matches for a backend (the part after ``|`` for sockets)"""
+        return url.partition('|')[2] if self.socket_path(url) else url
+    
+    def upstream_url(self, url, site):
+        """
+        Return the URL a backend is proxied to for a site's upstream protocol
+        
+        Args:
+            url (str): Backend URL as stored (``http://`` scheme)
+            site (dict): Site record
+            
+        Returns:
+            str: The URL with the ``h2c://`` scheme for HTTP/2 cleartext backends
+        """
+        if (site or {}).get('protocol') == 'h2c':
+            return url.replace('http://', 'h2c://', 1)
+        return url
+    
+    def render_worker_parameters(self, site):
+        """Render the pool parameters plus WebSocket upgrade handling of a site's workers"""
+        params = self.render_pool_parameters(site)
+        if (site or {}).get('protocol') == 'ws':
+            # mod_proxy_http tunnels "Upgrade: websocket" requests, plain requests share the pool
+            params += " upgrade=websocket"
+        return params
+    
+    def site_backends(self, domain, site):
+        """
+        Return the backend members of a site
+        
+        Args:
+            domain (str): Domain name of the site
+            site (dict): Site record
+            
+        Returns:
+            list: Dicts with ``url`` and ``standby`` keys
+        """
+        if site.get('backends'):
+            return site['backends']
+        return [{'url': f"http://localhost:{site['port']}", 'standby': False}]
+    
+    def uses_balancer(self, site):
+        """Return True if a site needs a mod_proxy_balancer cluster"""
+        backends = (site or {}).get('backends') or []
+        return len(backends) > 1 or any(b.get('standby') for b in backends)
+    
+    def render_proxy_directives(self, domain, port, site=None):
+        """
+        Render the proxy block routing a Virtual Host to its backend(s)
+        
+        A single backend is proxied directly. Several backends are grouped
+        in a mod_proxy_balancer cluster with optional hot-standby members.
+        The URL scheme and worker parameters follow the upstream protocol.
+        
+        Args:
+            domain (str): Domain name of the site
+            port (int): Local port to proxy to when the site has no backend list
+            site (dict): Site record
+            
+        Returns:
+            str: Indented proxy directives
+        """
+        site = site or {}
+        pool_params = self.render_worker_parameters(site)
+        
+        if not self.uses_balancer(site):
+            backend = self.site_backends(domain, {'port': port, **site})[0]['url']
+            return f"""    # Proxy configuration
+    ProxyPass / {self.upstream_url(backend, site)}/{pool_params}
+    ProxyPassReverse / {self.reverse_url(backend)}/"""
+        
+        cluster = f"balancer://{domain}"
+        members = []
+        for backend in site['backends']:
+            status = " status=+H" if backend.get('standby') else ""
+            members.append(f"        BalancerMember {self.upstream_url(backend['url'], site)}{pool_params}{status}")
+        members = "\n".join(members)
+        
+        return f"""    # Load balancer ({site.get('lbmethod', 'byrequests')})
+    <Proxy "{cluster}">
+{members}
+        ProxySet lbmethod={site.get('lbmethod', 'byrequests')}
+    </Proxy>
+    
+    # Proxy configuration
+    ProxyPass / {cluster}/
+    ProxyPassReverse / {cluster}/"""
+    
+    def site_modules(self, site):
+        """
+        Return the extra Apache modules a site's settings rely on
+        
+        Args:
+            site (dict): Site record or normalized options
+            
+        Returns:
+            list: Module names for a2enmod
+        """
+        modules = []
+        if self.uses_balancer(site):
+            lbmethod = site.get('lbmethod', 'byrequests')
+            modules += ['proxy_balancer', 'slotmem_shm', f"lbmethod_{lbmethod}"]
+            if lbmethod == 'heartbeat':
+                modules.append('heartmonitor')
+        protocol = site.get('protocol', 'http1')
+        if protocol == 'h2c':
+            modules += ['http2', 'proxy_http2']
+        elif protocol == 'ws':
+            modules.append('proxy_wstunnel')
+        if site.get('tls_profile', 'default') != 'default':
+            modules += ['http2', 'socache_shmcb']
+        static = site.get('static')
+        if static:
+            modules.append('expires')
+            if static.get('sendfile'):
+                modules.append('xsendfile')
+        compression = site.get('compression')
+        if compression:
+            modules.append('filter')
+            modules += [{'br': 'brotli', 'gzip': 'deflate'}[a] for a in compression['algorithms']]
+        cache = site.get('cache')
+        if cache:
+            modules += ['cache', 'cache_disk'] if cache['backend'] == 'disk' else ['cache', 'cache_socache', 'socache_shmcb']
+        return modules
+    
+    def site_confs(self, site):
+        """
+        Return the server-wide configuration files a site depends on
+        
+        Args:
+            site (dict): Site record or normalized options
+            
+        Returns:
+            list: Names for a2enconf
+        """
+        confs = []
+        if (site or {}).get('log_profile', 'combined') != 'combined':
+            confs.append('vhost-manager-logging')
+        if (site or {}).get('tls_profile', 'default') != 'default':
+            confs.append('vhost-manager-tls')
+        return confs
+    
+    def render_logging(self, domain, site=None, ssl=False):
+        """
+        Render the logging directives of a Virtual Host
+        
+        Args:
+            domain (str): Domain name of the site
+            site (dict): Site record, ``log_profile`` selects the format
+            ssl (bool): Render for the HTTPS Virtual Host
+            
+        Returns:
+            str: Indented directives
+        """
+        profile = (site or {}).get('log_profile', 'combined')
+        if profile == 'consolidated':
+            return ("    # Logging: consolidated in ${APACHE_LOG_DIR}/vhost-manager-access.log\n"
+                    "    # (buffered, see vhost-manager-logging.conf)")
+        
+        prefix = f"{domain}-ssl" if ssl else domain
+        log_format = 'vhost_manager_latency' if profile == 'latency' else 'combined'
+        return f"""    # Logging
+    ErrorLog ${{APACHE_LOG_DIR}}/{prefix}-error.log
+    CustomLog ${{APACHE_LOG_DIR}}/{prefix}-access.log {log_format}"""
+    
+    def tls_snippet(self, site):
+        """Return the shared SSL snippet implementing a site's TLS profile"""
+        profile = (site or {}).get('tls_profile', 'default')
+        return 'ssl' if profile == 'default' else f"ssl-{profile}"
+    
+    def check_http2_support(self):
+        """
+        Warn when the active MPM cannot serve HTTP/2
+        
+        Returns:
+            bool: False if mpm_prefork is enabled (mod_http2 then stays on HTTP/1.1)
+        """
+        if self.module_enabled("mpm_prefork"):
+            print("⚠️  mpm_prefork is enabled: HTTP/2 needs mpm_event "
+                  "(sudo a2dismod php* mpm_prefork && sudo a2enmod mpm_event)")
+            return False
+        return True
+    
+    def apache_version(self):
+        """
+        Return the installed Apache version
+        
+        Returns:
+            tuple: Version numbers such as ``(2, 4, 58)``, None if unknown
+        """
+        try:
+            result = subprocess.run(["apache2ctl", "-v"], capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        match = re.search(r'Apache/(\d+)\.(\d+)\.(\d+)', result.stdout)
+        return tuple(int(part) for part in match.groups()) if match else None
+    
+    def check_upstream_protocol_support(self, sites):
+        """
+        Warn when the installed Apache cannot proxy a site's upstream protocol
+        
+        Args:
+            sites (list): Site records or normalized options
+            
+        Returns:
+            bool: False if a WebSocket site needs a newer Apache
+        """
+        if not any(site.get('protocol') == 'ws' for site in sites):
+            return True
+        version = self.apache_version()
+        # The upgrade= worker parameter appeared in Apache 2.4.47
+        if version is not None and version < (2, 4, 47):
+            print(f"⚠️  Apache {'.'.join(map(str, version))} does not support upgrade=websocket "
+                  "(2.4.47 or later is required for the ws protocol)")
+            return False
+        return True
+    
+    def certificate_paths(self, domain, site=None):
+        """
+        Return the Let's Encrypt certificate files serving a site
+        
+        Args:
+            domain (str): Domain name of the site
+            site (dict): Site record, ``cert_name`` names a shared SAN lineage
+            
+        Returns:
+            tuple: (fullchain path, private key path)
+        """
+        cert_name = (site or {}).get('cert_name') or domain
+        live_dir = f"{self.letsencrypt_dir}/live/{cert_name}"
+        return f"{live_dir}/fullchain.pem", f"{live_dir}/privkey.pem"
+    
+    def certificate_file(self, domain, site=None):
+        """Return the leaf certificate (cert.pem) of the lineage serving a site"""
+        return os.path.join(os.path.dirname(self.certificate_paths(domain, site)[0]), "cert.pem")
+    
+    def read_certificate(self, cert_path):
+        """
+        Read the expiry and fingerprint of a PEM certificate
+        
+        The certificate is parsed with ``cryptography`` when it is
+        installed, otherwise its expiry is read from the DER encoding
+        (certificate_not_after). Either way no process is spawned.
+        
+        Args:
+            cert_path (str): Path to a cert.pem file
+            
+        Returns:
+            dict: cert_expiry (ISO 8601, UTC), cert_mtime and cert_fingerprint,
+                None if the certificate cannot be read
+        """
+        try:
+            mtime = os.stat(cert_path).st_mtime
+            with open(cert_path, 'rb') as f:
+                pem = f.read()
+            fingerprint = hashlib.sha256(pem).hexdigest()
+            if x509 is not None:
+                cert = x509.load_pem_x509_certificate(pem)
+                expiry = getattr(cert, 'not_valid_after_utc', None) or \
+                    cert.not_valid_after.replace(tzinfo=timezone.utc)
+            else:
+                expiry = self.certificate_not_after(pem)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot read certificate {cert_path}: {e}")
+            return None
+        
+        return {
+            'cert_expiry': expiry.isoformat(),
+            'cert_mtime': mtime,
+            'cert_fingerprint': fingerprint
+        }
+    
+    def certificate_not_after(self, pem):
+        """
+        Read the expiry of the first certificate in a PEM file from its DER encoding
+        
+        Only the ASN.1 path Certificate > TBSCertificate > Validity > notAfter
+        is walked; the certificate is not otherwise validated.
+        
+        Args:
+            pem (bytes): PEM file content
+            
+        Returns:
+            datetime: Expiry (UTC)
+            
+        Raises:
+            ValueError: If no certificate can be decoded
+        """
+        match = re.search(rb'-----BEGIN CERTIFICATE-----(.+?)-----END CERTIFICATE-----', pem, re.DOTALL)
+        if not match:
+            raise ValueError("no PEM certificate found")
+        der = base64.b64decode(b''.join(match.group(1).split()))
+        
+        def element(offset):
+            """Return (tag, content start, content end) of the DER element at offset"""
+            tag, length = der[offset], der[offset + 1]
+            offset += 2
+            if length & 0x80:
+                size = length & 0x7f
+                length = int.from_bytes(der[offset:offset + size], 'big')
+                offset += size
+            return tag, offset, offset + length
+        
+        def children(start, end):
+            while start < end:
+                tag, content, start = element(start)
+                yield tag, content, start
+        
+        try:
+            _, cert_start, cert_end = element(0)
+            _, tbs_start, tbs_end = next(children(cert_start, cert_end))
+            fields = [field for field in children(tbs_start, tbs_end) if field[0] != 0xa0]  # skip [0] version
+            _, validity_start, validity_end = fields[3]  # serial, signature, issuer, validity
+            tag, start, end = list(children(validity_start, validity_end))[1]
+            text = der[start:end].decode('ascii')
+        except (IndexError, StopIteration, UnicodeDecodeError):
+            raise ValueError("malformed certificate") from None
+        
+        if tag == 0x17:  # UTCTime, YYMMDDHHMMSSZ (years 1950-2049)
+            text = ('19' if int(text[:2]) >= 50 else '20') + text
+        elif tag != 0x18:  # GeneralizedTime, YYYYMMDDHHMMSSZ
+            raise ValueError("malformed certificate validity")
+        return datetime.strptime(text, '%Y%m%d%H%M%SZ').replace(tzinfo=timezone.utc)
+    
+    def refresh_certificate_index(self):
+        """
+        Refresh the certificate expiry cached in the site store
+        
+        Each lineage is parsed once; a certificate whose mtime matches the
+        cached value is not read again.
+        
+        Returns:
+            dict: Lineage name -> {'domains', 'cert_expiry', 'cert_fingerprint'}
+        """
+        empty = {'cert_expiry': None, 'cert_mtime': None, 'cert_fingerprint': None}
+        lineages = {}
+        updates = {}
+        
+        for domain, site in self.sites.items():
+            if site.get('mode') == 'mass' or not site.get('ssl'):
+                continue
+            cert_name = site.get('cert_name') or domain
+            if cert_name not in lineages:
+                cert_path = self.certificate_file(domain, site)
+                try:
+                    mtime = os.stat(cert_path).st_mtime
+                except OSError:
+                    mtime = None
+                if mtime is None:
+                    info = dict(empty)
+                elif site.get('cert_mtime') == mtime and site.get('cert_expiry'):
+                    info = {k: site.get(k) for k in empty}
+                else:
+                    info = self.read_certificate(cert_path) or dict(empty)
+                lineages[cert_name] = {'domains': [], **info}
+            
+            lineage = lineages[cert_name]
+            lineage['domains'].append(domain)
+            if any(site.get(k) != lineage[k] for k in empty):
+                updates[domain] = {**site, **{k: lineage[k] for k in empty}}
+        
+        if updates:
+            with self.sites.transaction():
+                for domain, site in updates.items():
+                    self.sites[domain] = site
+            logger.info(f"Refreshed certificate expiry for {len(updates)} sites")
+        return lineages
+    
+    def days_to_expiry(self, cert_expiry):
+        """Return the whole days left before an ISO 8601 expiry timestamp"""
+        return (datetime.fromisoformat(cert_expiry) - datetime.now(timezone.utc)).days
+    
+    def render_vhost_config(self, domain, port, use_ssl=True, site=None):
+        """
+        Render Apache Virtual Host configuration without writing it
+        
+        Args:
+            domain (str): Domain name for the Virtual Host
+            port (int): Local port to proxy to
+            use_ssl (bool): Whether to configure SSL/HTTPS
+            site (dict): Optional site record with per-site settings
+            
+        Returns:
+            str: Rendered configuration content
+        """
+        overrides = self.render_header_overrides(site)
+        proxy = self.render_proxy_directives(domain, port, site)
+        logging_http = self.render_logging(domain, site)
+        logging_https = self.render_logging(domain, site, ssl=True)
+        cache = self.render_cache_directives(domain, site)
+        compression = self.render_compression_directives(site)
+        static = self.render_static_directives(site)
+        
+        cert_file, key_file = self.certificate_paths(domain, site)
+        if os.path.exists(cert_file):
+            certificate = f"""    # SSL Configuration (Let's Encrypt)
+    SSLEngine on
+    SSLCertificateFile {cert_file}
+    SSLCertificateKeyFile {key_file}"""
+        else:
+            certificate = """    # SSL Configuration (will be managed by Certbot)
+    SSLEngine on
+    # Default certificates (will be replaced by Certbot)
+    SSLCertificateFile /etc/ssl/certs/ssl-cert-snakeoil.pem
+    SSLCertificateKeyFile /etc/ssl/private/ssl-cert-snakeoil.key"""
+        
+        # Configuration for HTTP (with or without SSL redirect)
+        if use_ssl:
+            http_config = f"""<VirtualHost *:80>
+    ServerName {domain}
+    ServerAlias www.{domain}
+    
+    # Let's Encrypt challenges stay on HTTP
+    Include {self.snippet_path('acme')}
+    
+    # Force HTTPS redirect
+    RewriteEngine On
+    RewriteCond %{{HTTPS}} off
+    RewriteCond %{{REQUEST_URI}} !^/\\.well-known/acme-challenge/
+    RewriteRule ^(.*)$ https://%{{HTTP_HOST}}%{{REQUEST_URI}} [R=301,L]
+    
+{logging_http}
+    
+    # Security headers even for redirects
+    Include {self.snippet_path('hsts')}
+</VirtualHost>"""
+        else:
+            http_config = f"""<VirtualHost *:80>
+    ServerName {domain}
+    ServerAlias www.{domain}
+    
+{logging_http}
+    
+    # Let's Encrypt challenges
+    Include {self.snippet_path('acme')}
+    
+{static}{proxy}{cache}{compression}
+    
+    # Proxy headers
+    Include {self.snippet_path('proxy')}
+    
+    # Security headers
+    Include {self.snippet_path('headers')}{overrides}
+</VirtualHost>"""
+
+        # HTTPS configuration
+        https_config = f"""
+# HTTPS Configuration
+<IfModule mod_ssl.c>
+<VirtualHost *:443>
+    ServerName {domain}
+    ServerAlias www.{domain}
+    
+{logging_https}
+    
+{static}{proxy}{cache}{compression}
+    
+    # Proxy headers for HTTPS
+    Include {self.snippet_path('proxy')}
+    
+{certificate}
+    
+    # Modern SSL configuration
+    Include {self.snippet_path(self.tls_snippet(site))}
+    
+    # Security headers for HTTPS
+    Include {self.snippet_path('hsts')}
+    Include {self.snippet_path('headers')}
+    Include {self.snippet_path('csp')}{overrides}
+</VirtualHost>
+</IfModule>"""
+        
+        # Combine configurations
+        return http_config + https_config
+    
+    def create_vhost_config(self, domain, port, use_ssl=True, site=None):
+        """
+        Create Apache Virtual Host configuration file
+        
+        Args:
+            domain (str): Domain name for the Virtual Host
+            port (int): Local port to proxy to, None for Unix socket upstreams
+            use_ssl (bool): Whether to configure SSL/HTTPS
+            site (dict): Optional site record with per-site settings
+            
+        Returns:
+            str: Path to created configuration file, None if failed
+        """
+        if port is not None:
+            logger.info(f"Creating Virtual Host configuration for {domain}:{port}")
+        else:
+            logger.info(f"Creating Virtual Host configuration for {domain} -> {site['backends'][0]['url']}")
+        
+        if self.ensure_shared_snippets() is None:
+            return None
+        
+        config_content = self.render_vhost_config(domain, port, use_ssl, site)
+        config_path = f"{self.sites_available}/{domain}.conf"
+        
+        try:
+            # Ensure sites-available directory exists
+            os.makedirs(self.sites_available, exist_ok=True)
+            
+            with open(config_path, 'w') as f:
+                f.write(config_content)
+            
+            # Set appropriate permissions
+            os.chmod(config_path, 0o644)
+            
+            logger.info(f"Virtual Host configuration created: {config_path}")
+            return config_path
+            
+        except Exception as e:
+            logger.error(f"Failed to create configuration file: {e}")
+            print(f"❌ Error creating configuration file: {e}")
+            return None
+    
+    def missing_modules(self, extra_modules=None, confs=None):
+        """
+        Return the required modules and configurations that are not enabled yet
+        
+        Args:
+            extra_modules (list): Additional modules needed by site settings
+            confs (list): Server-wide configuration files needed by site settings
+            
+        Returns:
+            tuple: (module names, configuration names)
+        """
+        modules = ['proxy', 'proxy_http', 'rewrite', 'ssl', 'headers']
+        modules += [m for m in (extra_modules or []) if m not in modules]
+        return (
+            [m for m in modules if not self.module_enabled(m)],
+            [c for c in dict.fromkeys(confs or []) if not self.conf_enabled(c)]
+        )
+    
+    def enable_modules(self, extra_modules=None, confs=None):
+        """
+        Enable required Apache modules
+        
+        The enabled state is read from mods-enabled/conf-enabled, and only
+        missing modules are passed to a single a2enmod (and a2enconf) call.
+        
+        Args:
+            extra_modules (list): Additional modules needed by site settings
+            confs (list): Server-wide configuration files needed by site settings
+            
+        Returns:
+            bool: True if a module or configuration was enabled
+        """
+        modules, confs = self.missing_modules(extra_modules, confs)
+        if not modules and not confs:
+            logger.debug("Required Apache modules already enabled")
+            return False
+        print("🔧 Enabling required Apache modules...")
+        
+        if modules:
+            if self.run_command(["a2enmod", "-q", *modules]):
+                logger.info(f"Enabled Apache modules: {', '.join(modules)}")
+            else:
+                logger.warning(f"Failed to enable modules {', '.join(modules)}")
+        
+        if confs:
+            if self.run_command(["a2enconf", "-q", *confs]):
+                logger.info(f"Enabled Apache configurations: {', '.join(confs)}")
+            else:
+                logger.warning(f"Failed to enable configurations {', '.join(confs)}")
+        return True
+    
+    def validate_domain(self, domain):
+        """
+        Validate domain name format
+        
+        Args:
+            domain (str): Domain name to validate
+            
+        Returns:
+            bool: True if domain is valid, False otherwise
+        """
+        # Basic domain validation regex
+        domain_pattern = r'^[a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?(\.[a-zA-Z0-9]([a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?)*$'
+        
+        if not re.match(domain_pattern, domain):
+            return False
+        
+        # Additional checks
+        if len(domain) > 253:
+            return False
+        
+        if domain.startswith('-') or domain.endswith('-'):
+            return False
+        
+        return True
+    
+    def validate_port(self, port):
+        """
+        Validate port number
+        
+        Args:
+            port (str or int): Port number to validate
+            
+        Returns:
+            int: Valid port number, None if invalid
+        """
+        try:
+            port_num = int(port)
+            if 1 <= port_num <= 65535:
+                return port_num
+            else:
+                print(f"❌ Port {port_num} is out of valid range (1-65535)")
+                return None
+        except (TypeError, ValueError):
+            print(f"❌ Invalid port format: {port}")
+            return None
+    
+    def check_port_available(self, port):
+        """
+        Check if a port is available on localhost
+        
+        Args:
+            port (int): Port number to check
+            
+        Returns:
+            bool: True if port is available, False if in use
+        """
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.settimeout(2)
+                result = s.connect_ex(('localhost', port))
+                return result != 0  # Port is available if connection fails
+        except Exception:
+            return True  # Assume available if check fails
+    
+    def check_socket_listening(self, path):
+        """
+        Check if a service accepts connections on a Unix domain socket
+        
+        Args:
+            path (str): Socket path
+            
+        Returns:
+            bool: True if a connection succeeds
+        """
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(2)
+                return s.connect_ex(path) == 0
+        except OSError:
+            return False
+    
+    async def probe_backend(self, url, mode='tcp', path='/', timeout=3.0):
+        """
+        Probe a backend once
+        
+        Args:
+            url (str): Backend URL such as ``http://localhost:3000`` or
+                ``unix:/run/app.sock|http://localhost``
+            mode (str): ``tcp`` (connect only) or ``http`` (GET ``path``)
+            path (str): Path requested in http mode
+            timeout (float): Seconds before the probe fails
+            
+        Returns:
+            dict: ok, latency_ms, status (HTTP code in http mode) and error
+        """
+        socket_path = self.socket_path(url)
+        parsed = urlsplit(self.reverse_url(url))
+        
+        async def exchange():
+            if socket_path:
+                reader, writer = await asyncio.open_unix_connection(socket_path)
+            else:
+                reader, writer = await asyncio.open_connection(parsed.hostname, parsed.port or 80)
+            try:
+                if mode != 'http':
+                    return None
+                writer.write(
+                    f"GET {path} HTTP/1.1\r\nHost: {parsed.netloc}\r\n"
+                    f"User-Agent: vhost-manager-health\r\nConnection: close\r\n\r\n".encode()
+                )
+                await writer.drain()
+                status_line = (await reader.readline()).split()
+                if len(status_line) < 2 or not status_line[0].startswith(b'HTTP/'):
+                    raise ConnectionError("invalid HTTP response")
+                return int(status_line[1])
+            finally:
+                writer.close()
+        
+        started = time.monotonic()
+        try:
+            status = await asyncio.wait_for(exchange(), timeout)
+        except asyncio.TimeoutError:
+            return {'ok': False, 'latency_ms': None, 'status': None, 'error': f"timed out after {timeout}s"}
+        except (OSError, ValueError) as e:
+            return {'ok': False, 'latency_ms': None, 'status': None, 'error': str(e) or type(e).__name__}
+        
+        latency_ms = round((time.monotonic() - started) * 1000, 2)
+        # A 4xx still proves the application answers; only server errors count as down
+        ok = status is None or status < 500
+        return {'ok': ok, 'latency_ms': latency_ms, 'status': status,
+                'error': None if ok else f"HTTP {status}"}
+    
+    def latency_percentiles(self, samples):
+        """
+        Return nearest-rank latency percentiles
+        
+        Args:
+            samples (list): Latencies in milliseconds
+            
+        Returns:
+            dict: p50, p95 and p99, None when there are no samples
+        """
+        ordered = sorted(samples)
+        return {
+            f"p{pct}": ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)] if ordered else None
+            for pct in (50, 95, 99)
+        }
+    
+    def health_check(self, domains=None, mode='tcp', path='/', timeout=3.0, concurrency=100):
+        """
+        Probe every backend in the site store concurrently
+        
+        Each backend is probed once even if several sites share it. The
+        result and a rolling window of latency samples are kept in the
+        ``health`` entry of each site record.
+        
+        Args:
+            domains (list): Sites to probe, all sites if omitted
+            mode (str): ``tcp`` or ``http``
+            path (str): Path requested in http mode
+            timeout (float): Seconds before a probe fails
+            concurrency (int): Maximum number of probes in flight
+            
+        Returns:
+            list: One dict per (domain, backend) with the probe result and percentiles
+        """
+        targets = {}
+        tcp_only = set()
+        for domain, site in self.sites.items():
+            if domains and domain not in domains:
+                continue
+            for backend in self.site_backends(domain, site):
+                targets.setdefault(backend['url'], []).append((domain, backend.get('standby', False)))
+                if site.get('protocol') == 'h2c':
+                    # An HTTP/1.1 GET is not a valid probe for an h2c-only backend
+                    tcp_only.add(backend['url'])
+        
+        async def probe_all():
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+            
+            async def probe(url):
+                async with semaphore:
+                    return await self.probe_backend(url, 'tcp' if url in tcp_only else mode, path, timeout)
+            
+            return await asyncio.gather(*(probe(url) for url in targets))
+        
+        probes = dict(zip(targets, asyncio.run(probe_all()))) if targets else {}
+        
+        now = datetime.now().isoformat()
+        rows = []
+        with self.sites.transaction():
+            for url, members in targets.items():
+                result = probes[url]
+                for domain, standby in members:
+                    site = self.sites[domain]
+                    health = dict(site.get('health', {}))
+                    previous = health.get(url, {})
+                    samples = previous.get('samples', [])
+                    if result['latency_ms'] is not None:
+                        samples = (samples + [result['latency_ms']])[-self.HEALTH_SAMPLES:]
+                    health[url] = {
+                        'ok': result['ok'],
+                        'status': result['status'],
+                        'error': result['error'],
+                        'latency_ms': result['latency_ms'],
+                        'failures': 0 if result['ok'] else previous.get('failures', 0) + 1,
+                        'checked_at': now,
+                        'samples': samples
+                    }
+                    self.sites[domain] = {**site, 'health': health}
+                    rows.append({
+                        'domain': domain,
+                        'backend': url,
+                        'standby': standby,
+                        **{k: v for k, v in health[url].items() if k != 'samples'},
+                        'samples': len(samples),
+                        **self.latency_percentiles(samples)
+                    })
+        
+        rows.sort(key=lambda row: (row['domain'], row['backend']))
+        down = sum(1 for url in targets if not probes[url]['ok'])
+        logger.info(f"Health check ({mode}): {len(targets) - down}/{len(targets)} backends up")
+        return rows
+    
+    def print_health(self, rows, as_json=False):
+        """
+        Print health check results as a table or JSON
+        
+        Args:
+            rows (list): Rows returned by health_check
+            as_json (bool): Print JSON instead of a table
+        """
+        if as_json:
+            print(json.dumps(rows, indent=2))
+            return
+        if not rows:
+            print("📝 No backends configured")
+            return
+        
+        def ms(value):
+            return f"{value:.1f}" if value is not None else "-"
+        
+        backends = [row['backend'] + (" (standby)" if row['standby'] else "") for row in rows]
+        width = max(len('DOMAIN'), *(len(row['domain']) for row in rows))
+        backend_width = max(len('BACKEND'), *(len(backend) for backend in backends))
+        print(f"{'DOMAIN':<{width}}  {'BACKEND':<{backend_width}}  STATE  {'LAST':>8} {'P50':>8} "
+              f"{'P95':>8} {'P99':>8} {'N':>4}")
+        for row, backend in zip(rows, backends):
+            state = "✅ up " if row['ok'] else "❌ down"
+            print(f"{row['domain']:<{width}}  {backend:<{backend_width}}  {state} {ms(row['latency_ms']):>8} "
+                  f"{ms(row['p50']):>8} {ms(row['p95']):>8} {ms(row['p99']):>8} {row['samples']:>4}")
+            if row['error']:
+                print(f"{'':<{width}}  ↳ {row['error']} ({row['failures']} consecutive failures)")
+        
+        down = [row for row in rows if not row['ok']]
+        print(f"\n📊 {len(rows) - len(down)}/{len(rows)} backends up (latencies in ms)")
+    
+    def health_daemon(self, interval=30, **options):
+        """
+        Probe backends forever, keeping the latency window in the site store
+        
+        Args:
+            interval (int): Seconds between rounds
+            **options: Arguments passed to health_check
+        """
+        print(f"🩺 Probing backends every {interval}s (Ctrl+C to stop)")
+        while True:
+            started = time.monotonic()
+            rows = self.health_check(**options)
+            for row in rows:
+                if not row['ok']:
+                    logger.warning(f"Backend {row['backend']} of {row['domain']} is down: {row['error']}")
+            time.sleep(max(0, interval - (time.monotonic() - started)))
+    
+    def access_log_sources(self, domain, site):
+        """
+        Return the access logs written for a site
+        
+        Args:
+            domain (str): Domain name of the site
+            site (dict): Site record
+            
+        Returns:
+            list: Log file paths; the mass and consolidated logs are shared
+                and filtered by virtual host
+        """
+        if site.get('mode') == 'mass':
+            return [f"{self.apache_log_dir}/vhost-manager-mass-access.log"]
+        if site.get('log_profile') == 'consolidated':
+            return [f"{self.apache_log_dir}/vhost-manager-access.log"]
+        return [f"{self.apache_log_dir}/{domain}-access.log", f"{self.apache_log_dir}/{domain}-ssl-access.log"]
+    
+    def read_new_log_lines(self, path):
+        """
+        Yield the lines appended to a log file since the last run
+        
+        The file is memory-mapped and scanned line by line, so memory use
+        does not depend on its size. A rotated file (new inode) is finished
+        from its ``.1`` copy before the new file is read from the start.
+        The offset after each complete line is yielded with it so the
+        caller can save progress; a partial last line is left for next time.
+        
+        Args:
+            path (str): Log file path
+            
+        Yields:
+            tuple: (line bytes, inode, offset after the line)
+        """
+        inode, offset = self.sites.get_log_offset(path)
+        try:
+            current = os.stat(path)
+        except OSError:
+            return
+        
+        files = []
+        if inode is not None and inode != current.st_ino:
+            try:
+                rotated = os.stat(f"{path}.1")
+                if rotated.st_ino == inode:
+                    files.append((f"{path}.1", offset))
+            except OSError:
+                pass
+            offset = 0
+        elif current.st_size < offset:
+            offset = 0  # Truncated in place (copytruncate)
+        files.append((path, offset))
+        
+        for file_path, start in files:
+            with open(file_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_size <= start:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    position = start
+                    size = len(data)
+                    while position < size:
+                        end = data.find(b'\n', position)
+                        if end == -1:
+                            break
+                        # Progress in the rotated copy maps to the start of the new file
+                        yield data[position:end], current.st_ino, (end + 1 if file_path == path else 0)
+                        position = end + 1
+    
+    def collect_log_stats(self, domains=None):
+        """
+        Read new access log lines and update the accumulated statistics
+        
+        Args:
+            domains (list): Domains to update, all sites if omitted
+            
+        Returns:
+            dict: Domain -> statistics, with ``new_requests`` read in this run
+        """
+        sites = self.sites.items()
+        wanted = {d: s for d, s in sites if not domains or d in domains}
+        shared_logs = {
+            f"{self.apache_log_dir}/vhost-manager-mass-access.log",
+            f"{self.apache_log_dir}/vhost-manager-access.log"
+        }
+        read = {path for d, s in wanted.items() for path in self.access_log_sources(d, s)}
+        # A shared log is read once for every site writing to it
+        wanted.update((d, s) for d, s in sites if read & shared_logs & set(self.access_log_sources(d, s)))
+        sources = {}
+        for domain, site in wanted.items():
+            for path in self.access_log_sources(domain, site):
+                sources.setdefault(path, []).append(domain)
+        
+        stats = {}
+        for domain in wanted:
+            stats[domain] = self.sites.get_log_stats(domain) or {
+                'requests': 0, 'bytes': 0, 'status': {}, 'paths': {},
+                'first_seen': None, 'last_seen': None
+            }
+            stats[domain].setdefault('latency', [0] * (len(self.LATENCY_BUCKETS_MS) + 1))
+            stats[domain]['new_requests'] = 0
+        
+        last_times = {}
+        offsets = {}
+        for path, owners in sources.items():
+            for line, inode, offset in self.read_new_log_lines(path):
+                offsets[path] = (inode, offset)
+                match = self.ACCESS_LOG_PATTERN.match(line)
+                if not match:
+                    continue
+                if path in shared_logs:
+                    vhost = (match.group('vhost') or b'').decode('ascii', 'replace').lower().split(':')[0]
+                    if vhost not in stats:
+                        # www.<domain> is served as an alias of <domain>
+                        vhost = vhost.removeprefix('www.')
+                    if vhost not in stats:
+                        continue
+                    domain = vhost
+                else:
+                    domain = owners[0]
+                
+                entry = stats[domain]
+                entry['requests'] += 1
+                entry['new_requests'] += 1
+                size = match.group('bytes')
+                if size != b'-':
+                    entry['bytes'] += int(size)
+                status = match.group('status').decode()
+                entry['status'][status] = entry['status'].get(status, 0) + 1
+                request_path = match.group('path').decode('utf-8', 'replace')
+                paths = entry['paths']
+                paths[request_path] = paths.get(request_path, 0) + 1
+                if len(paths) > self.STATS_PATH_LIMIT:
+                    # Keep memory bounded: drop the long tail of rarely requested paths
+                    entry['paths'] = dict(sorted(paths.items(), key=lambda item: -item[1])[:self.STATS_PATH_LIMIT // 2])
+                cache_status = match.group('cache')
+                if cache_status and cache_status != b'-':
+                    verdict = self.cache_verdict(cache_status)
+                    entry.setdefault('cache', {})
+                    entry['cache'][verdict] = entry['cache'].get(verdict, 0) + 1
+                duration = match.group('duration')
+                if duration is not None:
+                    entry['latency'][bisect.bisect_left(self.LATENCY_BUCKETS_MS, int(duration) / 1000)] += 1
+                if entry['first_seen'] is None:
+                    entry['first_seen'] = self.parse_log_time(match.group('time'))
+                last_times[domain] = match.group('time')
+        
+        for domain, raw_time in last_times.items():
+            stats[domain]['last_seen'] = self.parse_log_time(raw_time)
+        
+        with self.sites.transaction():
+            for path, (inode, offset) in offsets.items():
+                self.sites.set_log_offset(path, inode, offset)
+            for domain, entry in stats.items():
+                entry['paths'] = dict(sorted(entry['paths'].items(), key=lambda item: -item[1])[:self.STATS_PATH_LIMIT // 10])
+                self.sites.set_log_stats(domain, {k: v for k, v in entry.items() if k != 'new_requests'})
+        
+        logger.info(f"Read {sum(e['new_requests'] for e in stats.values())} new log lines "
+                    f"from {len(sources)} access logs")
+        return stats
+    
+    def parse_log_time(self, raw_time):
+        """Convert an Apache ``%t`` timestamp to epoch seconds"""
+        try:
+            return datetime.strptime(raw_time.decode('ascii'), '%d/%b/%Y:%H:%M:%S %z').timestamp()
+        except ValueError:
+            return None
+    
+    def cache_verdict(self, cache_status):
+        """
+        Classify mod_cache's ``cache-status`` note
+        
+        Args:
+            cache_status (bytes): Value logged with %{cache-status}e
+            
+        Returns:
+            str: hit, revalidated, miss or invalidated
+        """
+        if cache_status.startswith(b'cache hit'):
+            return 'hit'
+        if cache_status.startswith(b'conditional cache hit'):
+            return 'revalidated'
+        if cache_status.startswith(b'cache invalidated'):
+            return 'invalidated'
+        return 'miss'
+    
+    def histogram_percentile(self, counts, pct):
+        """
+        Return the latency bucket holding a percentile
+        
+        Args:
+            counts (list): Request counts per LATENCY_BUCKETS_MS bucket, plus overflow
+            pct (int): Percentile
+            
+        Returns:
+            str: Upper bound of the bucket, such as ``≤ 50 ms``
+        """
+        target = math.ceil(pct / 100 * sum(counts))
+        running = 0
+        for index, count in enumerate(counts):
+            running += count
+            if running >= target:
+                break
+        if index < len(self.LATENCY_BUCKETS_MS):
+            return f"≤ {self.LATENCY_BUCKETS_MS[index]} ms"
+        return f"> {self.LATENCY_BUCKETS_MS[-1]} ms"
+    
+    def cache_stats(self, domains=None):
+        """
+        Show disk usage and hit ratio of cached sites
+        
+        Args:
+            domains (list): Sites to show, every site with a cache if omitted
+        """
+        cached = {d: s for d, s in self.sites.items() if s.get('cache') and (not domains or d in domains)}
+        if not cached:
+            print("📝 No sites have a response cache")
+            return
+        
+        stats = self.collect_log_stats(list(cached))
+        for domain, site in cached.items():
+            print(f"🗄️  {domain} ({self.describe_cache(site['cache'])})")
+            if site['cache']['backend'] == 'disk':
+                root = self.cache_root(domain)
+                size = files = 0
+                for dirpath, _, filenames in os.walk(root):
+                    for name in filenames:
+                        try:
+                            size += os.lstat(os.path.join(dirpath, name)).st_size
+                            files += 1
+                        except OSError:
+                            pass
+                print(f"   Disk: {self.format_bytes(size)} in {files:,} files ({root})")
+            else:
+                print("   Storage: shared memory (shmcb)")
+            
+            counts = stats.get(domain, {}).get('cache', {})
+            total = sum(counts.values())
+            if total:
+                served = counts.get('hit', 0) + counts.get('revalidated', 0)
+                print(f"   Hit ratio: {served / total:.1%} ({counts.get('hit', 0):,} hits, "
+                      f"{counts.get('revalidated', 0):,} revalidated, {counts.get('miss', 0):,} misses "
+                      f"of {total:,} cacheable requests)")
+            elif site.get('log_profile', 'combined') == 'combined':
+                print("   Hit ratio: needs --log-profile latency or consolidated")
+            else:
+                print("   Hit ratio: no cacheable requests logged yet")
+            print()
+    
+    def purge_cache(self, domain, path=None):
+        """
+        Remove cached responses of a site
+        
+        Args:
+            domain (str): Domain name of the site
+            path (str): Only purge URLs under this path prefix
+        """
+        self.check_sudo()
+        site = self.sites.get(domain)
+        if site is None:
+            print(f"❌ Site {domain} does not exist in configuration")
+            return
+        cache = site.get('cache')
+        if not cache:
+            print(f"❌ Site {domain} has no response cache")
+            return
+        
+        if cache['backend'] == 'socache':
+            # shmcb entries cannot be deleted individually, a reload recreates the cache
+            if path:
+                print("⚠️  The socache backend cannot purge a single path, purging the whole cache")
+            if self.run_command("systemctl reload apache2"):
+                print(f"✅ Shared memory cache purged (Apache reloaded)")
+            else:
+                print("❌ Failed to reload Apache")
+            return
+        
+        root = self.cache_root(domain)
+        if not path:
+            removed = 0
+            for entry in os.listdir(root) if os.path.isdir(root) else []:
+                target = os.path.join(root, entry)
+                if os.path.isdir(target):
+                    shutil.rmtree(target, ignore_errors=True)
+                else:
+                    os.remove(target)
+                removed += 1
+            print(f"✅ Purged the cache of {domain} ({removed} entries)")
+            logger.info(f"Purged cache of {domain}")
+            return
+        
+        try:
+            listing = subprocess.run(["htcacheclean", "-p", root, "-A"], capture_output=True, text=True, timeout=300)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"❌ Failed to list cached URLs: {e}")
+            return
+        if listing.returncode != 0:
+            print(f"❌ Failed to list cached URLs: {listing.stderr.strip()}")
+            return
+        
+        urls = []
+        for line in listing.stdout.splitlines():
+            url = line.split(' ', 1)[0]
+            # Keys look like http://example.com:443/path? (possibly with a vary prefix)
+            match = re.search(r'https?://[^/]+(/[^?]*)', url)
+            if match and match.group(1).startswith(path):
+                urls.append(url)
+        
+        purged = sum(1 for url in urls if self.run_command(["htcacheclean", "-p", root, url]))
+        print(f"✅ Purged {purged}/{len(urls)} cached URLs under {path} for {domain}")
+        logger.info(f"Purged {purged} cached URLs under {path} for {domain}")
+    
+    def format_bytes(self, size):
+        """Format a byte count for humans"""
+        for unit in ('B', 'KB', 'MB', 'GB'):
+            if size < 1024:
+                return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+            size /= 1024
+        return f"{size:.1f} TB"
+    
+    def show_stats(self, domains=None, top=10, as_json=False, reset=False):
+        """
+        Show per-domain traffic statistics from the access logs
+        
+        Args:
+            domains (list): Domains to show, all sites if omitted
+            top (int): Number of top paths to show
+            as_json (bool): Print JSON instead of text
+            reset (bool): Forget previous offsets and read the logs from the start
+        """
+        for domain in domains or []:
+            if domain not in self.sites:
+                print(f"❌ Site {domain} does not exist in configuration")
+                return
+        
+        if reset:
+            with self.sites.transaction():
+                self.sites.clear_log_state()
+        
+        stats = {d: e for d, e in self.collect_log_stats(domains).items() if not domains or d in domains}
+        if as_json:
+            print(json.dumps(stats, indent=2))
+            return
+        
+        for domain, entry in stats.items():
+            print(f"📊 {domain}")
+            if not entry['requests']:
+                print("   No requests logged yet\n")
+                continue
+            
+            span = (entry['last_seen'] or 0) - (entry['first_seen'] or 0)
+            rate = entry['requests'] / span if span > 0 else float(entry['requests'])
+            print(f"   Requests: {entry['requests']:,} ({rate:.2f} req/s), +{entry['new_requests']:,} since last run")
+            print(f"   Bytes served: {self.format_bytes(entry['bytes'])}")
+            
+            classes = {}
+            for status, count in entry['status'].items():
+                classes[f"{status[0]}xx"] = classes.get(f"{status[0]}xx", 0) + count
+            print("   Status: " + " · ".join(
+                f"{cls} {count / entry['requests']:.1%}" for cls, count in sorted(classes.items())
+            ))
+            
+            timed = sum(entry['latency'])
+            if timed:
+                print("   Duration: " + " · ".join(
+                    f"p{pct} {self.histogram_percentile(entry['latency'], pct)}" for pct in (50, 95, 99)
+                ) + f" ({timed:,} timed requests)")
+            
+            print("   Top paths:")
+            for path, count in sorted(entry['paths'].items(), key=lambda item: -item[1])[:top]:
+                print(f"     {count:>8,}  {path}")
+            print()
+    
+    def check_domain_dns(self, domain):
+        """
+        Check if domain DNS points to current server
+        
+        Args:
+            domain (str): Domain name to check
+            
+        Returns:
+            bool: True if DNS points to current server, False otherwise
+        """
+        current_ip = self.get_public_ip()
+        if current_ip is None:
+            return False
+        try:
+            return socket.gethostbyname(domain) == current_ip
+        except Exception as e:
+            logger.error(f"Failed to check domain DNS: {e}")
+            return False
+    
+    def install_ssl_certificate(self, domain, acme_mode='webroot'):
+        """
+        Install SSL certificate using Let's Encrypt
+        
+        In ``webroot`` mode the HTTP-01 challenge is served by the ACME alias
+        present in every generated Virtual Host, so the site stays online and
+        certbot never touches Apache. The ``apache`` mode keeps the previous
+        behaviour of swapping in a temporary Virtual Host and letting the
+        certbot Apache plugin install the certificate.
+        
+        Args:
+            domain (str): Domain name for SSL certificate
+            acme_mode (str): ``webroot`` or ``apache``
             
         Returns:
             bool: True if certificate was installed successfully
         """
-        print(f"🔒 Installing SSL certificate for {domain}...")
+        print(f"🔒 Installing SSL certificate for {domain}...")
+        
+        # Check if certbot is installed
+        if not self.certbot_available():
+            print("📦 Certbot not found. Installing Certbot...")
+            if not (self.run_command("apt update")
+                    and self.run_command("apt install -y certbot python3-certbot-apache")):
+                print("❌ Failed to install Certbot")
+                return False
+        
+        # Check if domain DNS points to current server
+        print("🔍 Checking domain DNS configuration...")
+        if not self.check_domain_dns(domain):
+            print(f"⚠️  Warning: Domain {domain} may not point to this server")
+            print("💡 Make sure your DNS A record points to this server's IP address")
+            response = input("Continue with SSL installation anyway? (y/n): ")
+            if response.lower() != 'y':
+                return False
+        
+        email = self.get_letsencrypt_email()
+        
+        if acme_mode == 'webroot':
+            os.makedirs(f"{self.acme_webroot}/.well-known/acme-challenge", exist_ok=True)
+            certbot_cmd = (
+                f"certbot certonly --webroot -w {self.acme_webroot} --cert-name {domain} "
+                f"-d {domain} -d www.{domain} --non-interactive --agree-tos --email {email} "
+                f"--deploy-hook '{self.CERTBOT_DEPLOY_HOOK}'"
+            )
+            success = self.run_command(certbot_cmd, show_output=True)
+        else:
+            success = self.install_ssl_certificate_apache(domain, email)
+        
+        if success:
+            print("✅ SSL certificate installed successfully!")
+            if acme_mode == 'webroot':
+                print("🔄 Automatic renewal is configured (Apache is reloaded after each renewal)")
+            else:
+                print("🔄 Automatic renewal is configured")
+            logger.info(f"SSL certificate installed for {domain}")
+            return True
+        else:
+            print("❌ Failed to install SSL certificate")
+            print("💡 Make sure your DNS points to this server and port 80/443 are accessible")
+            print("💡 Verify that your domain actually resolves to this server's IP address")
+            logger.error(f"SSL certificate installation failed for {domain}")
+            return False
+    
+    def install_ssl_certificate_apache(self, domain, email):
+        """
+        Obtain a certificate through a temporary Virtual Host and the certbot Apache plugin
+        
+        Args:
+            domain (str): Domain name for SSL certificate
+            email (str): Let's Encrypt account email
+            
+        Returns:
+            bool: True if certbot succeeded
+        """
+        # Create temporary HTTP-only virtual host for Let's Encrypt challenge
+        print("🔧 Creating temporary HTTP configuration for Let's Encrypt verification...")
+        temp_config = f"""<VirtualHost *:80>
+    ServerName {domain}
+    ServerAlias www.{domain}
+    
+    # Document root for Let's Encrypt challenges
+    DocumentRoot /var/www/html
+    
+    # Allow .well-known directory for Let's Encrypt
+    <Directory "/var/www/html/.well-known">
+        AllowOverride None
+        Require all granted
+    </Directory>
+    
+    # Logging
+    ErrorLog ${{APACHE_LOG_DIR}}/{domain}-error.log
+    CustomLog ${{APACHE_LOG_DIR}}/{domain}-access.log combined
+</VirtualHost>"""
+        
+        temp_config_path = f"/etc/apache2/sites-available/{domain}-temp.conf"
+        try:
+            with open(temp_config_path, 'w') as f:
+                f.write(temp_config)
+            
+            # Disable existing site and enable temporary one
+            self.disable_sites([domain])
+            self.enable_sites([f"{domain}-temp"])
+            self.run_command("systemctl reload apache2")
+            
+        except Exception as e:
+            print(f"❌ Failed to create temporary configuration: {e}")
+            return False
+        
+        # Get SSL certificate
+        certbot_cmd = f"certbot --apache -d {domain} -d www.{domain} --non-interactive --agree-tos --email {email}"
+        success = self.run_command(certbot_cmd, show_output=True)
+        
+        # Clean up temporary configuration and the HTTPS copy certbot made of it
+        self.disable_sites([f"{domain}-temp", *self.certbot_vhosts(domain)])
+        leftovers = [f"{self.sites_available}/{name}.conf" for name in self.certbot_vhosts(domain)]
+        for path in [temp_config_path, *leftovers]:
+            if os.path.exists(path):
+                os.remove(path)
+        
+        return success
+    
+    def get_letsencrypt_email(self, email=None, interactive=True):
+        """
+        Return the Let's Encrypt account email, saving it for future runs
+        
+        Args:
+            email (str): Email given on the command line, if any
+            interactive (bool): Prompt for the email when none is known
+            
+        Returns:
+            str: Email address, None if unknown
+        """
+        email_file = f"{self.letsencrypt_dir}/.email"
+        if not email and os.path.exists(email_file):
+            with open(email_file, 'r') as f:
+                email = f.read().strip()
+        if not email and interactive:
+            email = input("📧 Enter your email for Let's Encrypt notifications: ")
+        if email and not os.path.exists(email_file):
+            # Save email for future use
+            os.makedirs(os.path.dirname(email_file), exist_ok=True)
+            with open(email_file, 'w') as f:
+                f.write(email)
+        return email or None
+    
+    def get_public_ip(self, override=None):
+        """
+        Return this server's public IPv4 address
+        
+        Args:
+            override (str): Address to use instead of looking it up
+            
+        Returns:
+            str: Public IP address, None if it could not be determined
+        """
+        if check_dns is not None:
+            # Cached with a TTL, so bulk operations do not hit the echo service each time
+            return check_dns.get_server_ips(override)[0]
+        if override:
+            return override
+        try:
+            return requests.get('https://api.ipify.org', timeout=10).text.strip()
+        except Exception as e:
+            logger.error(f"Failed to get public IP: {e}")
+            return None
+    
+    def dns_check(self, domains=None, server_ip=None, refresh_ip=False, concurrency=None):
+        """
+        Check the A/AAAA records of many sites and their www aliases in one pass
+        
+        Args:
+            domains (list): Domains to check, every configured site if omitted
+            server_ip (str): Comma separated server addresses (offline use)
+            refresh_ip (bool): Ignore the cached public IP
+            concurrency (int): Maximum number of lookups in flight
+            
+        Returns:
+            bool: True if every name points to this server
+        """
+        if check_dns is None:
+            print("❌ check_dns.py not found next to vhost_manager.py")
+            print("💡 wget https://raw.githubusercontent.com/Noubissie237/reverse-proxy/main/check_dns.py")
+            return False
+        
+        domains = domains or list(self.sites)
+        if not domains:
+            print("📝 No sites configured")
+            return True
+        
+        started = time.monotonic()
+        print(f"🔍 Checking DNS for {len(domains)} domains and their www aliases...")
+        server_ipv4, server_ipv6, results = check_dns.check_domains(
+            domains,
+            server_ip,
+            concurrency=concurrency or check_dns.DEFAULT_CONCURRENCY,
+            refresh_ip=refresh_ip
+        )
+        failures = check_dns.print_report(server_ipv4, server_ipv6, results)
+        seconds = time.monotonic() - started
+        print(f"⏱️  Checked {len(results)} names in {seconds:.1f}s")
+        logger.info(f"DNS check: {len(results) - failures}/{len(results)} names OK in {seconds:.1f}s")
+        return failures == 0 and server_ipv4 is not None
+    
+    def registrable_domain(self, domain):
+        """
+        Return the registrable parent of a domain (best effort, no suffix list)
+        
+        Args:
+            domain (str): Domain name
+            
+        Returns:
+            str: e.g. ``example.com`` for ``api.example.com`` and
+                ``example.co.uk`` for ``shop.example.co.uk``
+        """
+        labels = domain.split('.')
+        second_level = ('co', 'com', 'net', 'org', 'gov', 'edu', 'ac')
+        if len(labels) >= 3 and len(labels[-1]) == 2 and labels[-2] in second_level:
+            return '.'.join(labels[-3:])
+        return '.'.join(labels[-2:])
+    
+    def plan_certificate_batches(self, domains, san=True):
+        """
+        Group domains into SAN certificates
+        
+        Domains sharing a registrable parent (same owner) share one
+        certificate, up to Let's Encrypt's limit of names per certificate.
+        
+        Args:
+            domains (list): Domain names needing a certificate
+            san (bool): Group domains, or issue one certificate per domain
+            
+        Returns:
+            list: (cert_name, [domains]) tuples
+        """
+        if not san:
+            return [(domain, [domain]) for domain in sorted(domains)]
+        
+        groups = {}
+        for domain in sorted(domains):
+            groups.setdefault(self.registrable_domain(domain), []).append(domain)
+        
+        # Each domain contributes itself and its www alias
+        per_cert = self.MAX_CERT_NAMES // 2
+        batches = []
+        for members in groups.values():
+            for i in range(0, len(members), per_cert):
+                chunk = members[i:i + per_cert]
+                batches.append((chunk[0], chunk))
+        return batches
+    
+    def issue_certificate_batch(self, cert_name, domains, email, server_ip):
+        """
+        Issue one certificate covering several domains and their www aliases
+        
+        DNS is checked first; a domain that does not resolve to this server
+        is left out of the certificate, and a www alias that does not
+        resolve is dropped while its domain is kept. If the order still
+        fails (a name failing validation fails the whole order), the group
+        is split in two and each half is retried, down to single domains,
+        so one bad domain does not block the others.
+        
+        Args:
+            cert_name (str): Certbot lineage name
+            domains (list): Domains to cover
+            email (str): Let's Encrypt account email
+            server_ip (str): Public IP the names must resolve to, None to skip
+            
+        Returns:
+            dict: Per-domain results with status, error, seconds and the
+            cert_name of the lineage that covers the domain
+        """
+        started = time.monotonic()
+        results = {}
+        names = {}
+        
+        for domain in domains:
+            for name in (domain, f"www.{domain}"):
+                if server_ip is not None:
+                    try:
+                        resolved = socket.gethostbyname(name)
+                    except OSError:
+                        resolved = None
+                    if resolved != server_ip:
+                        if name == domain:
+                            results[domain] = {'status': 'failed', 'error': f"DNS for {name} does not point to {server_ip}"}
+                            break
+                        logger.warning(f"Leaving {name} out of certificate {cert_name}: DNS mismatch")
+                        continue
+                names.setdefault(domain, []).append(name)
+        
+        covered = [d for d in domains if d not in results]
+        orders = [(cert_name, covered)] if covered else []
+        while orders:
+            order_name, group = orders.pop(0)
+            command = (
+                f"certbot certonly --webroot -w {self.acme_webroot} --non-interactive --agree-tos --expand "
+                f"--email {email} --cert-name {order_name} --deploy-hook '{self.CERTBOT_DEPLOY_HOOK}' "
+                + " ".join(f"-d {name}" for domain in group for name in names[domain])
+            )
+            # Certbot holds an exclusive lock on its configuration directory
+            with self._certbot_lock:
+                certbot_started = time.monotonic()
+                success = self.run_command(command)
+                seconds = round(time.monotonic() - certbot_started, 2)
+            
+            if not success and len(group) > 1:
+                half = len(group) // 2
+                logger.warning(f"Certificate {order_name} failed for {len(group)} domains, retrying in two halves")
+                orders += [(order_name, group[:half]), (group[half], group[half:])]
+                continue
+            for domain in group:
+                results[domain] = {'status': 'issued' if success else 'failed', 'seconds': seconds,
+                                   'cert_name': order_name}
+                if not success:
+                    results[domain]['error'] = "certbot failed, see /var/log/letsencrypt/letsencrypt.log"
+        
+        logger.info(f"Certificate batch {cert_name}: {len(covered)}/{len(domains)} domains in "
+                    f"{time.monotonic() - started:.1f}s")
+        return results
+    
+    def issue_pending_certificates(self, domains=None, workers=4, email=None, san=True, dry_run=False):
+        """
+        Issue certificates for sites still served with the placeholder certificate
+        
+        Runs non-interactively: DNS checks run in a bounded worker pool,
+        domains are grouped into SAN certificates, results and timings are
+        recorded in the site store, and every updated Virtual Host is
+        activated with a single reload.
+        
+        Args:
+            domains (list): Domains to issue for, all pending sites if omitted
+            workers (int): Number of concurrent batches
+            email (str): Let's Encrypt account email, read from
+                /etc/letsencrypt/.email if omitted
+            san (bool): Group domains into SAN certificates
+            dry_run (bool): Print the batches without issuing
+        """
+        if not dry_run:
+            self.check_sudo()
+        
+        pending = []
+        for domain, site in self.sites.items():
+            if domains and domain not in domains:
+                continue
+            if site.get('mode') == 'mass' or not site.get('ssl'):
+                continue
+            if not os.path.exists(self.certificate_paths(domain, site)[0]):
+                pending.append(domain)
+        
+        for domain in domains or []:
+            if domain not in self.sites:
+                print(f"⚠️  Site {domain} does not exist in configuration")
+        
+        if not pending:
+            print("✅ No sites are waiting for a certificate")
+            return
+        
+        batches = self.plan_certificate_batches(pending, san)
+        print(f"🔒 {len(pending)} domains pending, {len(batches)} certificates to issue:")
+        for cert_name, members in batches:
+            print(f"   • {cert_name}: {', '.join(members)}")
+        
+        if dry_run:
+            print("💡 Dry run, no certificates issued")
+            return
+        
+        email = self.get_letsencrypt_email(email, interactive=False)
+        if not email:
+            print("❌ No Let's Encrypt email configured")
+            print("💡 Pass --email you@example.com (it is saved for future runs)")
+            return
+        
+        if not self.certbot_available():
+            print("❌ Certbot not found. Run setup_ssl.sh first")
+            return
+        
+        os.makedirs(f"{self.acme_webroot}/.well-known/acme-challenge", exist_ok=True)
+        
+        server_ip = self.get_public_ip()
+        if server_ip is None:
+            print("⚠️  Warning: Could not determine public IP, skipping DNS checks")
+        
+        results = {}
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            futures = {
+                pool.submit(self.issue_certificate_batch, cert_name, members, email, server_ip): cert_name
+                for cert_name, members in batches
+            }
+            for future in as_completed(futures):
+                cert_name = futures[future]
+                try:
+                    batch_results = future.result()
+                except Exception as e:
+                    logger.error(f"Certificate batch {cert_name} crashed: {e}")
+                    batch_results = {d: {'status': 'failed', 'error': str(e)}
+                                     for c, members in batches if c == cert_name for d in members}
+                for domain, result in batch_results.items():
+                    results[domain] = {'cert_name': cert_name, **result}
+                    icon = "✅" if result['status'] == 'issued' else "❌"
+                    print(f"{icon} {domain} ({results[domain]['cert_name']}) {result.get('error', '')}".rstrip())
+        
+        now = datetime.now().isoformat()
+        with self.sites.transaction():
+            for domain, result in results.items():
+                site = {k: v for k, v in self.sites[domain].items() if k != 'cert_error'}
+                site.update({
+                    'cert_status': result['status'],
+                    'cert_attempted_at': now,
+                    'cert_seconds': result.get('seconds')
+                })
+                if result['status'] == 'issued':
+                    site['cert_name'] = result['cert_name']
+                    site['cert_issued_at'] = now
+                else:
+                    site['cert_error'] = result.get('error')
+                self.sites[domain] = site
+        
+        issued = [d for d, r in results.items() if r['status'] == 'issued']
+        print(f"\n🔒 Issued certificates for {len(issued)}/{len(pending)} domains "
+              f"in {time.monotonic() - started:.1f}s")
+        
+        if issued:
+            configs = {d: self.render_site_config(d, self.sites[d]) for d in issued}
+            if self.apply_config_batch(configs):
+                with self.sites.transaction():
+                    for domain, content in configs.items():
+                        config_path = f"{self.sites_available}/{domain}.conf"
+                        self.sites[domain] = {**self.sites[domain], **self.config_state(config_path, content)}
+                print("✅ Virtual Hosts updated with the new certificates")
+            else:
+                print("⚠️  Certificates issued but Virtual Hosts were not updated, run reconcile")
+            self.refresh_certificate_index()
+        
+        logger.info(f"Issued certificates for {len(issued)}/{len(pending)} pending domains")
+    
+    def create_site(self, domain, port, ssl=True, options=None, acme_mode='webroot'):
+        """
+        Create a new Virtual Host
+        
+        Args:
+            domain (str): Domain name
+            port (int or str): Local port to proxy to, or ``unix:/path.sock``
+            ssl (bool): Whether to install SSL certificate
+            options (dict): Raw per-site settings (see normalize_site_options)
+            acme_mode (str): ``webroot`` (no downtime) or ``apache`` (temporary Virtual Host)
+        """
+        self.check_sudo()
+        
+        # Validate inputs
+        if not self.validate_domain(domain):
+            print(f"❌ Invalid domain name: {domain}")
+            return
+        
+        options = dict(options or {})
+        socket_path = self.socket_path(port)
+        if socket_path:
+            # Unix socket upstreams have no port, the socket is the backend
+            port_num = None
+            options.setdefault('backends', str(port))
+        else:
+            port_num = self.validate_port(port)
+            if port_num is None:
+                return
+        
+        options, option_errors = self.normalize_site_options(options)
+        if option_errors:
+            for error in option_errors:
+                print(f"❌ {error}")
+            return
+        
+        # Check if site already exists
+        if domain in self.sites:
+            response = input(f"⚠️  Site {domain} already exists. Replace it? (y/n): ")
+            if response.lower() != 'y':
+                return
+        
+        if socket_path:
+            upstream = socket_path
+            socket_users = [d for d in self.sites.find_by_socket(socket_path) if d != domain]
+            if socket_users:
+                print(f"⚠️  Socket {socket_path} is already used by: {', '.join(socket_users)}")
+            
+            # Warn if nothing listens on the socket
+            if self.check_socket_listening(socket_path):
+                print(f"💡 Service appears to be listening on {socket_path}")
+            else:
+                print(f"⚠️  Warning: No service detected on {socket_path}")
+                response = input("Continue anyway? (y/n): ")
+                if response.lower() != 'y':
+                    return
+        else:
+            upstream = f"port {port_num}"
+            # Warn if another site already proxies to this port
+            port_users = [d for d in self.sites.find_by_port(port_num) if d != domain]
+            if port_users:
+                print(f"⚠️  Port {port_num} is already used by: {', '.join(port_users)}")
+            
+            # Warn if port is not responding
+            if not self.check_port_available(port_num):
+                print(f"💡 Service appears to be running on port {port_num}")
+            else:
+                print(f"⚠️  Warning: No service detected on port {port_num}")
+                response = input("Continue anyway? (y/n): ")
+                if response.lower() != 'y':
+                    return
+        
+        print(f"🚀 Creating Virtual Host for {domain} on {upstream}...")
+        
+        # A replaced site keeps its certificate lineage and health history
+        preserved = self.preserved_state(self.sites.get(domain))
+        
+        # Lint in memory so a rejected configuration never replaces the live file
+        content = self.render_vhost_config(domain, port_num, ssl, {**options, **preserved})
+        if not self.lint_batch({domain: content}, pending_files=self.pending_snippets()):
+            print("❌ Invalid Apache configuration, nothing was changed")
+            return
+        
+        # Create configuration file
+        config_path = self.create_vhost_config(domain, port_num, ssl, {**options, **preserved})
+        if not config_path:
+            return
+        
+        # Enable required modules
+        self.enable_modules(self.site_modules(options), self.site_confs(options))
+        if options.get('tls_profile'):
+            self.check_http2_support()
+        self.check_upstream_protocol_support([options])
+        self.check_static_mounts(options)
+        self.ensure_cache_root(domain, options)
+        
+        # Enable the site
+        if not self.enable_sites([domain]):
+            print(f"❌ Failed to enable site {domain}")
+            return
+        
+        # Test Apache configuration
+        if not self.run_command("apache2ctl configtest"):
+            print("❌ Invalid Apache configuration")
+            self.run_command("apache2ctl configtest", show_output=True)
+            return
+        
+        # Reload Apache
+        if self.run_command("systemctl reload apache2"):
+            print("✅ Basic configuration created!")
+            
+            # Install SSL certificate if requested
+            ssl_success = True
+            if ssl:
+                response = input("🔒 Install SSL certificate with Let's Encrypt? (y/n): ")
+                if response.lower() == 'y':
+                    ssl_success = self.install_ssl_certificate(domain, acme_mode)
+                    
+                    # If SSL was successful, recreate the virtual host with proper SSL configuration
+                    if ssl_success:
+                        print("🔧 Updating virtual host configuration with SSL...")
+                        # The new certificate is the domain's own lineage
+                        preserved = {k: v for k, v in preserved.items() if not k.startswith('cert_')}
+                        # Recreate config pointing at the issued certificate
+                        new_config_path = self.create_vhost_config(domain, port_num, True, {**options, **preserved})
+                        if new_config_path:
+                            # The apache ACME mode leaves the site disabled
+                            if acme_mode == 'apache':
+                                self.enable_sites([domain])
+                            self.run_command("systemctl reload apache2")
+                            print("✅ SSL configuration updated!")
+                        else:
+                            print("⚠️  Warning: Failed to update SSL configuration")
+                else:
+                    ssl = False
+            # Save configuration
+            self.sites[domain] = {
+                'port': port_num,
+                'ssl': ssl and ssl_success,
+                'created': datetime.now().isoformat(),
+                'config_file': config_path,
+                **options,
+                **preserved,
+                **self.config_state(config_path),
+                **((self.read_certificate(self.certificate_file(domain, {**options, **preserved})) or {})
+                   if ssl and ssl_success else {})
+            }
+            
+            print("\n✅ Virtual Host created successfully!")
+            print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+            print(f"📍 Domain: {domain}")
+            if socket_path:
+                print(f"🔌 Socket: {socket_path}")
+            else:
+                print(f"🔌 Port: {port_num}")
+            if options.get('protocol'):
+                print(f"🔀 Protocol: {options['protocol']}")
+            if options.get('pool'):
+                print(f"🏊 Pool: {self.describe_pool(options['pool'])}")
+            if ssl and ssl_success:
+                print(f"🔒 HTTPS: Enabled (automatic redirect)")
+                print(f"🌐 URL: https://{domain}")
+            else:
+                print(f"🌐 URL: http://{domain}")
+            print(f"📁 Config: {config_path}")
+            if options.get('log_profile') == 'consolidated':
+                print(f"📝 Logs: /var/log/apache2/vhost-manager-access.log (stats {domain})")
+            else:
+                print(f"📝 Logs: /var/log/apache2/{domain}-*.log")
+            print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+        else:
+            print("❌ Failed to reload Apache")
+    
+    def delete_site(self, domain):
+        """
+        Delete a Virtual Host
+        
+        Args:
+            domain (str): Domain name to delete
+        """
+        self.check_sudo()
+        
+        if domain not in self.sites:
+            print(f"❌ Site {domain} does not exist in configuration")
+            return
+        
+        if self.sites[domain].get('mode') == 'mass':
+            previous = self.sites[domain]
+            del self.sites[domain]
+            if self.build_mass_map():
+                print(f"✅ Site {domain} removed from host map (no reload needed)")
+                logger.info(f"Deleted mass-hosted site: {domain}")
+            else:
+                self.sites[domain] = previous
+            return
+        
+        print(f"🗑️  Deleting Virtual Host {domain}...")
+        
+        # Disable the site 
+        self.disable_sites([domain])
+        
+        # Remove configuration file
+        config_file = self.sites[domain]['config_file']
+        if os.path.exists(config_file):
+            os.remove(config_file)
+            logger.info(f"Removed configuration file: {config_file}")
+        
+        # Reload Apache
+        if self.run_command("systemctl reload apache2"):
+            if os.path.isdir(self.cache_root(domain)):
+                shutil.rmtree(self.cache_root(domain), ignore_errors=True)
+            del self.sites[domain]
+            print(f"✅ Site {domain} deleted successfully")
+            logger.info(f"Deleted Virtual Host: {domain}")
+        else:
+            print("❌ Failed to reload Apache")
+    
+    def render_mass_vhost_config(self):
+        """
+        Render the catch-all Virtual Host used in mass-hosting mode
+        
+        Requests are routed by Host header through a DBM RewriteMap, so
+        adding or removing a domain only rebuilds the map and Apache picks
+        the change up on the next lookup without a reload.
+        
+        Returns:
+            str: Rendered configuration content
+        """
+        return f"""# Managed by vhost_manager.py - mass hosting catch-all
+<VirtualHost *:80>
+    ServerName vhost-manager-mass.localhost
+    UseCanonicalName Off
+    
+    # Logging (%V is the requested Host)
+    ErrorLog ${{APACHE_LOG_DIR}}/vhost-manager-mass-error.log
+    CustomLog ${{APACHE_LOG_DIR}}/vhost-manager-mass-access.log "%V %h %l %u %t \\"%r\\" %>s %O \\"%{{Referer}}i\\" \\"%{{User-Agent}}i\\""
+    
+    # Host -> backend routing table
+    RewriteEngine On
+    RewriteMap vhm_lowercase int:tolower
+    RewriteMap vhm_backends "dbm=sdbm:{self.mass_map_file}"
+    
+    RewriteCond ${{vhm_lowercase:%{{HTTP_HOST}}}} ^([^:]+)
+    RewriteCond ${{vhm_backends:%1|NONE}} ^(?!NONE$)(.+)$
+    RewriteRule ^/(.*)$ %1/$1 [P,L]
+    
+    # Unknown hosts
+    RewriteRule ^ - [R=404,L]
+    
+    # Proxy headers
+    Include {self.snippet_path('proxy')}
+    
+    # Security headers
+    Include {self.snippet_path('headers')}
+</VirtualHost>"""
+    
+    def build_mass_map(self):
+        """
+        Rebuild the Host -> backend DBM map from mass-mode sites
+        
+        httxt2dbm cannot update a map in place, so any change rebuilds the
+        whole map; nothing is rebuilt when the map text is unchanged.
+        SDBM maps are a .dir/.pag pair, so each rebuild writes a new pair
+        in its own generation directory with httxt2dbm and then swaps the
+        ``current`` symlink in one rename. Apache never sees a partially
+        written map or a .dir file from one build with a .pag from another.
+        The previous generation is kept for readers still holding it open.
+        
+        Returns:
+            bool: True if the map is up to date
+        """
+        entries = []
+        for domain, site in sorted(self.sites.items()):
+            if site.get('mode') != 'mass':
+                continue
+            backend = f"http://localhost:{site['port']}"
+            entries.append(f"{domain} {backend}")
+            entries.append(f"www.{domain} {backend}")
+        content = "\n".join(entries) + "\n"
+        link = os.path.dirname(self.mass_map_file)
+        if os.path.islink(link) and self.read_file(self.mass_map_source) == content:
+            logger.info("Mass host map unchanged, not rebuilt")
+            return True
+        
+        try:
+            os.makedirs(self.mass_dir, exist_ok=True)
+            
+            source_tmp = f"{self.mass_map_source}.tmp"
+            with open(source_tmp, 'w') as f:
+                f.write(content)
+            
+            maps_dir = f"{self.mass_dir}/maps"
+            generation = f"{maps_dir}/{time.time_ns()}"
+            os.makedirs(generation)
+            map_file = f"{generation}/{os.path.basename(self.mass_map_file)}"
+            if not self.run_command(["httxt2dbm", "-f", "SDBM", "-i", source_tmp, "-o", map_file]):
+                print("❌ Failed to build host map (is httxt2dbm installed? apt install apache2-utils)")
+                os.remove(source_tmp)
+                shutil.rmtree(generation, ignore_errors=True)
+                return False
+            
+            previous = os.path.realpath(link) if os.path.islink(link) else None
+            link_tmp = f"{link}.tmp"
+            if os.path.lexists(link_tmp):
+                os.remove(link_tmp)
+            os.symlink(os.path.relpath(generation, os.path.dirname(link)), link_tmp)
+            os.replace(link_tmp, link)
+            os.replace(source_tmp, self.mass_map_source)
+            
+            for old in os.listdir(maps_dir):
+                old = f"{maps_dir}/{old}"
+                if old not in (generation, previous):
+                    shutil.rmtree(old, ignore_errors=True)
+            
+        except Exception as e:
+            logger.error(f"Failed to build mass host map: {e}")
+            print(f"❌ Error building host map: {e}")
+            return False
+        
+        logger.info(f"Rebuilt mass host map with {len(entries) // 2} domains")
+        try:
+            with open(self.mass_config_file) as f:
+                if self.mass_map_file not in f.read():
+                    print("⚠️  The mass-hosting Virtual Host reads an older host map location")
+                    print("💡 Run: sudo python3 vhost_manager.py mass enable")
+        except FileNotFoundError:
+            pass
+        return True
+    
+    def enable_mass_mode(self):
+        """Install and enable the mass-hosting catch-all Virtual Host"""
+        self.check_sudo()
+        print("🗺️  Enabling mass-hosting mode...")
+        
+        if not self.build_mass_map():
+            return
+        
+        config_name = os.path.basename(self.mass_config_file)[:-len('.conf')]
+        if not self.apply_config_batch({config_name: self.render_mass_vhost_config()}, modules=[]):
+            print("❌ Failed to enable mass-hosting mode")
+            return
+        
+        print("✅ Mass-hosting mode enabled")
+        print(f"📁 Config: {self.mass_config_file}")
+        print(f"🗺️  Host map: {self.mass_map_source}")
+        logger.info("Mass-hosting mode enabled")
+    
+    def create_mass_site(self, domain, port):
+        """
+        Add a domain to the mass-hosting map without reloading Apache
+        
+        Args:
+            domain (str): Domain name
+            port (int): Local port to proxy to
+        """
+        self.check_sudo()
+        
+        if not self.validate_domain(domain):
+            print(f"❌ Invalid domain name: {domain}")
+            return
+        
+        port_num = self.validate_port(port)
+        if port_num is None:
+            return
+        
+        if not os.path.exists(self.mass_config_file):
+            print("❌ Mass-hosting mode is not enabled")
+            print("💡 Run: sudo python3 vhost_manager.py mass enable")
+            return
+        
+        if domain in self.sites and self.sites[domain].get('mode') != 'mass':
+            print(f"❌ Site {domain} already has a dedicated Virtual Host")
+            return
+        
+        if self.check_port_available(port_num):
+            print(f"⚠️  Warning: No service detected on port {port_num}")
+        
+        previous = self.sites.get(domain)
+        self.sites[domain] = {
+            'mode': 'mass',
+            'port': port_num,
+            'ssl': False,
+            'created': (previous or {}).get('created', datetime.now().isoformat()),
+            'config_file': self.mass_config_file
+        }
+        
+        if not self.build_mass_map():
+            if previous is None:
+                del self.sites[domain]
+            else:
+                self.sites[domain] = previous
+            return
+        
+        print(f"✅ {domain} routed to port {port_num} (no reload needed)")
+        logger.info(f"Added mass-hosted site: {domain}:{port_num}")
+    
+    def load_manifest(self, manifest_path):
+        """
+        Load a site manifest from a YAML or JSON file
+        
+        The manifest holds a ``sites`` entry, either a list of site
+        definitions or a mapping of domain to site definition:
+        
+            sites:
+              - domain: example.com
+                port: 3000
+              - domain: api.example.com
+                port: 8080
+                ssl: false
+        
+        Args:
+            manifest_path (str): Path to the manifest file
+            
+        Returns:
+            list: Site definitions (dicts with domain, port, ssl), None if failed
+        """
+        try:
+            with open(manifest_path, 'r') as f:
+                if manifest_path.endswith(('.yaml', '.yml')):
+                    if yaml is None:
+                        print("❌ PyYAML is required for YAML manifests (apt install python3-yaml)")
+                        return None
+                    data = yaml.safe_load(f)
+                else:
+                    data = json.load(f)
+        except Exception as e:
+            logger.error(f"Failed to load manifest {manifest_path}: {e}")
+            print(f"❌ Failed to load manifest: {e}")
+            return None
+        
+        sites = data.get('sites') if isinstance(data, dict) else data
+        if isinstance(sites, dict):
+            sites = [dict(options or {}, domain=domain) for domain, options in sites.items()]
+        
+        if not isinstance(sites, list):
+            print("❌ Manifest must contain a list or mapping of sites")
+            return None
+        
+        return sites
+    
+    def summarize_config(self, content):
+        """
+        Parse the parts of an Apache configuration the linter checks
+        
+        Args:
+            content (str): Configuration file content
+            
+        Returns:
+            dict: ``errors`` (line, message), ``names`` (address, name, line),
+            ``includes`` (line, path), ``certificates`` (line, path) and
+            ``backends`` (set of proxied URLs)
+        """
+        summary = {'errors': [], 'names': [], 'includes': [], 'certificates': [], 'backends': set()}
+        sections = []
+        addresses = None
+        logical, start = "", 0
+        
+        for number, raw in enumerate(content.splitlines(), 1):
+            if not logical:
+                start = number
+            if raw.endswith('\\'):
+                logical += raw[:-1]
+                continue
+            line, logical = (logical + raw).strip(), ""
+            if not line or line.startswith('#'):
+                continue
+            
+            if line.startswith('<'):
+                match = self.SECTION_PATTERN.match(line)
+                if not match:
+                    summary['errors'].append((start, f"Malformed section tag: {line[:60]}"))
+                elif match.group(1):
+                    name = match.group(2).lower()
+                    if not any(open_name.lower() == name for open_name, _ in sections):
+                        summary['errors'].append((start, f"</{match.group(2)}> without a matching open section"))
+                        continue
+                    while sections[-1][0].lower() != name:
+                        open_name, open_line = sections.pop()
+                        summary['errors'].append(
+                            (open_line, f"<{open_name}> is not closed before </{match.group(2)}> on line {start}"))
+                    sections.pop()
+                    if name == 'virtualhost':
+                        addresses = None
+                else:
+                    sections.append((match.group(2), start))
+                    if match.group(2).lower() == 'virtualhost':
+                        addresses = [a.rsplit(':', 1)[-1] if ':' in a else '*' for a in match.group(3).split()]
+                continue
+            
+            if len(re.findall(r'(?<!\\)"', line)) % 2:
+                summary['errors'].append((start, f"Unbalanced quotes: {line[:60]}"))
+                continue
+            
+            tokens = line.split()
+            directive = tokens[0].lower()
+            if directive in ('servername', 'serveralias') and addresses is not None:
+                for name in tokens[1:]:
+                    for address in addresses:
+                        summary['names'].append((address, name.lower().split(':')[0], start))
+            elif directive == 'include' and len(tokens) > 1:
+                summary['includes'].append((start, tokens[1].strip('"')))
+            elif directive in ('sslcertificatefile', 'sslcertificatekeyfile') and len(tokens) > 1:
+                summary['certificates'].append((start, tokens[1].strip('"')))
+            elif directive == 'proxypass' and len(tokens) > 2 and tokens[2] != '!':
+                summary['backends'].add(tokens[2].strip('"').rstrip('/'))
+            elif directive == 'balancermember' and len(tokens) > 1:
+                summary['backends'].add(tokens[1].strip('"').rstrip('/'))
+        
+        for name, line in sections:
+            summary['errors'].append((line, f"<{name}> is never closed"))
+        summary['backends'] = {url for url in summary['backends'] if not url.startswith('balancer://')}
+        return summary
+    
+    def config_summary(self, path):
+        """Return the summary of a configuration file, cached until the file changes"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = self._lint_cache.get(path)
+        if cached is None or cached[0] != key:
+            content = self.read_file(path)
+            if content is None:
+                return None
+            cached = (key, self.summarize_config(content))
+            self._lint_cache[path] = cached
+        return cached[1]
+    
+    def lint(self, configs=None, removals=(), pending_files=()):
+        """
+        Check enabled and pending configurations without running configtest
+        
+        Every enabled site is summarized once (and cached by file
+        fingerprint), then name, backend, include and certificate indexes
+        are built over all of them.
+        
+        Args:
+            configs (dict): Domain to pending configuration content, replacing
+                the enabled file of that domain and its certbot copies
+            removals (list): Domains whose enabled configuration goes away
+            pending_files (list): Files written with the batch (shared snippets)
+            
+        Returns:
+            list: Issues as dicts with level (error or warning), files and message
+        """
+        configs = configs or {}
+        replaced = {
+            f"{self.sites_enabled}/{name}.conf"
+            for domain in [*configs, *removals]
+            for name in [domain, *self.certbot_vhosts(domain)]
+        }
+        summaries = {}
+        for path in sorted(glob.glob(f"{self.sites_enabled}/*.conf")):
+            if path not in replaced:
+                summary = self.config_summary(path)
+                if summary is not None:
+                    summaries[path] = summary
+        for domain, content in configs.items():
+            summaries[f"{self.sites_available}/{domain}.conf"] = self.summarize_config(content)
+        pending_files = set(pending_files)
+        
+        def label(path):
+            return os.path.basename(path)
+        
+        issues = []
+        names = {}
+        backends = {}
+        for path, summary in summaries.items():
+            for line, message in summary['errors']:
+                issues.append({'level': 'error', 'files': [path], 'message': f"{label(path)}:{line}: {message}"})
+            for address, name, line in summary['names']:
+                names.setdefault((name, address), []).append((path, line))
+            for url in summary['backends']:
+                backends.setdefault(url, set()).add(path)
+            for line, include in summary['includes']:
+                if '${' in include or any(c in include for c in '*?['):
+                    continue
+                include = include if include.startswith('/') else f"/etc/apache2/{include}"
+                if include not in pending_files and not os.path.exists(include):
+                    issues.append({'level': 'error', 'files': [path],
+                                   'message': f"{label(path)}:{line}: Include {include} does not exist"})
+            for line, certificate in summary['certificates']:
+                if '${' not in certificate and not os.path.exists(certificate):
+                    issues.append({'level': 'error', 'files': [path],
+                                   'message': f"{label(path)}:{line}: certificate file {certificate} is missing"})
+        
+        for (name, address), declarations in sorted(names.items()):
+            paths = list(dict.fromkeys(path for path, _ in declarations))
+            if len(paths) > 1:
+                where = ", ".join(f"{label(path)}:{line}" for path, line in declarations)
+                issues.append({'level': 'error', 'files': paths,
+                               'message': f"{name} on port {address} is declared by several sites ({where})"})
+        
+        for url, paths in sorted(backends.items()):
+            if len(paths) > 1:
+                issues.append({'level': 'warning', 'files': sorted(paths),
+                               'message': f"Backend {url} is shared by {', '.join(sorted(label(p) for p in paths))}"})
+        return issues
+    
+    def lint_batch(self, configs, removals=(), pending_files=()):
+        """
+        Lint a batch before it is written, printing the issues it introduces
+        
+        Issues that only involve other, unchanged sites are not reported
+        here (``lint`` shows them) so they do not block unrelated changes.
+        
+        Returns:
+            bool: True if the batch has no errors
+        """
+        started = time.monotonic()
+        batch_files = {f"{self.sites_available}/{domain}.conf" for domain in configs}
+        issues = [
+            issue for issue in self.lint(configs, removals, pending_files)
+            if batch_files.intersection(issue['files'])
+        ]
+        errors = [issue for issue in issues if issue['level'] == 'error']
+        for issue in issues:
+            print(f"{'❌' if issue['level'] == 'error' else '⚠️ '} {issue['message']}")
+        logger.info(f"Linted {len(configs)} configurations in {(time.monotonic() - started) * 1000:.1f} ms "
+                    f"({len(errors)} errors)")
+        return not errors
+    
+    def lint_sites(self, as_json=False):
+        """
+        Lint every enabled configuration and the site store
+        
+        Args:
+            as_json (bool): Print JSON instead of text
+            
+        Returns:
+            bool: True if no errors were found
+        """
+        started = time.monotonic()
+        issues = self.lint()
+        for domain, site in self.sites.items():
+            if site.get('mode') == 'mass':
+                continue
+            if not os.path.exists(site.get('config_file', '')):
+                issues.append({'level': 'error', 'files': [],
+                               'message': f"{domain}: configuration file is missing (run reconcile)"})
+            elif not self.site_enabled(domain):
+                issues.append({'level': 'warning', 'files': [site['config_file']],
+                               'message': f"{domain}: stored site is not enabled (run reconcile)"})
+        elapsed_ms = (time.monotonic() - started) * 1000
+        errors = sum(1 for issue in issues if issue['level'] == 'error')
+        
+        if as_json:
+            print(json.dumps({'issues': issues, 'errors': errors, 'elapsed_ms': round(elapsed_ms, 1)}, indent=2))
+            return errors == 0
+        for issue in issues:
+            print(f"{'❌' if issue['level'] == 'error' else '⚠️ '} {issue['message']}")
+        if not issues:
+            print(f"✅ {len(self._lint_cache)} configurations and {len(self.sites)} sites look good")
+        print(f"⏱️  Linted in {elapsed_ms:.1f} ms ({errors} errors, {len(issues) - errors} warnings)")
+        return errors == 0
+    
+    def apply_config_batch(self, configs, reload=False, removals=(), modules=None, confs=None):
+        """
+        Write, enable and activate several Virtual Host configurations at once
+        
+        The batch is linted in-process first. All files (including changed
+        shared snippets) are then written and enabled before a single
+        configtest runs. If the test fails, every file and
+        symlink is restored to its previous state so the running Apache
+        configuration is never affected. Apache is reloaded exactly once for
+        the whole batch.
+        
+        Vhosts left by the certbot Apache plugin for a domain of the batch
+        (``certbot_vhosts``) are disabled and deleted with it.
+        
+        Args:
+            configs (dict): Mapping of domain to rendered configuration content
+            reload (bool): Test and reload even if no file changed
+            removals (list): Domains whose configuration is disabled and deleted
+            modules (list): Modules the batch needs, enabled once the lint
+                passes (None to leave modules alone)
+            confs (list): Server-wide configurations the batch needs
+            
+        Returns:
+            bool: True if the batch was applied and Apache reloaded
+        """
+        snippets = self.pending_snippets()
+        if modules is not None and any(self.missing_modules(modules, confs)):
+            reload = True
+        if not configs and not snippets and not reload and not removals:
+            return True
+        
+        # Cheap in-process checks first, configtest only runs on a clean batch
+        if not self.lint_batch(configs, removals, snippets):
+            print("❌ Lint failed, no changes were applied")
+            return False
+        
+        if modules is not None:
+            self.enable_modules(modules, confs)
+        
+        os.makedirs(self.sites_available, exist_ok=True)
+        os.makedirs(self.snippets_dir, exist_ok=True)
+        os.makedirs(f"{self.acme_webroot}/.well-known/acme-challenge", exist_ok=True)
+        
+        files = dict(snippets)
+        for domain, content in configs.items():
+            files[f"{self.sites_available}/{domain}.conf"] = content
+        
+        superseded = [
+            name for domain in [*configs, *removals] for name in self.certbot_vhosts(domain)
+            if self.site_enabled(name) or os.path.exists(f"{self.sites_available}/{name}.conf")
+        ]
+        removed_files = [f"{self.sites_available}/{name}.conf" for name in [*removals, *superseded]]
+        
+        # Snapshot current state for rollback
+        previous_files = {path: self.read_file(path) for path in [*files, *removed_files]}
+        to_enable = [d for d in configs if not self.site_enabled(d)]
+        to_disable = [name for name in [*removals, *superseded] if self.site_enabled(name)]
+        
+        def rollback():
+            print("↩️  Rolling back batch...")
+            self.disable_sites(to_enable)
+            for path, previous in previous_files.items():
+                try:
+                    if previous is None:
+                        if os.path.exists(path):
+                            os.remove(path)
+                    else:
+                        with open(path, 'w') as f:
+                            f.write(previous)
+                except Exception as e:
+                    logger.error(f"Failed to restore {path}: {e}")
+            self.enable_sites(to_disable)
+            logger.warning(f"Rolled back batch of {len(configs)} sites")
+        
+        try:
+            for path, content in files.items():
+                with open(path, 'w') as f:
+                    f.write(content)
+                os.chmod(path, 0o644)
+            logger.info(f"Wrote {len(configs)} Virtual Host configurations and {len(snippets)} shared snippets")
+            if to_disable and not self.disable_sites(to_disable):
+                raise OSError(f"a2dissite failed for {', '.join(to_disable)}")
+            for path in removed_files:
+                if os.path.exists(path):
+                    os.remove(path)
+                    logger.info(f"Removed configuration file: {path}")
+        except Exception as e:
+            logger.error(f"Failed to write batch configuration: {e}")
+            print(f"❌ Error writing configuration files: {e}")
+            rollback()
+            return False
+        
+        if not self.enable_sites(to_enable):
+            print("❌ Failed to enable sites")
+            rollback()
+            return False
+        
+        if not self.run_command("apache2ctl configtest"):
+            print("❌ Invalid Apache configuration")
+            self.run_command("apache2ctl configtest", show_output=True)
+            rollback()
+            return False
+        
+        if not self.run_command("systemctl reload apache2"):
+            print("❌ Failed to reload Apache")
+            return False
+        
+        return True
+    
+    def apply_manifest(self, manifest_path):
+        """
+        Provision every site in a manifest with one configtest and one reload
         
-        # Check if certbot is installed
-        if not self.run_command("which certbot"):
-            print("📦 Certbot not found. Installing Certbot...")
-            if not self.run_command("apt update && apt install -y certbot python3-certbot-apache"):
-                print("❌ Failed to install Certbot")
-                return False
+        SSL sites get their HTTPS Virtual Host rendered; certificates are
+        installed separately so the batch stays non-interactive. Entries
+        with ``mass: true`` are added to the mass-hosting map instead.
         
-        # Check if domain DNS points to current server
-        print("🔍 Checking domain DNS configuration...")
-        if not self.check_domain_dns(domain):
-            print(f"⚠️  Warning: Domain {domain} may not point to this server")
-            print("💡 Make sure your DNS A record points to this server's IP address")
-            response = input("Continue with SSL installation anyway? (y/n): ")
-            if response.lower() != 'y':
-                return False
+        Args:
+            manifest_path (str): Path to a YAML or JSON manifest
+        """
+        self.check_sudo()
         
-        # Create temporary HTTP-only virtual host for Let's Encrypt challenge
-        print("🔧 Creating temporary HTTP configuration for Let's Encrypt verification...")
-        temp_config = f"""<VirtualHost *:80>
-    ServerName {domain}
-    ServerAlias www.{domain}
+        entries = self.load_manifest(manifest_path)
+        if entries is None:
+            return
+        
+        # Validate the whole batch before touching anything
+        batch, errors = self.validate_entries(entries)
+        
+        if errors:
+            print(f"❌ Manifest validation failed ({len(errors)} errors):")
+            for error in errors:
+                print(f"   • {error}")
+            return
+        
+        if not batch:
+            print("📝 Manifest contains no sites")
+            return
+        
+        print(f"🚀 Applying {len(batch)} sites from {manifest_path}...")
+        if self.apply_batch(batch):
+            logger.info(f"Applied manifest {manifest_path} ({len(batch)} sites)")
     
-    # Document root for Let's Encrypt challenges
-    DocumentRoot /var/www/html
+    def validate_entries(self, entries):
+        """
+        Validate manifest entries without touching anything
+        
+        Args:
+            entries (list): Site entries in manifest form
+            
+        Returns:
+            tuple: (batch mapping domain to port, ssl, mode and normalized
+            options, list of error messages)
+        """
+        errors = []
+        batch = {}
+        for entry in entries:
+            domain = str(entry.get('domain', '')).strip().lower() if isinstance(entry, dict) else ''
+            if not self.validate_domain(domain):
+                errors.append(f"Invalid domain name: {domain or entry}")
+                continue
+            if domain in batch:
+                errors.append(f"Duplicate domain in manifest: {domain}")
+                continue
+            port = entry.get('port')
+            if port is not None and self.socket_path(port) and not entry.get('backends'):
+                entry = {**entry, 'backends': [port]}
+                port = None
+            first = None
+            if entry.get('backends'):
+                backends = entry['backends']
+                first = backends[0] if isinstance(backends, list) else str(backends).split(',')[0]
+            mode = 'mass' if entry.get('mass') else 'vhost'
+            if port is None and first is not None and self.socket_path(first):
+                if mode == 'mass':
+                    errors.append(f"Mass-hosted site {domain} needs a TCP port, not a Unix socket")
+                    continue
+                port_num = None
+            else:
+                if port is None and first is not None:
+                    port = self.backend_port(first)
+                port_num = self.validate_port(port)
+                if port_num is None:
+                    errors.append(f"Invalid port for {domain}: {entry.get('port')}")
+                    continue
+            if domain in self.sites and self.sites[domain].get('mode', 'vhost') != mode:
+                errors.append(f"Cannot switch {domain} to {mode} mode, delete it first")
+                continue
+            if mode == 'mass' and not os.path.exists(self.mass_config_file):
+                errors.append(f"Mass-hosting mode is not enabled for {domain}")
+                continue
+            options, option_errors = self.normalize_site_options(entry)
+            if option_errors:
+                errors.extend(f"{domain}: {error}" for error in option_errors)
+                continue
+            batch[domain] = {
+                'port': port_num,
+                'ssl': bool(entry.get('ssl', True)) and mode != 'mass',
+                'mode': mode,
+                'options': options
+            }
+        return batch, errors
     
-    # Allow .well-known directory for Let's Encrypt
-    <Directory "/var/www/html/.well-known">
-        AllowOverride None
-        Require all granted
-    </Directory>
+    def apply_batch(self, batch, deletions=()):
+        """
+        Write, delete and activate a validated batch of sites with one reload
+        
+        Args:
+            batch (dict): Validated sites from validate_entries
+            deletions (list): Stored domains to remove in the same reload
+            
+        Returns:
+            bool: True if the batch was applied
+        """
+        configs = {
+            domain: self.render_site_config(
+                domain, {**site, **site['options'], **self.preserved_state(self.sites.get(domain))}
+            )
+            for domain, site in batch.items()
+            if site['mode'] != 'mass'
+        }
+        removed = {domain: self.sites[domain] for domain in deletions if domain in self.sites}
+        removed_configs = [d for d, site in removed.items() if site.get('mode') != 'mass']
+        mass_changed = len(configs) < len(batch) or len(removed_configs) < len(removed)
+        
+        modules = confs = None
+        if configs:
+            modules = []
+            confs = []
+            for site in batch.values():
+                modules += self.site_modules(site['options'])
+                confs += self.site_confs(site['options'])
+            modules, confs = sorted(set(modules)), sorted(set(confs))
+            if any(site['options'].get('tls_profile') for site in batch.values()):
+                self.check_http2_support()
+            self.check_upstream_protocol_support([site['options'] for site in batch.values()])
+            for site in batch.values():
+                self.check_static_mounts(site['options'])
+            for domain, site in batch.items():
+                self.ensure_cache_root(domain, site['options'])
+        
+        if not self.apply_config_batch(configs, removals=removed_configs, modules=modules, confs=confs):
+            print("❌ Batch aborted, no changes were applied")
+            return False
+        
+        now = datetime.now().isoformat()
+        with self.sites.transaction():
+            for domain in removed:
+                del self.sites[domain]
+            for domain, site in batch.items():
+                previous = self.sites.get(domain, {})
+                if site['mode'] == 'mass':
+                    self.sites[domain] = {
+                        'mode': 'mass',
+                        'port': site['port'],
+                        'ssl': False,
+                        'created': previous.get('created', now),
+                        'config_file': self.mass_config_file
+                    }
+                    continue
+                
+                config_path = f"{self.sites_available}/{domain}.conf"
+                self.sites[domain] = {
+                    'port': site['port'],
+                    'ssl': site['ssl'],
+                    'created': previous.get('created', now),
+                    'config_file': config_path,
+                    **site['options'],
+                    **self.preserved_state(previous),
+                    **self.config_state(config_path, configs[domain])
+                }
+        for domain in removed_configs:
+            if os.path.isdir(self.cache_root(domain)):
+                shutil.rmtree(self.cache_root(domain), ignore_errors=True)
+        
+        if mass_changed and not self.build_mass_map():
+            print("⚠️  Warning: Virtual Hosts applied but the mass-hosting map was not updated")
+        
+        if configs or removed_configs:
+            if not removed:
+                summary = f"Applied {len(batch)} sites"
+            elif not batch:
+                summary = f"Removed {len(removed)} sites"
+            else:
+                summary = f"Applied {len(batch)} and removed {len(removed)} sites"
+            print(f"\n✅ {summary} with a single reload")
+        else:
+            print(f"\n✅ Applied {len(batch) + len(removed)} mass-hosted sites (no reload needed)")
+        return True
+    
+    def render_site_config(self, domain, site):
+        """
+        Render the desired configuration for a stored site record
+        
+        Args:
+            domain (str): Domain name of the site
+            site (dict): Site record from the configuration store
+            
+        Returns:
+            str: Rendered configuration content
+        """
+        return self.render_vhost_config(domain, site['port'], site.get('ssl', True), site)
+    
+    def preserved_state(self, record):
+        """
+        Return the fields of a stored record that re-applying the site must keep
+        
+        Certificate fields (``cert_name`` of a shared SAN lineage, expiry
+        index, issuance status) and health samples are owned by ``ssl`` and
+        ``health``, not by the site definition.
+        
+        Args:
+            record (dict): Stored site record, may be empty
+            
+        Returns:
+            dict: Fields to carry over into the new record
+        """
+        return {key: value for key, value in (record or {}).items() if key.startswith('cert_') or key == 'health'}
+    
+    def config_state(self, config_path, content=None):
+        """
+        Compute the content hash and file fingerprint of a configuration file
+        
+        Args:
+            config_path (str): Path to the configuration file
+            content (str): Known file content, read from disk if omitted
+            
+        Returns:
+            dict: config_hash, config_mtime and config_size fields, empty if missing
+        """
+        try:
+            if content is None:
+                with open(config_path, 'r') as f:
+                    content = f.read()
+            stat = os.stat(config_path)
+        except OSError:
+            return {}
+        
+        return {
+            'config_hash': hashlib.sha256(content.encode()).hexdigest(),
+            'config_mtime': stat.st_mtime_ns,
+            'config_size': stat.st_size
+        }
+    
+    def plan_reconcile(self):
+        """
+        Compare desired site configurations against what is on disk
+        
+        Files whose stored hash matches the rendered content and whose
+        size and mtime are unchanged since the last write are skipped
+        without being read.
+        
+        Returns:
+            tuple: (changes, unchanged) where changes maps domain to
+                (action, rendered content, current content) and unchanged
+                maps domain to refreshed config state fields
+        """
+        changes = {}
+        unchanged = {}
+        
+        for domain, site in self.sites.items():
+            if site.get('mode') == 'mass':
+                continue
+            
+            desired = self.render_site_config(domain, site)
+            desired_hash = hashlib.sha256(desired.encode()).hexdigest()
+            config_path = f"{self.sites_available}/{domain}.conf"
+            enabled = self.site_enabled(domain)
+            
+            try:
+                stat = os.stat(config_path)
+            except OSError:
+                changes[domain] = ('create', desired, None)
+                continue
+            
+            if (site.get('config_hash') == desired_hash
+                    and site.get('config_mtime') == stat.st_mtime_ns
+                    and site.get('config_size') == stat.st_size):
+                if not enabled:
+                    changes[domain] = ('enable', desired, desired)
+                continue
+            
+            with open(config_path, 'r') as f:
+                current = f.read()
+            
+            if current != desired:
+                changes[domain] = ('update', desired, current)
+            elif not enabled:
+                changes[domain] = ('enable', desired, current)
+            else:
+                unchanged[domain] = self.config_state(config_path, current)
+        
+        return changes, unchanged
+    
+    def reconcile(self, dry_run=False):
+        """
+        Converge Apache configuration towards the stored site definitions
+        
+        Only files whose rendered content differs are rewritten, and Apache
+        is reloaded only when at least one site changed.
+        
+        Args:
+            dry_run (bool): Print the plan without applying it
+        """
+        if not dry_run:
+            self.check_sudo()
+        
+        changes, unchanged = self.plan_reconcile()
+        
+        # Remember fingerprints of files that matched after a full read
+        if not dry_run and unchanged:
+            with self.sites.transaction():
+                for domain, state in unchanged.items():
+                    if state:
+                        self.sites[domain] = {**self.sites[domain], **state}
+        
+        snippets = self.pending_snippets()
+        
+        # Modules and server-wide configurations the stored sites rely on
+        modules, confs = [], []
+        for site in self.sites.values():
+            if site.get('mode') != 'mass':
+                modules += self.site_modules(site)
+                confs += self.site_confs(site)
+        modules, confs = sorted(set(modules)), sorted(set(confs))
+        missing_modules, missing_confs = self.missing_modules(modules, confs)
+        
+        if not changes and not snippets and not missing_modules and not missing_confs:
+            print(f"✅ {len(self.sites)} sites up to date, nothing to reload")
+            return
+        
+        symbols = {'create': '+', 'update': '~', 'enable': '↑'}
+        print(f"📋 Reconcile plan ({len(changes)} of {len(self.sites)} sites):")
+        for module in missing_modules:
+            print(f"  + enable module {module}")
+        for conf in missing_confs:
+            print(f"  + enable configuration {conf}")
+        for path in snippets:
+            print(f"  ~ update shared snippet {path}")
+        for domain, (action, desired, current) in changes.items():
+            print(f"  {symbols[action]} {action} {domain}")
+            if action == 'update':
+                diff = difflib.unified_diff(
+                    current.splitlines(), desired.splitlines(),
+                    fromfile=f"{domain}.conf (disk)", tofile=f"{domain}.conf (desired)",
+                    lineterm=''
+                )
+                for line in diff:
+                    print(f"      {line}")
+        
+        if dry_run:
+            print("💡 Dry run, no changes applied")
+            return
+        
+        configs = {domain: desired for domain, (_, desired, _) in changes.items()}
+        if not self.apply_config_batch(configs, modules=modules, confs=confs):
+            print("❌ Reconcile aborted, no changes were applied")
+            return
+        
+        with self.sites.transaction():
+            for domain, content in configs.items():
+                config_path = f"{self.sites_available}/{domain}.conf"
+                self.sites[domain] = {
+                    **self.sites[domain],
+                    'config_file': config_path,
+                    **self.config_state(config_path, content)
+                }
+        
+        print(f"✅ Reconciled {len(configs)} sites and {len(snippets)} shared snippets with a single reload")
+        logger.info(f"Reconciled {len(configs)} sites")
+    
+    def list_sites(self):
+        """List all configured sites"""
+        if not self.sites:
+            print("📝 No sites configured")
+            return
+        
+        print("📋 Configured Sites:")
+        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
+        for domain, config in self.sites.items():
+            ssl_status = "🔒 HTTPS" if config.get('ssl', False) else "🔓 HTTP"
+            if config.get('mode') == 'mass':
+                ssl_status += " (mass-hosted)"
+            created_date = datetime.fromisoformat(config['created']).strftime('%Y-%m-%d %H:%M')
+            
+            print(f"🌐 {domain} - {ssl_status}")
+            if config.get('port') is not None:
+                print(f"   Port: {config['port']}")
+            if config.get('backends'):
+                members = ", ".join(
+                    b['url'] + (" (standby)" if b.get('standby') else "") for b in config['backends']
+                )
+                lbmethod = f" ({config['lbmethod']})" if config.get('lbmethod') else ""
+                print(f"   Backends{lbmethod}: {members}")
+            if config.get('protocol'):
+                print(f"   Protocol: {config['protocol']}")
+            if config.get('pool'):
+                print(f"   Pool: {self.describe_pool(config['pool'])}")
+            if config.get('ssl') and config.get('mode') != 'mass':
+                print(f"   TLS profile: {config.get('tls_profile', 'default')}")
+            if config.get('cache'):
+                print(f"   Cache: {self.describe_cache(config['cache'])}")
+            if config.get('static'):
+                print(f"   Static: {self.describe_static(config['static'])}")
+            if config.get('compression'):
+                print(f"   Compression: {self.describe_compression(config['compression'])}")
+            if config.get('log_profile'):
+                print(f"   Logging: {config['log_profile']}")
+            health = [h for h in config.get('health', {}).values() if h.get('checked_at')]
+            if health:
+                up = sum(1 for h in health if h['ok'])
+                p95 = self.latency_percentiles([ms for h in health for ms in h.get('samples', [])])['p95']
+                icon = "✅" if up == len(health) else "❌"
+                latency = f", p95 {p95:.1f} ms" if p95 is not None else ""
+                print(f"   {icon} Health: {up}/{len(health)} backends up{latency}")
+            if config.get('cert_expiry'):
+                days = self.days_to_expiry(config['cert_expiry'])
+                icon = "⚠️ " if days < self.RENEWAL_WINDOW_DAYS else "📅"
+                print(f"   {icon} Certificate: expires {config['cert_expiry'][:10]} ({days} days)")
+            print(f"   Created: {created_date}")
+            print(f"   Config: {config['config_file']}")
+            print()
+    
+    def renew_certificate(self, cert_name, force=False):
+        """
+        Renew one certificate lineage with certbot
+        
+        Args:
+            cert_name (str): Certbot lineage name
+            force (bool): Renew even if certbot considers it not due yet
+            
+        Returns:
+            dict: Renewal result with status, the new certificate state and seconds
+        """
+        command = f"certbot renew --cert-name {cert_name} --non-interactive --quiet"
+        if force:
+            command += " --force-renewal"
+        
+        # Certbot holds an exclusive lock on its configuration directory
+        with self._certbot_lock:
+            started = time.monotonic()
+            success = self.run_command(command)
+            seconds = round(time.monotonic() - started, 2)
+        
+        cert_path = f"{self.letsencrypt_dir}/live/{cert_name}/cert.pem"
+        return {
+            'status': 'renewed' if success else 'failed',
+            'certificate': self.read_certificate(cert_path) if success else None,
+            'seconds': seconds
+        }
+    
+    def renew_ssl_certificates(self, window_days=None, workers=4, force=False, dry_run=False):
+        """
+        Renew the certificates expiring within a window
+        
+        Expiry dates come from the certificate index in the site store, so
+        certificates outside the window are never handed to certbot. Apache
+        is reloaded only if at least one certificate actually changed.
+        
+        Args:
+            window_days (int): Renew certificates expiring within this many
+                days, RENEWAL_WINDOW_DAYS if omitted
+            workers (int): Number of concurrent renewals
+            force (bool): Renew every indexed certificate regardless of expiry
+            dry_run (bool): Print the certificates due without renewing
+        """
+        if not dry_run:
+            self.check_sudo()
+        
+        window_days = self.RENEWAL_WINDOW_DAYS if window_days is None else window_days
+        lineages = self.refresh_certificate_index()
+        deadline = datetime.now(timezone.utc) + timedelta(days=window_days)
+        
+        if force:
+            due = {name: lineage for name, lineage in lineages.items() if lineage['cert_expiry']}
+        else:
+            due_domains = {domain for domain, _ in self.sites.expiring_before(deadline.isoformat())}
+            due = {name: lineage for name, lineage in lineages.items()
+                   if due_domains.intersection(lineage['domains'])}
+        
+        missing = [name for name, lineage in lineages.items() if not lineage['cert_expiry']]
+        if missing:
+            print(f"⚠️  No certificate found for: {', '.join(missing)} (run ssl issue)")
+        
+        if not due:
+            print(f"✅ No certificates expire within {window_days} days "
+                  f"({len(lineages) - len(missing)} checked)")
+            logger.info(f"No certificates due for renewal within {window_days} days")
+            return
+        
+        print(f"🔄 {len(due)} certificates due for renewal:")
+        for name, lineage in sorted(due.items(), key=lambda item: item[1]['cert_expiry']):
+            days = self.days_to_expiry(lineage['cert_expiry'])
+            print(f"   • {name}: expires {lineage['cert_expiry'][:10]} ({days} days)")
+        
+        if dry_run:
+            print("💡 Dry run, no certificates renewed")
+            return
+        
+        if not self.certbot_available():
+            print("❌ Certbot not found. Run setup_ssl.sh first")
+            return
+        
+        changed = []
+        failed = []
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            # Renewing inside our own window means certbot must not apply its own
+            futures = {pool.submit(self.renew_certificate, name, True): name for name in due}
+            for future in as_completed(futures):
+                name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Renewal of {name} crashed: {e}")
+                    result = {'status': 'failed', 'certificate': None}
+                
+                certificate = result['certificate']
+                if result['status'] == 'failed':
+                    failed.append(name)
+                    print(f"❌ {name}: renewal failed, see /var/log/letsencrypt/letsencrypt.log")
+                elif certificate and certificate['cert_fingerprint'] != due[name]['cert_fingerprint']:
+                    changed.append(name)
+                    print(f"✅ {name}: renewed, now expires {certificate['cert_expiry'][:10]}")
+                else:
+                    print(f"ℹ️  {name}: certificate unchanged")
+        
+        self.refresh_certificate_index()
+        print(f"\n🔒 Renewed {len(changed)}/{len(due)} certificates in {time.monotonic() - started:.1f}s")
+        
+        if changed:
+            if self.run_command("apache2ctl configtest") and self.run_command("systemctl reload apache2"):
+                print("✅ Apache reloaded with the renewed certificates")
+            else:
+                print("❌ Failed to reload Apache, renewed certificates are not served yet")
+                logger.error("Apache reload after certificate renewal failed")
+        else:
+            print("ℹ️  No certificate changed, Apache not reloaded")
+        
+        logger.info(f"Certificate renewal: {len(changed)} renewed, {len(failed)} failed, "
+                    f"{len(due) - len(changed) - len(failed)} unchanged")
+    
+    def host_memory_mb(self):
+        """Return the total RAM of the host in MB, None if unknown"""
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemTotal:"):
+                        return int(line.split()[1]) // 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return None
+    
+    def observed_concurrency(self):
+        """
+        Estimate the average number of requests in flight from log statistics
+        
+        Uses Little's law (arrival rate x mean duration) per site, with the
+        upper bound of each latency bucket as the duration.
+        
+        Returns:
+            float: Average concurrent requests, None without latency data
+        """
+        total = None
+        for domain in self.sites:
+            stats = self.sites.get_log_stats(domain)
+            if not stats or stats.get('first_seen') is None or stats.get('last_seen') is None:
+                continue
+            counts = stats.get('latency') or []
+            timed = sum(counts)
+            span = stats['last_seen'] - stats['first_seen']
+            if not timed or span <= 0:
+                continue
+            bounds = list(self.LATENCY_BUCKETS_MS) + [self.LATENCY_BUCKETS_MS[-1] * 2]
+            mean_ms = sum(count * bound for count, bound in zip(counts, bounds)) / timed
+            total = (total or 0) + stats['requests'] / span * mean_ms / 1000
+        return total
+    
+    def plan_mpm(self):
+        """
+        Size mpm_event from host resources and the site inventory
+        
+        Returns:
+            tuple: (settings dict in directive order, reasoning lines, warnings)
+        """
+        cpus = os.cpu_count() or 1
+        ram_mb = self.host_memory_mb()
+        sites = {d: s for d, s in self.sites.items() if s.get('mode') != 'mass'}
+        threads = self.MPM_THREADS_PER_CHILD
+        reasons = [f"Host: {cpus} CPUs, {f'{ram_mb} MB' if ram_mb else 'unknown'} RAM, "
+                   f"{len(sites)} proxied sites"]
+        warnings = []
+        
+        target = cpus * self.MPM_THREADS_PER_CPU
+        reasons.append(f"CPU baseline: {cpus} x {self.MPM_THREADS_PER_CPU} threads = {target} "
+                       f"(proxy threads mostly wait on backends)")
+        
+        pools = {d: s['pool']['max'] for d, s in sites.items() if (s.get('pool') or {}).get('max')}
+        pool_total = sum(pools.values())
+        if pools:
+            reasons.append(f"Backend pools: {len(pools)} sites allow up to {pool_total} connections")
+            target = max(target, pool_total)
+        
+        observed = self.observed_concurrency()
+        if observed is not None:
+            peak = math.ceil(observed * self.MPM_PEAK_FACTOR)
+            reasons.append(f"Logs: {observed:.1f} requests in flight on average, "
+                           f"x{self.MPM_PEAK_FACTOR} for peaks = {peak}")
+            target = max(target, peak)
+        else:
+            reasons.append("Logs: no latency statistics (use --log-profile latency and run stats)")
+        
+        processes = max(2, math.ceil(target / threads))
+        if ram_mb:
+            memory_cap = max(2, int(ram_mb * self.MPM_MEMORY_SHARE // self.MPM_PROCESS_MB))
+            reasons.append(f"Memory: {self.MPM_MEMORY_SHARE:.0%} of RAM at ~{self.MPM_PROCESS_MB} MB per "
+                           f"process allows {memory_cap} processes")
+            if processes > memory_cap:
+                reasons.append(f"Capped at {memory_cap} processes instead of {processes}")
+                processes = memory_cap
+        max_workers = processes * threads
+        reasons.append(f"Result: {processes} processes x {threads} threads = {max_workers} workers")
+        
+        websockets = any(s.get('protocol') == 'ws' for s in sites.values())
+        if websockets:
+            reasons.append("WebSocket sites hold idle connections: AsyncRequestWorkerFactor 4")
+        
+        if pool_total > max_workers:
+            warnings.append(f"Backend pools allow {pool_total} connections but Apache has only "
+                            f"{max_workers} workers: lower pool max values or add memory")
+        for domain, pool_max in sorted(pools.items()):
+            if pool_max > threads:
+                warnings.append(f"{domain}: pool max {pool_max} exceeds ThreadsPerChild ({threads}); "
+                                f"mod_proxy pools are per process, the excess is never used")
+        if not self.module_enabled('mpm_event'):
+            warnings.append("mpm_event is not enabled (sudo a2dismod mpm_prefork mpm_worker && sudo a2enmod mpm_event)")
+        
+        settings = {
+            'StartServers': min(processes, max(2, cpus // 2)),
+            'ServerLimit': processes,
+            'ThreadLimit': threads,
+            'ThreadsPerChild': threads,
+            'MinSpareThreads': threads,
+            'MaxSpareThreads': max(threads * 2, max_workers // 4),
+            'MaxRequestWorkers': max_workers,
+            'AsyncRequestWorkerFactor': 4 if websockets else 2,
+            'MaxConnectionsPerChild': 0
+        }
+        return settings, reasons, warnings
+    
+    def render_mpm_config(self, settings, reasons):
+        """Render mpm_event.conf from planned settings"""
+        lines = "\n".join(f"    {name:<26}{value}" for name, value in settings.items())
+        notes = "\n".join(f"# {reason}" for reason in reasons)
+        return f"""# Managed by vhost_manager.py tune
+{notes}
+<IfModule mpm_event_module>
+{lines}
+</IfModule>
+"""
+    
+    def configured_max_workers(self):
+        """
+        Return MaxRequestWorkers from the mpm_event configuration
+        
+        Returns:
+            int: Configured worker limit, None if the file does not set it
+        """
+        match = re.search(r'^\s*MaxRequestWorkers\s+(\d+)', self.read_file(self.mpm_config_file) or "", re.MULTILINE)
+        return int(match.group(1)) if match else None
+    
+    def tune(self, apply=False):
+        """
+        Show (and optionally apply) mpm_event sizing for this host
+        
+        Args:
+            apply (bool): Write the configuration and reload Apache
+        """
+        settings, reasons, warnings = self.plan_mpm()
+        print("🧮 mpm_event sizing:")
+        for reason in reasons:
+            print(f"   • {reason}")
+        for warning in warnings:
+            print(f"⚠️  {warning}")
+        
+        desired = self.render_mpm_config(settings, reasons)
+        current = self.read_file(self.mpm_config_file)
+        if current == desired:
+            print(f"✅ {self.mpm_config_file} is up to date")
+            return
+        
+        print()
+        for line in difflib.unified_diff(
+            (current or "").splitlines(), desired.splitlines(),
+            fromfile=f"{self.mpm_config_file} (current)", tofile=f"{self.mpm_config_file} (proposed)", lineterm=''
+        ):
+            print(f"   {line}")
+        
+        if not apply:
+            print("\n💡 Dry run, apply with: sudo python3 vhost_manager.py tune --apply")
+            return
+        
+        self.check_sudo()
+        try:
+            with open(self.mpm_config_file, 'w') as f:
+                f.write(desired)
+        except OSError as e:
+            print(f"❌ Failed to write {self.mpm_config_file}: {e}")
+            return
+        
+        if not self.run_command("apache2ctl configtest"):
+            print("❌ Invalid Apache configuration, restoring the previous MPM settings")
+            self.run_command("apache2ctl configtest", show_output=True)
+            with open(self.mpm_config_file, 'w') as f:
+                f.write(current or "")
+            return
+        
+        logger.info(f"Tuned mpm_event: {settings['MaxRequestWorkers']} workers")
+        print(f"✅ Wrote {self.mpm_config_file}")
+        # ServerLimit and ThreadLimit are only read at startup
+        print("💡 Restart Apache to apply the new limits: sudo systemctl restart apache2")
+    
+    def enable_metrics(self):
+        """
+        Enable the loopback-only mod_status endpoint used by ``metrics``
+        
+        Returns:
+            bool: True if the endpoint is active
+        """
+        self.check_sudo()
+        if self.ensure_shared_snippets() is None:
+            return False
+        self.enable_modules(['status'], ['vhost-manager-status'])
+        if not self.run_command("apache2ctl configtest"):
+            print("❌ Invalid Apache configuration, disabling the status endpoint")
+            self.run_command("apache2ctl configtest", show_output=True)
+            self.run_command(["a2disconf", "-q", "vhost-manager-status"])
+            return False
+        if not self.run_command("systemctl reload apache2"):
+            print("❌ Failed to reload Apache")
+            return False
+        print(f"✅ mod_status enabled on http://127.0.0.1:{self.STATUS_PORT}/server-status (local only)")
+        return True
+    
+    def parse_status_auto(self, text):
+        """
+        Parse the machine-readable ``server-status?auto`` page
+        
+        Args:
+            text (str): Response body
+            
+        Returns:
+            dict: Field name -> value (numbers converted, Scoreboard kept as text)
+        """
+        status = {}
+        for line in text.splitlines():
+            key, sep, value = line.partition(':')
+            if not sep:
+                continue
+            value = value.strip()
+            try:
+                status[key.strip()] = float(value) if key != 'Scoreboard' else value
+            except ValueError:
+                status[key.strip()] = value
+        return status
+    
+    def parse_status_table(self, html):
+        """
+        Count busy workers per virtual host from the ExtendedStatus table
+        
+        Args:
+            html (str): ``server-status`` HTML page
+            
+        Returns:
+            dict: Virtual host -> workers currently serving one of its requests
+        """
+        busy = {}
+        columns = None
+        for row in re.split(r'<tr>', html, flags=re.IGNORECASE)[1:]:
+            headers = re.findall(r'<th>(.*?)</th>', row, flags=re.IGNORECASE | re.DOTALL)
+            if headers:
+                columns = [re.sub(r'<[^>]+>', '', h).strip() for h in headers]
+                continue
+            if not columns or 'VHost' not in columns or 'M' not in columns:
+                continue
+            cells = [re.sub(r'<[^>]+>', '', c).strip()
+                     for c in re.findall(r'<td[^>]*>(.*?)</td>', row, flags=re.IGNORECASE | re.DOTALL)]
+            if len(cells) < len(columns):
+                continue
+            mode, vhost = cells[columns.index('M')], cells[columns.index('VHost')]
+            if mode in ('R', 'W', 'D', 'L') and vhost:
+                vhost = vhost.split(':')[0].lower()
+                busy[vhost] = busy.get(vhost, 0) + 1
+        return busy
     
-    # Logging
-    ErrorLog ${{APACHE_LOG_DIR}}/{domain}-error.log
-    CustomLog ${{APACHE_LOG_DIR}}/{domain}-access.log combined
-</VirtualHost>"""
+    def scrape_status(self):
+        """
+        Fetch mod_status, machine-readable counters and the per-vhost table
         
-        temp_config_path = f"/etc/apache2/sites-available/{domain}-temp.conf"
+        Returns:
+            tuple: (auto fields dict, busy workers per vhost), None if unreachable
+        """
+        base = f"http://127.0.0.1:{self.STATUS_PORT}/server-status"
         try:
-            with open(temp_config_path, 'w') as f:
-                f.write(temp_config)
-            
-            # Disable existing site and enable temporary one
-            self.run_command(f"a2dissite {domain}.conf", show_output=False)
-            self.run_command(f"a2ensite {domain}-temp.conf")
-            self.run_command("systemctl reload apache2")
-            
-        except Exception as e:
-            print(f"❌ Failed to create temporary configuration: {e}")
-            return False
+            auto = requests.get(f"{base}?auto", timeout=5)
+            table = requests.get(base, timeout=5)
+            auto.raise_for_status()
+            table.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"mod_status unreachable: {e}")
+            return None
+        return self.parse_status_auto(auto.text), self.parse_status_table(table.text)
+    
+    def render_metrics(self):
+        """
+        Render Apache, per-domain and backend health metrics in Prometheus text format
         
-        # Get SSL certificate
-        certbot_cmd = f"certbot --apache -d {domain} -d www.{domain} --non-interactive --agree-tos"
+        Returns:
+            str: Exposition text
+        """
+        out = []
         
-        # Handle email configuration
-        email_file = "/etc/letsencrypt/.email"
-        if not os.path.exists(email_file):
-            email = input("📧 Enter your email for Let's Encrypt notifications: ")
-            certbot_cmd += f" --email {email}"
-            # Save email for future use
-            os.makedirs(os.path.dirname(email_file), exist_ok=True)
-            with open(email_file, 'w') as f:
-                f.write(email)
-        else:
-            with open(email_file, 'r') as f:
-                email = f.read().strip()
-            certbot_cmd += f" --email {email}"
+        def metric(name, kind, help_text, samples):
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                escaped = {k: str(v).replace('\\', '\\\\').replace('"', '\\"') for k, v in labels.items()}
+                rendered = ",".join(f'{key}="{val}"' for key, val in escaped.items())
+                out.append(f"{name}{{{rendered}}} {value}" if rendered else f"{name} {value}")
         
-        # Run certbot
-        success = self.run_command(certbot_cmd, show_output=True)
+        scraped = self.scrape_status()
+        metric('apache_up', 'gauge', "Whether mod_status answered", [({}, 1 if scraped else 0)])
+        if scraped:
+            status, busy_by_vhost = scraped
+            scoreboard = status.get('Scoreboard', '')
+            busy, idle = status.get('BusyWorkers', 0), status.get('IdleWorkers', 0)
+            capacity = len(scoreboard) - scoreboard.count('.') if scoreboard else busy + idle
+            metric('apache_accesses_total', 'counter', "Requests served since start",
+                   [({}, int(status.get('Total Accesses', 0)))])
+            metric('apache_sent_bytes_total', 'counter', "Bytes sent since start",
+                   [({}, int(status.get('Total kBytes', 0)) * 1024)])
+            metric('apache_uptime_seconds', 'counter', "Server uptime", [({}, int(status.get('Uptime', 0)))])
+            metric('apache_workers', 'gauge', "Busy and idle workers",
+                   [({'state': 'busy'}, int(busy)), ({'state': 'idle'}, int(idle))])
+            metric('apache_worker_capacity', 'gauge', "Worker slots of the running processes",
+                   [({}, capacity)])
+            # The scoreboard spans ServerLimit x ThreadsPerChild, usually more than MaxRequestWorkers
+            configured = self.configured_max_workers()
+            if configured:
+                metric('apache_max_request_workers', 'gauge', "Configured MaxRequestWorkers",
+                       [({}, configured)])
+            max_workers = configured or len(scoreboard)
+            metric('apache_worker_saturation', 'gauge', "Busy workers over MaxRequestWorkers",
+                   [({}, round(busy / max_workers, 4) if max_workers else 0)])
+            metric('apache_connections', 'gauge', "Connections by async state", [
+                ({'state': state}, int(status[key])) for state, key in (
+                    ('total', 'ConnsTotal'), ('writing', 'ConnsAsyncWriting'),
+                    ('keepalive', 'ConnsAsyncKeepAlive'), ('closing', 'ConnsAsyncClosing')
+                ) if key in status
+            ])
+            metric('apache_scoreboard', 'gauge', "Worker slots by scoreboard state", [
+                ({'state': state}, scoreboard.count(char)) for char, state in self.SCOREBOARD_STATES.items()
+            ])
+            metric('vhost_manager_busy_workers', 'gauge', "Workers serving a request of the domain",
+                   [({'domain': vhost}, count) for vhost, count in sorted(busy_by_vhost.items())])
         
-        # Clean up temporary configuration
-        self.run_command(f"a2dissite {domain}-temp.conf", show_output=False)
-        if os.path.exists(temp_config_path):
-            os.remove(temp_config_path)
+        try:
+            stats = self.collect_log_stats()
+        except OSError as e:
+            logger.warning(f"Access logs unreadable, skipping per-domain counters: {e}")
+            stats = {}
+        metric('vhost_manager_requests_total', 'counter', "Requests logged per domain (rate() gives req/s)",
+               [({'domain': d}, e['requests']) for d, e in sorted(stats.items())])
+        metric('vhost_manager_sent_bytes_total', 'counter', "Response bytes logged per domain",
+               [({'domain': d}, e['bytes']) for d, e in sorted(stats.items())])
         
-        if success:
-            print("✅ SSL certificate installed successfully!")
-            print("🔄 Automatic renewal is configured")
-            logger.info(f"SSL certificate installed for {domain}")
-            return True
-        else:
-            print("❌ Failed to install SSL certificate")
-            print("💡 Make sure your DNS points to this server and port 80/443 are accessible")
-            print("💡 Verify that your domain actually resolves to this server's IP address")
-            logger.error(f"SSL certificate installation failed for {domain}")
-            return False
+        up, latency, failures = [], [], []
+        for domain, site in self.sites.items():
+            for backend, health in sorted(site.get('health', {}).items()):
+                labels = {'domain': domain, 'backend': backend}
+                up.append((labels, 1 if health.get('ok') else 0))
+                failures.append((labels, health.get('failures', 0)))
+                percentiles = self.latency_percentiles(health.get('samples', []))
+                for quantile, key in (('0.5', 'p50'), ('0.95', 'p95'), ('0.99', 'p99')):
+                    if percentiles[key] is not None:
+                        latency.append(({**labels, 'quantile': quantile}, percentiles[key] / 1000))
+        metric('vhost_manager_backend_up', 'gauge', "Result of the last health probe", up)
+        metric('vhost_manager_backend_latency_seconds', 'gauge', "Health probe latency over the sample window", latency)
+        metric('vhost_manager_backend_consecutive_failures', 'gauge', "Failed health probes in a row", failures)
+        return "\n".join(out) + "\n"
     
-    def create_site(self, domain, port, ssl=True):
+    def serve_metrics(self, listen):
         """
-        Create a new Virtual Host
+        Expose ``/metrics`` over HTTP for Prometheus
         
         Args:
-            domain (str): Domain name
-            port (int): Local port to proxy to
-            ssl (bool): Whether to install SSL certificate
+            listen (str): ``host:port`` to bind, e.g. ``127.0.0.1:9117``
+        """
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+        host, _, port = listen.rpartition(':')
+        manager = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = manager.render_metrics().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                logger.debug(f"metrics: {format % args}")
+        
+        # Single-threaded on purpose: scrapes update the log offsets in the site store
+        server = HTTPServer((host or '127.0.0.1', int(port)), MetricsHandler)
+        print(f"📈 Serving metrics on http://{host or '127.0.0.1'}:{port}/metrics (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+    
+    def serve(self, socket_path=None, debounce=None):
+        """
+        Run the manager daemon
+        
+        The daemon keeps the site store open and accepts JSON requests on a
+        Unix socket. Each request is validated and linted on arrival, then
+        changes arriving within the debounce window are applied together
+        with one configtest and one graceful reload.
+        
+        Args:
+            socket_path (str): Socket to listen on
+            debounce (float): Seconds without new changes before applying them
         """
         self.check_sudo()
+        socket_path = socket_path or self.daemon_socket
+        debounce = self.DAEMON_DEBOUNCE if debounce is None else debounce
         
-        # Validate inputs
-        if not self.validate_domain(domain):
-            print(f"❌ Invalid domain name: {domain}")
+        if daemon_request({'action': 'status'}, socket_path, timeout=5) is not None:
+            print(f"❌ A daemon is already listening on {socket_path}")
             return
         
-        port_num = self.validate_port(port)
-        if port_num is None:
-            return
+        print(f"🛰️  Serving on {socket_path} (debounce {debounce}s, Ctrl+C to stop)")
+        logger.info(f"Daemon started on {socket_path} with {len(self.sites)} sites")
+        asyncio.run(self.serve_async(socket_path, debounce))
+        logger.info("Daemon stopped")
+    
+    async def serve_async(self, socket_path, debounce):
+        """Listen for requests until SIGINT or SIGTERM, then apply what is pending"""
+        loop = asyncio.get_running_loop()
+        self._debounce = debounce
+        self._pending = {}  # domain -> validated site, None for a deletion
+        self._pending_configs = {}  # domain -> rendered configuration of a pending site
+        self._owners = {}  # domain -> waiter of the last request that changed it
+        self._waiters = []  # (waiter, domains) of every queued request
+        self._first_change = None
+        self._flush_timer = None
+        self._flush_lock = asyncio.Lock()
         
-        # Check if site already exists
-        if domain in self.sites:
-            response = input(f"⚠️  Site {domain} already exists. Replace it? (y/n): ")
-            if response.lower() != 'y':
-                return
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Stale socket of a daemon that did not exit cleanly
+        server = await asyncio.start_unix_server(self.handle_request, path=socket_path)
+        os.chmod(socket_path, 0o660)
         
-        # Warn if port is not responding
-        if not self.check_port_available(port_num):
-            print(f"💡 Service appears to be running on port {port_num}")
-        else:
-            print(f"⚠️  Warning: No service detected on port {port_num}")
-            response = input("Continue anyway? (y/n): ")
-            if response.lower() != 'y':
-                return
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        try:
+            async with server:
+                await stop.wait()
+            await self.flush_pending()
+        finally:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+    
+    async def handle_request(self, reader, writer):
+        """Answer one newline-terminated JSON request on a client connection"""
+        try:
+            request = json.loads(await reader.readline())
+            if not isinstance(request, dict):
+                raise ValueError("request must be a JSON object")
+            response = await self.dispatch_request(request)
+        except ValueError as e:
+            response = {'ok': False, 'errors': [f"Invalid request: {e}"]}
+        except Exception as e:
+            logger.error(f"Daemon request failed: {e}")
+            response = {'ok': False, 'errors': [str(e)]}
+        try:
+            writer.write(json.dumps(response).encode() + b'\n')
+            await writer.drain()
+        except ConnectionError:
+            pass  # Client went away, the change is still applied
+        finally:
+            writer.close()
+    
+    async def dispatch_request(self, request):
+        """
+        Validate a daemon request and queue its changes
         
-        print(f"🚀 Creating Virtual Host for {domain} on port {port_num}...")
+        Args:
+            request (dict): ``action`` (status, list, metrics, create, update,
+                apply, delete or flush) plus ``entries`` (manifest form), ``manifest``
+                (path) or ``domains``
+            
+        Returns:
+            dict: Response with ``ok`` and, for changes, the result of the
+            batch that applied them
+        """
+        action = request.get('action')
         
-        # Create configuration file
-        config_path = self.create_vhost_config(domain, port_num, ssl)
-        if not config_path:
-            return
+        if action == 'status':
+            return {'ok': True, 'sites': len(self.sites), 'pending': len(self._pending),
+                    'debounce': self._debounce}
         
-        # Enable required modules
-        self.enable_modules()
+        if action == 'list':
+            return {'ok': True, 'sites': {
+                domain: {k: v for k, v in site.items() if k != 'health'}
+                for domain, site in self.sites.items()
+            }}
         
-        # Enable the site
-        if not self.run_command(f"a2ensite {domain}"):
-            print(f"❌ Failed to enable site {domain}")
-            return
+        if action == 'flush':
+            return await self.queue_change(delay=0)
         
-        # Test Apache configuration
-        if not self.run_command("apache2ctl configtest"):
-            print("❌ Invalid Apache configuration")
-            self.run_command("apache2ctl configtest", show_output=True)
-            return
+        if action == 'metrics':
+            # Reading the logs updates offsets and statistics in the store, never alongside a batch
+            async with self._flush_lock:
+                text = await asyncio.get_running_loop().run_in_executor(None, self.render_metrics)
+            return {'ok': True, 'metrics': text}
         
-        # Reload Apache
-        if self.run_command("systemctl reload apache2"):
-            print("✅ Basic configuration created!")
-            
-            # Install SSL certificate if requested
-            ssl_success = True
-            if ssl:
-                response = input("🔒 Install SSL certificate with Let's Encrypt? (y/n): ")
-                if response.lower() == 'y':
-                    ssl_success = self.install_ssl_certificate(domain)
-                    
-                    # If SSL was successful, recreate the virtual host with proper SSL configuration
-                    if ssl_success:
-                        print("🔧 Updating virtual host configuration with SSL...")
-                        # Disable current site
-                        self.run_command(f"a2dissite {domain}.conf", show_output=False)
-                        
-                        # Recreate config with SSL enabled
-                        new_config_path = self.create_vhost_config(domain, port_num, True)
-                        if new_config_path:
-                            # Enable the updated site
-                            self.run_command(f"a2ensite {domain}")
-                            self.run_command("systemctl reload apache2")
-                            print("✅ SSL configuration updated!")
-                        else:
-                            print("⚠️  Warning: Failed to update SSL configuration")
-                else:
-                    ssl = False
-            # Save configuration
-            self.sites[domain] = {
-                'port': port_num,
-                'ssl': ssl and ssl_success,
-                'created': datetime.now().isoformat(),
-                'config_file': config_path
+        def exists(domain):
+            if domain in self._pending:
+                return self._pending[domain] is not None
+            return domain in self.sites
+        
+        if action == 'delete':
+            domains = [str(d).strip().lower() for d in request.get('domains') or []]
+            missing = [d for d in domains if not exists(d)]
+            if not domains or missing:
+                return {'ok': False, 'errors': [f"Site {d} does not exist" for d in missing] or ["No domains given"]}
+            for domain in domains:
+                self._pending[domain] = None
+                self._pending_configs.pop(domain, None)
+            return await self.queue_change(domains)
+        
+        if action in ('create', 'update', 'apply'):
+            entries = request.get('entries')
+            if request.get('manifest'):
+                entries = self.load_manifest(request['manifest'])
+                if entries is None:
+                    return {'ok': False, 'errors': [f"Cannot load manifest {request['manifest']}"]}
+            if not isinstance(entries, list) or not entries:
+                return {'ok': False, 'errors': ["No site entries given"]}
+            batch, errors = self.validate_entries(entries)
+            if action == 'create':
+                errors += [f"Site {d} already exists" for d in batch if exists(d)]
+            elif action == 'update':
+                errors += [f"Site {d} does not exist" for d in batch if not exists(d)]
+            if errors:
+                return {'ok': False, 'errors': errors,
+                        'exists': action == 'create' and any(exists(d) for d in batch)}
+            configs = {
+                domain: self.render_site_config(
+                    domain, {**site, **site['options'], **self.preserved_state(self.sites.get(domain))}
+                )
+                for domain, site in batch.items()
+                if site['mode'] != 'mass'
             }
-            self.save_config()
-            
-            print("\n✅ Virtual Host created successfully!")
-            print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-            print(f"📍 Domain: {domain}")
-            print(f"🔌 Port: {port_num}")
-            if ssl and ssl_success:
-                print(f"🔒 HTTPS: Enabled (automatic redirect)")
-                print(f"🌐 URL: https://{domain}")
-            else:
-                print(f"🌐 URL: http://{domain}")
-            print(f"📁 Config: {config_path}")
-            print(f"📝 Logs: /var/log/apache2/{domain}-*.log")
-            print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-        else:
-            print("❌ Failed to reload Apache")
+            errors = self.pending_lint_errors(configs)
+            if errors:
+                return {'ok': False, 'errors': errors}
+            for domain, site in batch.items():
+                self._pending[domain] = site
+                self._pending_configs.pop(domain, None)
+            self._pending_configs.update(configs)
+            return await self.queue_change(batch)
+        
+        return {'ok': False, 'errors': [f"Unknown action: {action}"]}
     
-    def delete_site(self, domain):
+    def pending_lint_errors(self, configs):
         """
-        Delete a Virtual Host
+        Lint the configurations of one request against the enabled sites and the queued changes
         
         Args:
-            domain (str): Domain name to delete
+            configs (dict): Domain to rendered configuration of the request
+            
+        Returns:
+            list: Error messages involving the request's own files
         """
-        self.check_sudo()
-        
-        if domain not in self.sites:
-            print(f"❌ Site {domain} does not exist in configuration")
-            return
+        files = {f"{self.sites_available}/{domain}.conf" for domain in configs}
+        removals = [domain for domain, site in self._pending.items() if site is None and domain not in configs]
+        issues = self.lint({**self._pending_configs, **configs}, removals, self.pending_snippets())
+        return [
+            issue['message'] for issue in issues
+            if issue['level'] == 'error' and files.intersection(issue['files'])
+        ]
+    
+    async def queue_change(self, domains=(), delay=None):
+        """
+        Schedule the pending changes and wait for the batch that applies them
         
-        print(f"🗑️  Deleting Virtual Host {domain}...")
+        Every change restarts the debounce timer, but no change waits longer
+        than DAEMON_MAX_DELAY.
         
-        # Disable the site 
-        self.run_command(f"a2dissite {domain}.conf")
+        Args:
+            domains (list): Domains changed by the request
+            delay (float): Seconds before applying, the debounce window if omitted
+            
+        Returns:
+            dict: Result of the request's changes
+        """
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._first_change is None:
+            self._first_change = now
+        delay = self._debounce if delay is None else delay
+        delay = min(delay, max(0, self._first_change + self.DAEMON_MAX_DELAY - now))
         
-        # Remove configuration file
-        config_file = self.sites[domain]['config_file']
-        if os.path.exists(config_file):
-            os.remove(config_file)
-            logger.info(f"Removed configuration file: {config_file}")
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._flush_timer = loop.call_later(delay, lambda: asyncio.ensure_future(self.flush_pending()))
         
-        # Reload Apache
-        if self.run_command("systemctl reload apache2"):
-            del self.sites[domain]
-            self.save_config()
-            print(f"✅ Site {domain} deleted successfully")
-            logger.info(f"Deleted Virtual Host: {domain}")
-        else:
-            print("❌ Failed to reload Apache")
+        waiter = loop.create_future()
+        self._waiters.append((waiter, list(domains)))
+        for domain in domains:
+            self._owners[domain] = waiter
+        return await waiter
     
-    def list_sites(self):
-        """List all configured sites"""
-        if not self.sites:
-            print("📝 No sites configured")
-            return
+    async def run_pending_batch(self, changes):
+        """
+        Apply pending changes in an executor thread
         
-        print("📋 Configured Sites:")
-        print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-        for domain, config in self.sites.items():
-            ssl_status = "🔒 HTTPS" if config.get('ssl', False) else "🔓 HTTP"
-            created_date = datetime.fromisoformat(config['created']).strftime('%Y-%m-%d %H:%M')
+        Args:
+            changes (dict): Domain -> validated site, None for a deletion
             
-            print(f"🌐 {domain} - {ssl_status}")
-            print(f"   Port: {config['port']}")
-            print(f"   Created: {created_date}")
-            print(f"   Config: {config['config_file']}")
-            print()
+        Returns:
+            dict: ``ok`` and ``seconds`` of the batch
+        """
+        batch = {domain: site for domain, site in changes.items() if site is not None}
+        deletions = [domain for domain, site in changes.items() if site is None]
+        started = time.monotonic()
+        # apply_batch blocks on subprocesses, keep accepting requests meanwhile
+        ok = await asyncio.get_running_loop().run_in_executor(None, self.apply_batch, batch, deletions)
+        logger.info(f"Daemon applied {len(batch)} sites and {len(deletions)} deletions "
+                    f"with one reload ({'ok' if ok else 'failed'})")
+        return {'ok': ok, 'seconds': round(time.monotonic() - started, 2)}
     
-    def renew_ssl_certificates(self):
-        """Renew all SSL certificates"""
-        self.check_sudo()
-        print("🔄 Renewing SSL certificates...")
+    async def flush_pending(self):
+        """
+        Apply every pending change with one configtest and one reload
         
-        if self.run_command("certbot renew --quiet"):
-            print("✅ SSL certificates renewed")
-            self.run_command("systemctl reload apache2")
-            logger.info("SSL certificates renewed successfully")
-        else:
-            print("❌ Failed to renew SSL certificates")
-            logger.error("SSL certificate renewal failed")
+        If the combined batch is rejected, the changes of each request are
+        retried on their own so one bad request does not fail the others.
+        """
+        async with self._flush_lock:
+            pending, waiters, owners = self._pending, self._waiters, self._owners
+            self._pending, self._waiters, self._owners, self._pending_configs = {}, [], {}, {}
+            self._first_change = None
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            
+            results = {}
+            if pending:
+                outcome = await self.run_pending_batch(pending)
+                groups = {}
+                for domain, site in pending.items():
+                    groups.setdefault(owners[domain], {})[domain] = site
+                if outcome['ok'] or len(groups) == 1:
+                    results = dict.fromkeys(groups, outcome)
+                else:
+                    logger.warning(f"Daemon batch rejected, retrying its {len(groups)} requests one by one")
+                    for owner, changes in groups.items():
+                        results[owner] = await self.run_pending_batch(changes)
+            
+            for waiter, domains in waiters:
+                if waiter.done():
+                    continue
+                domains = domains or list(pending)
+                outcomes = [results[owners[domain]] for domain in domains if domain in owners] or [{'ok': True}]
+                result = {'ok': all(outcome['ok'] for outcome in outcomes), 'applied': [], 'deleted': [],
+                          'seconds': max(outcome.get('seconds', 0) for outcome in outcomes)}
+                if result['ok']:
+                    result['applied'] = sorted(d for d in domains if pending.get(d) is not None)
+                    result['deleted'] = sorted(d for d in domains if d in pending and pending[d] is None)
+                else:
+                    result['errors'] = ["Batch rejected, see the daemon log (these changes were not applied)"]
+                waiter.set_result(result)
     
     def show_version(self):
         """Show version information"""
@@ -628,6 +4962,196 @@ class ApacheVHostManager:
         print("Repository: https://github.com/Noubissie237/reverse-proxy")
         print("Author: Noubissie237")
 
+def get_option(args, flag, default=None):
+    """
+    Return the value following a command line flag
+    
+    Args:
+        args (list): Command line arguments
+        flag (str): Flag name, e.g. ``--pool-max``
+        default: Value returned when the flag is absent
+        
+    Returns:
+        str: Flag value, default if the flag is absent
+    """
+    if flag in args:
+        index = args.index(flag)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
+def get_positionals(args, value_flags=()):
+    """
+    Return command line arguments that are neither flags nor flag values
+    
+    Args:
+        args (list): Command line arguments
+        value_flags (tuple): Flags that take a value
+        
+    Returns:
+        list: Positional arguments
+    """
+    positionals = []
+    skip = False
+    for arg in args:
+        if skip:
+            skip = False
+        elif arg in value_flags:
+            skip = True
+        elif not arg.startswith('--'):
+            positionals.append(arg)
+    return positionals
+
+def site_options_from_args(args):
+    """
+    Build a raw per-site settings mapping from create flags
+    
+    Args:
+        args (list): Command line arguments
+        
+    Returns:
+        dict: Settings in manifest form, ready for normalize_site_options
+    """
+    options = {}
+    
+    # create <domain> 3000,3001 or host:port members imply a backend list
+    if len(args) > 3 and (',' in args[3] or ':' in args[3] or '--standby' in args):
+        options['backends'] = args[3]
+    if '--standby' in args:
+        options['standby'] = get_option(args, '--standby')
+    if '--lbmethod' in args:
+        options['lbmethod'] = get_option(args, '--lbmethod')
+    if '--protocol' in args:
+        options['protocol'] = get_option(args, '--protocol')
+    if '--tls-profile' in args:
+        options['tls_profile'] = get_option(args, '--tls-profile')
+    if '--log-profile' in args:
+        options['log_profile'] = get_option(args, '--log-profile')
+    if '--compress' in args or '--precompressed' in args:
+        compression = {}
+        if '--compress' in args:
+            compression['algorithms'] = get_option(args, '--compress')
+        for flag, key in (('--compress-level', 'level'), ('--compress-min-size', 'min_size'),
+                          ('--compress-types', 'types'), ('--precompressed', 'precompressed')):
+            if flag in args:
+                compression[key] = get_option(args, flag)
+        options['compression'] = compression
+    if '--static' in args:
+        static = {'mounts': get_option(args, '--static')}
+        if '--static-max-age' in args:
+            static['max_age'] = get_option(args, '--static-max-age')
+        if '--sendfile' in args:
+            static['sendfile'] = True
+        options['static'] = static
+    if '--cache' in args:
+        cache = {'backend': get_option(args, '--cache')}
+        if '--cache-ttl' in args:
+            cache['ttl'] = get_option(args, '--cache-ttl')
+        if '--cache-path' in args:
+            cache['paths'] = get_option(args, '--cache-path')
+        if '--cache-ignore-cache-control' in args:
+            cache['honor_cache_control'] = False
+        options['cache'] = cache
+    
+    pool = {
+        'profile': get_option(args, '--pool-profile'),
+        'max': get_option(args, '--pool-max'),
+        'smax': get_option(args, '--pool-smax'),
+        'ttl': get_option(args, '--ttl'),
+        'keepalive': get_option(args, '--keepalive'),
+        'connectiontimeout': get_option(args, '--connect-timeout'),
+        'timeout': get_option(args, '--timeout'),
+    }
+    pool = {key: value for key, value in pool.items() if value is not None}
+    if pool:
+        options['pool'] = pool
+    
+    return options
+
+def daemon_request(payload, socket_path, timeout=330):
+    """
+    Send one request to a running manager daemon
+    
+    Args:
+        payload (dict): JSON request
+        socket_path (str): Daemon socket
+        timeout (float): Seconds to wait for the answer, sent once the batch is applied
+        
+    Returns:
+        dict: Daemon response, None if no daemon is listening
+    """
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout)
+            s.connect(socket_path)
+            s.sendall(json.dumps(payload).encode() + b'\n')
+            data = b''
+            while not data.endswith(b'\n'):
+                chunk = s.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    except OSError as e:
+        return {'ok': False, 'errors': [f"Daemon request failed: {e}"]}
+    try:
+        return json.loads(data)
+    except ValueError:
+        return {'ok': False, 'errors': ["Invalid daemon response"]}
+
+def daemon_client(manager, args):
+    """
+    Forward create, delete and apply to a running daemon
+    
+    Args:
+        manager (ApacheVHostManager): Manager (for the default socket path)
+        args (list): Command line arguments, ``--socket`` selects the daemon
+        
+    Returns:
+        bool: Success, None if no daemon is running (the command runs locally)
+    """
+    socket_path = get_option(args, '--socket', manager.daemon_socket)
+    if '--socket' in args:
+        index = args.index('--socket')
+        args = args[:index] + args[index + 2:]
+    action = args[1]
+    if action == 'create':
+        entry = {'domain': args[2], 'ssl': '--no-ssl' not in args, **site_options_from_args(args)}
+        if 'backends' not in entry:
+            entry['port'] = args[3]
+        if '--mass' in args:
+            entry['mass'] = True
+        request = {'action': 'create', 'entries': [entry]}
+    elif action == 'delete':
+        request = {'action': 'delete', 'domains': [args[2]]}
+    else:
+        request = {'action': 'apply', 'manifest': os.path.abspath(args[2])}
+    
+    if not os.path.exists(socket_path):
+        return None
+    print(f"🛰️  Sending {action} to the daemon ({socket_path})...")
+    response = daemon_request(request, socket_path)
+    if response is None:
+        return None
+    if response.get('exists'):
+        answer = input(f"⚠️  Site {args[2]} already exists. Replace it? (y/n): ")
+        if answer.lower() != 'y':
+            return False
+        response = daemon_request({**request, 'action': 'update'}, socket_path)
+    
+    if not response.get('ok'):
+        for error in response.get('errors', []):
+            print(f"❌ {error}")
+        return False
+    applied, deleted = response.get('applied', []), response.get('deleted', [])
+    print(f"✅ Done in one daemon batch: {len(applied)} sites applied, {len(deleted)} removed "
+          f"({response.get('seconds', 0)}s)")
+    if action != 'delete' and any(entry.get('ssl', True) and not entry.get('mass')
+                                   for entry in request.get('entries', [])):
+        print(f"💡 Issue the certificate with: sudo python3 vhost_manager.py ssl issue {args[2]}")
+    return True
+
 def main():
     """Main function to handle command line arguments"""
     manager = ApacheVHostManager()
@@ -636,16 +5160,48 @@ def main():
         print("Apache Virtual Host Manager")
         print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
         print("Usage:")
-        print("  sudo python3 vhost_manager.py create <domain> <port> [--no-ssl]")
-        print("  sudo python3 vhost_manager.py delete <domain>")
+        print("  sudo python3 vhost_manager.py create <domain> <port|unix:/path.sock>[,...] [--no-ssl] [--mass]")
+        print("  sudo python3 vhost_manager.py delete <domain> [--socket PATH]")
+        print("  sudo python3 vhost_manager.py apply <manifest.yaml|json> [--socket PATH]")
+        print("  sudo python3 vhost_manager.py reconcile [--dry-run]")
+        print("  sudo python3 vhost_manager.py mass enable|rebuild")
         print("  python3 vhost_manager.py list")
-        print("  sudo python3 vhost_manager.py renew-ssl")
+        print("  sudo python3 vhost_manager.py health [<domain>...] [--http [--path /health]] [--timeout S] [--json] [--watch S]")
+        print("  sudo python3 vhost_manager.py stats <domain>...|--all [--top N] [--json] [--reset]")
+        print("  sudo python3 vhost_manager.py cache purge <domain> [path] | cache stats [<domain>...]")
+        print("  python3 vhost_manager.py dns-check --all|<domain>... [--server-ip IP[,IPv6]] [--refresh-ip]")
+        print("  sudo python3 vhost_manager.py ssl issue <domain>...|--all-pending [--workers N] [--email E] [--no-san] [--dry-run]")
+        print("  sudo python3 vhost_manager.py renew-ssl [--window DAYS] [--workers N] [--force] [--dry-run]")
+        print("  python3 vhost_manager.py lint [--json]")
+        print("  sudo python3 vhost_manager.py tune [--apply]")
+        print("  sudo python3 vhost_manager.py metrics [--enable | --listen 127.0.0.1:9117]")
+        print("  sudo python3 vhost_manager.py serve [--socket PATH] [--debounce S]")
         print("  python3 vhost_manager.py version")
         print()
+        print("Create options:")
+        print("  --standby <host:port>[,...]  --lbmethod <byrequests|bytraffic|bybusyness|heartbeat>")
+        print("  --pool-profile <default|high-throughput|low-latency|conservative>")
+        print("  --pool-max N  --pool-smax N  --ttl SECONDS  --keepalive on|off")
+        print("  --connect-timeout SECONDS  --timeout SECONDS")
+        print("  --acme-mode <webroot|apache>  (webroot: no downtime, single reload)")
+        print("  --protocol <http1|h2c|ws>  (backend protocol: HTTP/1.1, HTTP/2 cleartext, WebSocket)")
+        print("  --tls-profile <default|performance|performance-tickets>")
+        print("  --log-profile <combined|latency|consolidated>")
+        print("  --cache <disk|socache>  --cache-ttl SECONDS  --cache-path /api[,/static]")
+        print("  --cache-ignore-cache-control")
+        print("  --compress br,gzip  --compress-level 1-9  --compress-min-size BYTES  --compress-types a/b,c/d")
+        print("  --precompressed /assets=/srv/app/public/assets[,...]")
+        print("  --static /assets=/srv/app/public[,...]  --static-max-age SECONDS  --sendfile")
+        print()
         print("Examples:")
         print("  sudo python3 vhost_manager.py create mysite.com 8080")
         print("  sudo python3 vhost_manager.py create api.example.com 3000 --no-ssl")
+        print("  sudo python3 vhost_manager.py create api.example.com 3000 --pool-profile high-throughput --pool-max 300")
+        print("  sudo python3 vhost_manager.py create app.example.com 3000,3001,3002 --standby 3003 --lbmethod bybusyness")
+        print("  sudo python3 vhost_manager.py create app.example.com unix:/run/app/gunicorn.sock")
+        print("  sudo python3 vhost_manager.py create chat.example.com 4000 --protocol ws")
         print("  sudo python3 vhost_manager.py delete mysite.com")
+        print("  sudo python3 vhost_manager.py apply sites.yaml")
         print("  python3 vhost_manager.py list")
         sys.exit(1)
     
@@ -654,32 +5210,164 @@ def main():
     try:
         if action == "create":
             if len(sys.argv) < 4:
-                print("Usage: sudo python3 vhost_manager.py create <domain> <port> [--no-ssl]")
+                print("Usage: sudo python3 vhost_manager.py create <domain> <port|unix:/path.sock> [--no-ssl] [--mass]")
                 sys.exit(1)
+            handled = daemon_client(manager, sys.argv)
+            if handled is not None:
+                sys.exit(0 if handled else 1)
             domain = sys.argv[2]
             port = sys.argv[3]
+            if ',' in port or ':' in port:
+                first = port.split(',')[0]
+                port = manager.backend_port(first) or (first if manager.socket_path(first) else port)
             ssl = "--no-ssl" not in sys.argv
-            manager.create_site(domain, port, ssl)
+            if "--mass" in sys.argv:
+                manager.create_mass_site(domain, port)
+            else:
+                acme_mode = get_option(sys.argv, '--acme-mode', 'webroot')
+                if acme_mode not in ('webroot', 'apache'):
+                    print("❌ --acme-mode must be webroot or apache")
+                    sys.exit(1)
+                manager.create_site(domain, port, ssl, site_options_from_args(sys.argv), acme_mode)
         
         elif action == "delete":
-            if len(sys.argv) != 3:
-                print("Usage: sudo python3 vhost_manager.py delete <domain>")
+            positionals = get_positionals(sys.argv, ('--socket',))
+            if len(positionals) != 3:
+                print("Usage: sudo python3 vhost_manager.py delete <domain> [--socket PATH]")
                 sys.exit(1)
-            domain = sys.argv[2]
+            handled = daemon_client(manager, sys.argv)
+            if handled is not None:
+                sys.exit(0 if handled else 1)
+            domain = positionals[2]
             manager.delete_site(domain)
         
+        elif action == "apply":
+            positionals = get_positionals(sys.argv, ('--socket',))
+            if len(positionals) != 3:
+                print("Usage: sudo python3 vhost_manager.py apply <manifest.yaml|json> [--socket PATH]")
+                sys.exit(1)
+            handled = daemon_client(manager, sys.argv)
+            if handled is not None:
+                sys.exit(0 if handled else 1)
+            manager.apply_manifest(positionals[2])
+        
+        elif action == "reconcile":
+            manager.reconcile(dry_run="--dry-run" in sys.argv)
+        
+        elif action == "mass":
+            if len(sys.argv) != 3 or sys.argv[2] not in ("enable", "rebuild"):
+                print("Usage: sudo python3 vhost_manager.py mass enable|rebuild")
+                sys.exit(1)
+            if sys.argv[2] == "enable":
+                manager.enable_mass_mode()
+            else:
+                manager.check_sudo()
+                if manager.build_mass_map():
+                    print("✅ Host map rebuilt")
+        
         elif action == "list":
             manager.list_sites()
         
+        elif action == "health":
+            options = {
+                'domains': get_positionals(sys.argv[2:], ('--path', '--timeout', '--watch', '--concurrency')) or None,
+                'mode': 'http' if "--http" in sys.argv or "--path" in sys.argv else 'tcp',
+                'path': get_option(sys.argv, '--path', '/'),
+                'timeout': float(get_option(sys.argv, '--timeout', 3)),
+                'concurrency': int(get_option(sys.argv, '--concurrency', 100))
+            }
+            if "--watch" in sys.argv:
+                manager.health_daemon(int(get_option(sys.argv, '--watch', 30)), **options)
+            rows = manager.health_check(**options)
+            manager.print_health(rows, as_json="--json" in sys.argv)
+            sys.exit(0 if all(row['ok'] for row in rows) else 1)
+        
+        elif action == "stats":
+            domains = get_positionals(sys.argv[2:], ('--top',))
+            if not domains and "--all" not in sys.argv:
+                print("Usage: sudo python3 vhost_manager.py stats <domain>...|--all [--top N] [--json] [--reset]")
+                sys.exit(1)
+            manager.show_stats(
+                domains=domains or None,
+                top=int(get_option(sys.argv, '--top', 10)),
+                as_json="--json" in sys.argv,
+                reset="--reset" in sys.argv
+            )
+        
+        elif action == "cache":
+            if len(sys.argv) >= 4 and sys.argv[2] == "purge":
+                manager.purge_cache(sys.argv[3], sys.argv[4] if len(sys.argv) > 4 else None)
+            elif len(sys.argv) >= 3 and sys.argv[2] == "stats":
+                manager.cache_stats(sys.argv[3:] or None)
+            else:
+                print("Usage: sudo python3 vhost_manager.py cache purge <domain> [path] | cache stats [<domain>...]")
+                sys.exit(1)
+        
+        elif action == "dns-check":
+            domains = get_positionals(sys.argv[2:], ('--server-ip', '--concurrency'))
+            if not domains and "--all" not in sys.argv:
+                print("Usage: python3 vhost_manager.py dns-check --all|<domain>... "
+                      "[--server-ip IP[,IPv6]] [--refresh-ip] [--concurrency N]")
+                sys.exit(1)
+            concurrency = get_option(sys.argv, '--concurrency')
+            ok = manager.dns_check(
+                domains=domains or None,
+                server_ip=get_option(sys.argv, '--server-ip'),
+                refresh_ip="--refresh-ip" in sys.argv,
+                concurrency=int(concurrency) if concurrency else None
+            )
+            sys.exit(0 if ok else 1)
+        
+        elif action == "ssl":
+            domains = get_positionals(sys.argv[3:], ('--workers', '--email'))
+            if len(sys.argv) < 4 or sys.argv[2] != "issue" or not (domains or "--all-pending" in sys.argv):
+                print("Usage: sudo python3 vhost_manager.py ssl issue <domain>...|--all-pending "
+                      "[--workers N] [--email E] [--no-san] [--dry-run]")
+                sys.exit(1)
+            manager.issue_pending_certificates(
+                domains=domains or None,
+                workers=int(get_option(sys.argv, '--workers', 4)),
+                email=get_option(sys.argv, '--email'),
+                san="--no-san" not in sys.argv,
+                dry_run="--dry-run" in sys.argv
+            )
+        
         elif action == "renew-ssl":
-            manager.renew_ssl_certificates()
+            manager.renew_ssl_certificates(
+                window_days=int(get_option(sys.argv, '--window', manager.RENEWAL_WINDOW_DAYS)),
+                workers=int(get_option(sys.argv, '--workers', 4)),
+                force="--force" in sys.argv,
+                dry_run="--dry-run" in sys.argv
+            )
+        
+        elif action == "metrics":
+            if "--enable" in sys.argv:
+                if not manager.enable_metrics():
+                    sys.exit(1)
+            elif "--listen" in sys.argv:
+                manager.serve_metrics(get_option(sys.argv, '--listen', '127.0.0.1:9117'))
+            else:
+                print(manager.render_metrics(), end='')
+        
+        elif action == "tune":
+            manager.tune(apply="--apply" in sys.argv)
+        
+        elif action == "lint":
+            if not manager.lint_sites(as_json="--json" in sys.argv):
+                sys.exit(1)
+        
+        elif action == "serve":
+            manager.serve(
+                socket_path=get_option(sys.argv, '--socket'),
+                debounce=float(get_option(sys.argv, '--debounce', manager.DAEMON_DEBOUNCE))
+            )
         
         elif action == "version":
             manager.show_version()
         
         else:
             print(f"Unknown action: {action}")
-            print("Available actions: create, delete, list, renew-ssl, version")
+            print("Available actions: create, delete, apply, reconcile, mass, list, health, stats, cache, dns-check, ssl, renew-ssl, lint, tune, metrics, serve, version")
             sys.exit(1)
             
     except KeyboardInterrupt: